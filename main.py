@@ -19,18 +19,23 @@ import os
 # Force X11 backend to avoid Wayland protocol errors during development
 #os.environ.setdefault('GDK_BACKEND', 'x11')
 import sys
-import gi
-import gettext
-import argparse
 
 # Projekt-Root ermitteln und ins Modul-Suchpath aufnehmen
 PROJECT_ROOT = os.path.dirname(os.path.abspath(__file__))
 sys.path.insert(0, PROJECT_ROOT)
 
+# Startzeiten messen (SETZER_PROFILE_STARTUP), vor allen anderen Imports
+from setzer.app.startup_profiler import StartupProfiler
+StartupProfiler.start()
+
+import gi
+import gettext
+import argparse
+
 # GTK/Adwaita Versionen
 gi.require_version('Gtk', '4.0')
 gi.require_version('Adw', '1')
-from gi.repository import Gtk, Gio, Adw, Gdk
+from gi.repository import Gtk, Gio, Adw, Gdk, GLib
 
 # Setzer-Module imports
 from setzer.workspace.workspace import Workspace
@@ -42,6 +47,8 @@ from setzer.app.color_manager import ColorManager
 from setzer.app.font_manager import FontManager
 from setzer.popovers.popover_manager import PopoverManager
 from setzer.app.latex_db import LaTeXDB
+from setzer.app.project_index import ProjectIndex
+from setzer.app.idle_builder import IdleBuilder
 from setzer.settings.document_settings import DocumentSettings
 from setzer.helpers.timer import timer
 
@@ -70,7 +77,8 @@ class MainApplicationController(Adw.Application):
         gettext.install('setzer', names=('ngettext',), localedir=localedir)
 
         # Einstellungen und Theme
-        self.settings = ServiceLocator.get_settings()
+        with StartupProfiler.measure('settings'):
+            self.settings = ServiceLocator.get_settings()
         
         # Ensure Adwaita styling is loaded
         Gtk.StyleContext.add_provider_for_display(
@@ -118,23 +126,29 @@ class MainApplicationController(Adw.Application):
         ServiceLocator.set_app_icons_path(app_icons_path)
 
         # Hauptfenster, Model und Dialoge initialisieren
-        self.main_window = view.MainWindow(self)
-        icon_theme = Gtk.IconTheme.get_for_display(self.main_window.get_display())
-        icon_theme.add_search_path(os.path.join(resources_path, 'icons'))
-        icon_theme.add_search_path(app_icons_path)
-        for folder in ['arrows', 'greek_letters', 'misc_math', 'misc_text', 'operators', 'relations']:
-            icon_theme.add_search_path(os.path.join(resources_path, 'symbols', folder))
-
-        ServiceLocator.set_main_window(self.main_window)
-        ColorManager.init(self.main_window)
-        FontManager.init(self.main_window)
-
-        self.workspace = Workspace()
-        PopoverManager.init(self.main_window, self.workspace)
-        LaTeXDB.init(resources_path)
-        self.main_window.create_widgets()
-        ServiceLocator.set_workspace(self.workspace)
-        DialogLocator.init_dialogs(self.main_window, self.workspace)
+        with StartupProfiler.measure('main window'):
+            self.main_window = view.MainWindow(self)
+            icon_theme = Gtk.IconTheme.get_for_display(self.main_window.get_display())
+            icon_theme.add_search_path(os.path.join(resources_path, 'icons'))
+            icon_theme.add_search_path(app_icons_path)
+            for folder in ['arrows', 'greek_letters', 'misc_math', 'misc_text', 'operators', 'relations']:
+                icon_theme.add_search_path(os.path.join(resources_path, 'symbols', folder))
+
+            ServiceLocator.set_main_window(self.main_window)
+            ColorManager.init(self.main_window)
+            FontManager.init(self.main_window)
+
+        with StartupProfiler.measure('workspace'):
+            self.workspace = Workspace()
+            PopoverManager.init(self.main_window, self.workspace)
+            LaTeXDB.init(resources_path)
+        with StartupProfiler.measure('main window widgets'):
+            self.main_window.create_widgets()
+        with StartupProfiler.measure('services'):
+            ServiceLocator.set_workspace(self.workspace)
+            ProjectIndex.init(self.workspace)
+            IdleBuilder.init(self.workspace)
+            DialogLocator.init_dialogs(self.main_window, self.workspace)
 
         # Fensterzustand wiederherstellen und anzeigen
         if self.settings.get_value('window_state', 'is_maximized'):
@@ -144,13 +158,19 @@ class MainApplicationController(Adw.Application):
         width = self.settings.get_value('window_state', 'width')
         height = self.settings.get_value('window_state', 'height')
         self.main_window.set_default_size(width, height)
-        self.main_window.present()
+        with StartupProfiler.measure('present window'):
+            self.main_window.present()
         # Signale verbinden
         self.main_window.connect('close-request', self.on_window_close)
 
         # Controller und Shortcuts
-        self.workspace.init_workspace_controller()
-        self.shortcuts = shortcuts.Shortcuts()
+        with StartupProfiler.measure('workspace controller and documents'):
+            self.workspace.init_workspace_controller()
+        with StartupProfiler.measure('shortcuts'):
+            self.shortcuts = shortcuts.Shortcuts()
+
+        # idle callbacks run after the first frame is drawn
+        GLib.idle_add(StartupProfiler.finish)
     # Signal-Handler implementieren
     def on_window_close(self, window, parameter=None):
         self.save_quit()
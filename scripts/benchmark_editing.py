@@ -0,0 +1,331 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+
+# Drives a GtkSource.Buffer with scripted edits on generated documents
+# and times the code running after each edit, without a window. Writes
+# p50 / p99 latency and allocations for each step to a JSON file, which
+# can be compared with the results of an earlier run.
+#
+# usage: scripts/benchmark_editing.py [--sizes 1000,10000] [--edits 300]
+#                                     [--output results.json] [--compare old.json]
+#                                     [--logs book.log,thesis.log]
+#
+# The structure sidebar needs Gtk to be initialized, it is skipped
+# if there is no display (xvfb-run can provide one).
+
+import gi
+gi.require_version('Gtk', '4.0')
+gi.require_version('GtkSource', '5')
+from gi.repository import Gtk, GtkSource
+
+import sys, os, os.path, time, json, random, tempfile, tracemalloc, gettext, argparse, subprocess, platform
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, PROJECT_ROOT)
+gettext.install('setzer', names=('ngettext',), localedir=os.path.join(PROJECT_ROOT, 'po'))
+
+from setzer.document.parser.parser_latex import ParserLaTeX
+from setzer.document.code_folding.code_folding import CodeFolding
+from setzer.document.build_system.latex_log_parser.latex_log_parser import LaTeXLogParser
+from setzer.app.latex_db import LaTeXDB
+from setzer.app.project_index import ProjectIndex
+from setzer.helpers.observable import Observable
+
+
+class BenchmarkDocument(Observable):
+    ''' The parts of a document the parser and code folding use. '''
+
+    def __init__(self, filename, text):
+        Observable.__init__(self)
+        self.filename = filename
+        self.source_buffer = GtkSource.Buffer()
+        self.parser = ParserLaTeX(self)
+        self.source_buffer.set_text(text)
+        self.parser.parse_now()
+
+    def get_filename(self):
+        return self.filename
+
+    def get_dirname(self):
+        return os.path.dirname(self.filename)
+
+    def is_latex_document(self):
+        return True
+
+
+class BenchmarkDataProvider(Observable):
+    ''' Stands in for the sidebar data provider, with a single document. '''
+
+    def __init__(self, document):
+        Observable.__init__(self)
+        self.document = document
+        self.workspace = None
+
+    def get_includes(self):
+        return list()
+
+
+class Benchmark(object):
+
+    def __init__(self):
+        self.timings = dict()
+        self.allocations = dict()
+        self.trace_allocations = False
+
+    def run(self, name, function, *args):
+        if self.trace_allocations:
+            tracemalloc.reset_peak()
+            current = tracemalloc.get_traced_memory()[0]
+            return_value = function(*args)
+            self.allocations.setdefault(name, list()).append(tracemalloc.get_traced_memory()[1] - current)
+        else:
+            start_time = time.perf_counter()
+            return_value = function(*args)
+            self.timings.setdefault(name, list()).append(time.perf_counter() - start_time)
+        return return_value
+
+    def get_results(self):
+        results = dict()
+        for name, timings in self.timings.items():
+            allocations = self.allocations.get(name, [0])
+            results[name] = {'samples': len(timings),
+                             'p50_ms': percentile(timings, 50) * 1000,
+                             'p99_ms': percentile(timings, 99) * 1000,
+                             'max_ms': max(timings) * 1000,
+                             'allocated_kb_p50': percentile(allocations, 50) / 1024,
+                             'allocated_kb_max': max(allocations) / 1024}
+        return results
+
+
+def percentile(values, percent):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(len(values) * percent / 100))]
+
+
+def generate_corpus(number_of_lines, seed=0):
+    rng = random.Random(seed)
+    words = 'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore et dolore magna aliqua'.split()
+
+    lines = ['\\documentclass{article}', '\\usepackage{amsmath}', '\\usepackage{graphicx}', '\\usepackage{hyperref}', '\\begin{document}']
+    label_count = 0
+    while len(lines) < number_of_lines:
+        choice = rng.random()
+        if choice < 0.02:
+            lines.append('\\section{' + ' '.join(rng.choices(words, k=3)) + '}')
+        elif choice < 0.06:
+            lines.append('\\subsection{' + ' '.join(rng.choices(words, k=3)) + '}')
+        elif choice < 0.10:
+            label_count += 1
+            lines += ['\\begin{equation}', '    a_{' + str(label_count) + '} = b^2 + c^2', '    \\label{eq:' + str(label_count) + '}', '\\end{equation}']
+        elif choice < 0.13:
+            lines += ['\\begin{itemize}'] + ['    \\item ' + ' '.join(rng.choices(words, k=6)) for i in range(3)] + ['\\end{itemize}']
+        elif choice < 0.15 and label_count > 0:
+            lines.append('See equation~\\eqref{eq:' + str(rng.randint(1, label_count)) + '} and \\cite{key' + str(rng.randint(1, 50)) + '}.')
+        else:
+            lines.append(' '.join(rng.choices(words, k=rng.randint(6, 16))))
+    lines.append('\\end{document}')
+    return '\n'.join(lines)
+
+
+def generate_edit_trace(number_of_edits, seed=0):
+    ''' (kind, relative position, text) for each edit. Positions are
+        fractions of the buffer, so the trace fits any document. '''
+
+    rng = random.Random(seed)
+    trace = list()
+    while len(trace) < number_of_edits:
+        choice = rng.random()
+        position = rng.random()
+        if choice < 0.6:
+            # typing a word, one character at a time
+            for char in rng.choice(['lorem ', 'ipsum ', '\\emph{dolor} ', '$x^2$ ']):
+                trace.append(('type', position, char))
+        elif choice < 0.7:
+            trace.append(('insert_line', position, '\\subsection{inserted}'))
+        elif choice < 0.8:
+            trace.append(('insert_line', position, '\\begin{itemize} \\item inserted \\end{itemize}'))
+        elif choice < 0.9:
+            trace.append(('insert_line', position, '\\begin{center}'))
+        else:
+            trace.append(('delete_line', position, None))
+    return trace[:number_of_edits]
+
+
+def apply_edit(buffer, edit, state):
+    kind, position, text = edit
+    if kind == 'type':
+        if state.get('cursor') == None or state.get('position') != position:
+            state['position'] = position
+            state['cursor'] = int(buffer.get_char_count() * position)
+        buffer.insert(buffer.get_iter_at_offset(state['cursor']), text)
+        state['cursor'] += len(text)
+    elif kind == 'insert_line':
+        _, line_iter = buffer.get_iter_at_line(int((buffer.get_line_count() - 1) * position))
+        buffer.insert(line_iter, text + '\n')
+        state['cursor'] = None
+    elif kind == 'delete_line':
+        line = int((buffer.get_line_count() - 2) * position)
+        _, start_iter = buffer.get_iter_at_line(line)
+        _, end_iter = buffer.get_iter_at_line(line + 1)
+        buffer.delete(start_iter, end_iter)
+        state['cursor'] = None
+
+
+def generate_log(number_of_files, seed=0):
+    rng = random.Random(seed)
+    lines = ['This is pdfTeX, Version 3.141592653-2.6-1.40.25 (TeX Live 2023) (preloaded format=pdflatex)', '(./main.tex']
+    for i in range(number_of_files):
+        lines.append('(/usr/share/texlive/texmf-dist/tex/latex/package' + str(i) + '/package' + str(i) + '.sty')
+        lines.append('Package: package' + str(i) + ' 2023/01/01 v1.0')
+        if rng.random() < 0.3:
+            lines.append('Package package' + str(i) + ' Warning: something to warn about on input line ' + str(rng.randint(1, 500)) + '.')
+        lines.append(')')
+    for i in range(number_of_files * 5):
+        if i % 10 == 0:
+            lines.append('(./chapters/chapter' + str(i // 10) + '.tex')
+        choice = rng.random()
+        if choice < 0.4:
+            lines.append('Overfull \\hbox (' + str(rng.random() * 10)[:5] + 'pt too wide) in paragraph at lines ' + str(i) + '--' + str(i + 3))
+            lines.append('[]\\T1/cmr/m/n/10 lorem ipsum dolor sit amet')
+        elif choice < 0.6:
+            lines.append('LaTeX Warning: Reference `eq:' + str(i) + '\' on page 3 undefined on input line ' + str(i) + '.')
+        elif choice < 0.65:
+            lines += ['! Undefined control sequence.', 'l.' + str(i) + ' \\foo', '']
+        else:
+            lines.append('[' + str(i) + ']')
+        if i % 10 == 9:
+            lines.append(')')
+    if number_of_files * 5 % 10 != 0:
+        lines.append(')')
+    lines.append(')')
+    lines.append('Output written on main.pdf (' + str(number_of_files) + ' pages, 123456 bytes).')
+    return '\n'.join(lines)
+
+
+def run_editing(benchmark, number_of_lines, number_of_edits, dirname):
+    document = BenchmarkDocument(os.path.join(dirname, 'main.tex'), generate_corpus(number_of_lines))
+    code_folding = CodeFolding(document)
+    document.parser.disconnect('blocks_changed', code_folding.on_blocks_changed)
+
+    structure = None
+    if Gtk.init_check():
+        from setzer.workspace.sidebar.document_structure_page.structure import StructureSection
+        structure = StructureSection(BenchmarkDataProvider(document), {'inline': Gtk.Label()})
+    else:
+        print('Gtk could not be initialized, skipping the structure sidebar.')
+
+    blocks_diffs = list()
+    document.parser.connect('blocks_changed', lambda parser, blocks_diff: blocks_diffs.append(blocks_diff))
+    code_folding.on_blocks_changed(document.parser, {'added': list(document.parser.symbols['blocks']), 'removed': list(), 'changed': list()})
+
+    ProjectIndex.files = dict()
+    ProjectIndex.project_files = [document.get_filename()]
+    words = ['\\se', '\\sub', '\\beg', '\\textb', '\\eqref{eq:1', '\\cite']
+
+    state = dict()
+    for i, edit in enumerate(generate_edit_trace(number_of_edits)):
+        benchmark.run('buffer_edit', apply_edit, document.source_buffer, edit, state)
+        benchmark.run('parser', document.parser.parse_now)
+        for blocks_diff in blocks_diffs:
+            benchmark.run('code_folding', code_folding.on_blocks_changed, document.parser, blocks_diff)
+        blocks_diffs.clear()
+        if structure != None:
+            benchmark.run('structure_update_items', structure.update_items)
+        ProjectIndex.get_file_dict_from_document(document)
+        benchmark.run('latex_db_get_items', LaTeXDB.get_items, words[i % len(words)])
+
+
+def run_log_parser(benchmark, log_text, repetitions, dirname, name='log_parser'):
+    with open(os.path.join(dirname, 'main.log'), 'w') as f:
+        f.write(log_text)
+    log_parser = LaTeXLogParser()
+    for i in range(repetitions):
+        benchmark.run(name, log_parser.parse_build_log, os.path.join(dirname, 'main.tex'), os.path.join(dirname, 'main.log'))
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def print_results(results, previous_results=None):
+    for size, size_results in results.items():
+        print('\n' + size)
+        print('{:<24} {:>8} {:>10} {:>10} {:>14} {:>10}'.format('', 'samples', 'p50 ms', 'p99 ms', 'alloc p50 kB', 'p50 vs.'))
+        for name, result in sorted(size_results.items()):
+            comparison = ''
+            if previous_results != None and name in previous_results.get(size, dict()):
+                previous = previous_results[size][name]['p50_ms']
+                if previous > 0:
+                    comparison = '{:+.0f}%'.format((result['p50_ms'] / previous - 1) * 100)
+            print('{:<24} {:>8} {:>10.3f} {:>10.3f} {:>14.1f} {:>10}'.format(name, result['samples'], result['p50_ms'], result['p99_ms'], result['allocated_kb_p50'], comparison))
+
+
+def main():
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('--sizes', default='1000,10000,50000', help='lines of the generated documents')
+    argument_parser.add_argument('--edits', type=int, default=300)
+    argument_parser.add_argument('--output', default='benchmark_results.json')
+    argument_parser.add_argument('--compare', default=None, help='results of an earlier run')
+    argument_parser.add_argument('--logs', default=None, help='real build logs to time the log parser on, comma separated')
+    arguments = argument_parser.parse_args()
+
+    LaTeXDB.init(os.path.join(PROJECT_ROOT, 'data', 'resources'))
+
+    results = dict()
+    with tempfile.TemporaryDirectory() as dirname:
+        for number_of_lines in [int(size) for size in arguments.sizes.split(',')]:
+            benchmark = Benchmark()
+
+            # the same trace runs twice, as tracing allocations
+            # distorts the timings.
+            for trace_allocations in [False, True]:
+                benchmark.trace_allocations = trace_allocations
+                if trace_allocations: tracemalloc.start()
+                run_editing(benchmark, number_of_lines, arguments.edits, dirname)
+                run_log_parser(benchmark, generate_log(number_of_lines // 100), 20, dirname)
+                if trace_allocations: tracemalloc.stop()
+
+            results[str(number_of_lines) + ' lines'] = benchmark.get_results()
+
+        if arguments.logs != None:
+            benchmark = Benchmark()
+            for trace_allocations in [False, True]:
+                benchmark.trace_allocations = trace_allocations
+                if trace_allocations: tracemalloc.start()
+                for log_filename in arguments.logs.split(','):
+                    with open(log_filename, 'rb') as f:
+                        log_text = f.read().decode('utf-8', errors='ignore')
+                    run_log_parser(benchmark, log_text, 5, dirname, 'log_parser ' + os.path.basename(log_filename))
+                if trace_allocations: tracemalloc.stop()
+            results['logs'] = benchmark.get_results()
+
+    previous_results = None
+    if arguments.compare != None:
+        with open(arguments.compare, 'r') as f:
+            previous_results = json.load(f)['results']
+    print_results(results, previous_results)
+
+    with open(arguments.output, 'w') as f:
+        json.dump({'commit': get_commit(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(), 'edits': arguments.edits, 'results': results}, f, indent=4)
+    print('\nresults written to ' + arguments.output)
+
+
+if __name__ == '__main__':
+    main()
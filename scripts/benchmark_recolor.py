@@ -0,0 +1,114 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+
+# Times recoloring of rendered pdf pages for the dark mode preview and
+# reports the peak memory allocated during recoloring (as seen by
+# tracemalloc, which covers numpy but not cairo or Pillow buffers).
+#
+# usage: scripts/benchmark_recolor.py [number of repetitions]
+
+import cairo
+import numpy as np
+
+import sys, os.path, time, tracemalloc, collections
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), '..'))
+
+from setzer.helpers.recolor import recolor_surface
+
+RGBA = collections.namedtuple('RGBA', ['red', 'green', 'blue', 'alpha'])
+color = RGBA(0.87, 0.87, 0.87, 1)
+
+page_width, page_height = 595, 842
+zoom_levels = [1, 1.5, 2, 3, 4]
+
+
+def render_page(scale):
+    width, height = int(page_width * scale), int(page_height * scale)
+    surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+    ctx = cairo.Context(surface)
+    ctx.set_source_rgb(1, 1, 1)
+    ctx.paint()
+    ctx.scale(scale, scale)
+    ctx.set_source_rgb(0, 0, 0)
+    ctx.set_font_size(10)
+    for line in range(60):
+        ctx.move_to(72, 72 + line * 12)
+        ctx.show_text('Lorem ipsum dolor sit amet, consectetur adipiscing elit, sed do eiusmod tempor.')
+    ctx.set_source_rgb(0.2, 0.4, 0.8)
+    ctx.rectangle(200, 400, 200, 120)
+    ctx.fill()
+    surface.flush()
+    return surface
+
+
+def recolor_surface_pillow(surface, color):
+    ''' The previous implementation, going through Pillow. '''
+
+    from PIL import Image
+
+    width, height = surface.get_width(), surface.get_height()
+    pil_img = Image.frombuffer('RGBA', (width, height), surface.get_data(), 'raw', 'RGBA', 0, 1)
+    img_data = np.array(pil_img, dtype=np.ubyte)
+    alpha = 255 - 0.3 * img_data[..., 0] - 0.6 * img_data[..., 1] - 0.1 * img_data[..., 2]
+    img_data[:,:,-1] = alpha
+    pil_img = Image.fromarray(np.ubyte(img_data))
+    im_bytes = bytearray(pil_img.tobytes('raw', 'BGRa'))
+    surface = cairo.ImageSurface.create_for_data(im_bytes, cairo.FORMAT_ARGB32, width, height)
+    ctx = cairo.Context(surface)
+    ctx.set_source_rgba(color.red, color.green, color.blue, color.alpha)
+    ctx.set_operator(cairo.Operator.IN)
+    ctx.rectangle(0, 0, width, height)
+    ctx.fill()
+    return surface
+
+
+def measure(function, scale, repetitions):
+    times = list()
+    peak = 0
+    for i in range(repetitions):
+        surface = render_page(scale)
+        tracemalloc.start()
+        start_time = time.perf_counter()
+        function(surface, color)
+        times.append(time.perf_counter() - start_time)
+        peak = max(peak, tracemalloc.get_traced_memory()[1])
+        tracemalloc.stop()
+    times.sort()
+    return times[len(times) // 2], peak
+
+
+def main():
+    repetitions = int(sys.argv[1]) if len(sys.argv) > 1 else 20
+
+    implementations = [('in place', recolor_surface)]
+    try: import PIL
+    except ImportError:
+        print('Pillow not installed, skipping the previous implementation.')
+    else:
+        implementations.append(('pillow', recolor_surface_pillow))
+
+    print('{:>6} {:>12} {:>10} {:>12} {:>14}'.format('zoom', 'size', 'method', 'ms / page', 'peak memory'))
+    for scale in zoom_levels:
+        size = '{}x{}'.format(int(page_width * scale), int(page_height * scale))
+        for name, function in implementations:
+            median, peak = measure(function, scale, repetitions)
+            print('{:>6} {:>12} {:>10} {:>12.2f} {:>11.1f} MB'.format(scale, size, name, median * 1000, peak / 2**20))
+
+
+if __name__ == '__main__':
+    main()
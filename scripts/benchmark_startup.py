@@ -0,0 +1,170 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+
+# Starts Setzer several times with a generated document open and times
+# how long it takes until the window can be edited in, measured from
+# starting the process. Fails if the median is over the budget. Runs
+# use their own configuration folder with default settings, caches
+# written by a warm-up run are kept, like on a system Setzer ran on.
+#
+# usage: scripts/benchmark_startup.py [--runs 5] [--budget 1500]
+#                                     [--panels none|preview|help|symbols]
+#                                     [--output results.json] [--compare old.json]
+#
+# Needs a display (xvfb-run can provide one). The per-module import
+# times and startup steps of the last run are printed as well, see
+# setzer/app/startup_profiler.py.
+
+import sys, os, os.path, time, json, pickle, statistics, tempfile, argparse, subprocess, platform
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, PROJECT_ROOT)
+
+from setzer.app.startup_profiler import StartupProfiler
+
+
+def generate_document(number_of_lines):
+    lines = ['\\documentclass{article}', '\\usepackage{amsmath}', '\\begin{document}']
+    while len(lines) < number_of_lines - 1:
+        number = len(lines)
+        if number % 50 == 0:
+            lines.append('\\section{Section ' + str(number) + '}\\label{sec:' + str(number) + '}')
+        elif number % 17 == 0:
+            lines += ['\\begin{equation}\\label{eq:' + str(number) + '}', 'a^2 + b^2 = c^2', '\\end{equation}']
+        else:
+            lines.append('Some text with \\textbf{bold} words and a reference to Section~\\ref{sec:0}.')
+    lines.append('\\end{document}')
+    return '\n'.join(lines) + '\n'
+
+
+def write_configuration(config_folder, document_filename, panels):
+    setzer_folder = os.path.join(config_folder, 'setzer')
+    os.makedirs(setzer_folder, exist_ok=True)
+
+    window_state = {'show_preview': panels == 'preview', 'show_help': panels == 'help', 'show_symbols': panels == 'symbols'}
+    with open(os.path.join(setzer_folder, 'settings.pickle'), 'wb') as f:
+        pickle.dump({'window_state': window_state}, f)
+
+    workspace = dict()
+    workspace['open_documents'] = {document_filename: {'filename': document_filename, 'last_activated': time.time()}}
+    workspace['recently_opened_documents'] = dict()
+    workspace['recently_opened_session_files'] = dict()
+    workspace['recent_help_searches'] = list()
+    with open(os.path.join(setzer_folder, 'workspace.pickle'), 'wb') as f:
+        pickle.dump(workspace, f)
+
+
+def run_setzer(dirname, document_filename, panels, timeout):
+    ''' Milliseconds until the window could be edited in, and the
+        results of the startup profiler. '''
+
+    config_folder = os.path.join(dirname, 'config')
+    write_configuration(config_folder, document_filename, panels)
+
+    profile_filename = os.path.join(dirname, 'startup_profile.json')
+    if os.path.exists(profile_filename):
+        os.remove(profile_filename)
+
+    environment = dict(os.environ)
+    environment['XDG_CONFIG_HOME'] = config_folder
+    environment['XDG_CACHE_HOME'] = os.path.join(dirname, 'cache')
+    environment['SETZER_PROFILE_STARTUP'] = profile_filename
+
+    start_time = time.perf_counter()
+    process = subprocess.Popen([sys.executable, os.path.join(PROJECT_ROOT, 'main.py')], env=environment, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while not os.path.exists(profile_filename):
+            if process.poll() != None:
+                raise RuntimeError('setzer exited with status ' + str(process.returncode) + ' before the window was ready')
+            if time.perf_counter() - start_time > timeout:
+                raise RuntimeError('the window wasn\'t ready after ' + str(timeout) + ' seconds')
+            time.sleep(0.005)
+        duration = (time.perf_counter() - start_time) * 1000
+    finally:
+        process.terminate()
+        try: process.wait(5)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    # the file may be seen before it is completely written
+    for i in range(100):
+        try:
+            with open(profile_filename, 'r') as f:
+                return duration, json.load(f)
+        except ValueError:
+            time.sleep(0.01)
+    return duration, None
+
+
+def get_commit():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=PROJECT_ROOT, capture_output=True, text=True).stdout.strip()
+    except OSError:
+        return None
+
+
+def main():
+    argument_parser = argparse.ArgumentParser()
+    argument_parser.add_argument('--runs', type=int, default=5)
+    argument_parser.add_argument('--budget', type=float, default=1500, help='milliseconds from starting the process until the window can be edited in')
+    argument_parser.add_argument('--panels', default='none', choices=['none', 'preview', 'help', 'symbols'], help='panel shown next to the document')
+    argument_parser.add_argument('--lines', type=int, default=2000, help='lines of the generated document')
+    argument_parser.add_argument('--timeout', type=float, default=60)
+    argument_parser.add_argument('--output', default='startup_results.json')
+    argument_parser.add_argument('--compare', default=None, help='results of an earlier run')
+    arguments = argument_parser.parse_args()
+
+    durations = list()
+    profile = None
+    with tempfile.TemporaryDirectory() as dirname:
+        document_filename = os.path.join(dirname, 'document.tex')
+        with open(document_filename, 'w') as f:
+            f.write(generate_document(arguments.lines))
+
+        # the warm-up run writes the caches of later runs.
+        run_setzer(dirname, document_filename, arguments.panels, arguments.timeout)
+        for i in range(arguments.runs):
+            duration, profile = run_setzer(dirname, document_filename, arguments.panels, arguments.timeout)
+            durations.append(duration)
+            print('run ' + str(i + 1) + ': {:.0f} ms'.format(duration))
+
+    median = statistics.median(durations)
+    if profile != None:
+        print('\nlast run, from the start of main.py:')
+        StartupProfiler.print_results(profile)
+
+    comparison = ''
+    if arguments.compare != None:
+        with open(arguments.compare, 'r') as f:
+            previous_median = json.load(f)['median_ms']
+        comparison = ' ({:+.0f}% vs. {:.0f} ms)'.format((median / previous_median - 1) * 100, previous_median)
+    print('\nmedian: {:.0f} ms{}, budget: {:.0f} ms'.format(median, comparison, arguments.budget))
+
+    with open(arguments.output, 'w') as f:
+        json.dump({'commit': get_commit(), 'date': time.strftime('%Y-%m-%d %H:%M:%S'), 'python': platform.python_version(), 'panels': arguments.panels, 'lines': arguments.lines, 'budget_ms': arguments.budget, 'median_ms': median, 'runs_ms': durations, 'profile': profile}, f, indent=4)
+    print('results written to ' + arguments.output)
+
+    if median > arguments.budget:
+        print('over budget')
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
+
+
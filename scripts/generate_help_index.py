@@ -0,0 +1,54 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+
+# Writes data/resources/help/search_index.bin, the index searched in
+# the help panel, from the concept and command index pages of the
+# LaTeX2e manual in data/resources/help. Run it again after updating
+# the manual.
+
+import sys, os, os.path, glob, html, re
+PROJECT_ROOT = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..')
+sys.path.insert(0, PROJECT_ROOT)
+
+from setzer.workspace.help_panel.help_search_index import HelpSearchIndex
+
+
+help_folder = os.path.join(PROJECT_ROOT, 'data', 'resources', 'help')
+
+# rows of the index tables: entry, then the section it's found in.
+row_pattern = re.compile(r'<tr><td></td><td valign="top"><a href="([^"]*)">(.*?)</a>:</td><td>&nbsp;</td><td valign="top"><a href="[^"]*">(.*?)</a></td></tr>')
+tag_pattern = re.compile(r'<[^>]*>')
+
+
+def get_text(markup):
+    return html.unescape(tag_pattern.sub('', markup))
+
+
+entries = set()
+for filename in glob.glob(os.path.join(help_folder, 'latex2e_*.html')):
+    with open(filename, 'r') as f:
+        for match in row_pattern.finditer(f.read()):
+            entries.add((match.group(1), get_text(match.group(2)), get_text(match.group(3))))
+
+# equally good results are shown in this order
+entries = sorted(entries, key=lambda entry: (entry[1].lower(), entry[2].lower(), entry[0]))
+
+HelpSearchIndex.write(os.path.join(help_folder, 'search_index.bin'), entries)
+print(str(len(entries)) + ' entries written')
+
+
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import gi
+from gi.repository import GLib
+
+import concurrent.futures
+import time
+
+from setzer.app.service_locator import ServiceLocator
+
+
+class BuildExecutor():
+    ''' Runs the build queries of all documents on a pool of long
+        lived worker threads. When more documents are built at once than
+        the parallelism limit allows, queries wait in the pool's queue.
+        Callbacks are run on the main loop once a query is done. '''
+
+    executor = None
+    max_workers = None
+
+    def submit(function, query, callback):
+        ''' Runs function(query) on a worker thread, then callback(query, future)
+            on the main loop. The callback also runs for cancelled queries. '''
+
+        BuildExecutor.update_executor()
+        query.metrics['queued_at'] = time.time()
+        future = BuildExecutor.executor.submit(BuildExecutor.run, function, query)
+        future.add_done_callback(lambda future: GLib.idle_add(BuildExecutor.notify, callback, query, future))
+        return future
+
+    def run(function, query):
+        start_time = time.time()
+        query.metrics['queue_wait'] = start_time - query.metrics['queued_at']
+        try:
+            return function(query)
+        finally:
+            query.metrics['run_time'] = time.time() - start_time
+
+    def notify(callback, query, future):
+        callback(query, future)
+        return False
+
+    def update_executor():
+        # queries already submitted to a previous pool still run there.
+        max_workers = ServiceLocator.get_settings().get_value('preferences', 'max_parallel_builds')
+        if max_workers != BuildExecutor.max_workers:
+            if BuildExecutor.executor != None:
+                BuildExecutor.executor.shutdown(wait=False)
+            BuildExecutor.executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='build')
+            BuildExecutor.max_workers = max_workers
+
+
@@ -0,0 +1,71 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import bisect, re
+
+
+class CompletionIndex(object):
+    ''' Items kept sorted by their text (in lower case), so the ones
+        starting with a prefix are found by binary search. Items can
+        also be matched by the letters of a word, in order but with
+        gaps. Matches are generated one by one, there is no limit. '''
+
+    def __init__(self, pairs=None):
+        self.keys = list()
+        self.items = list()
+        if pairs != None:
+            pairs = sorted(((text.lower(), item) for text, item in pairs), key=lambda pair: pair[0])
+            self.keys = [key for key, item in pairs]
+            self.items = [item for key, item in pairs]
+
+    def add(self, text, item):
+        index = bisect.bisect_right(self.keys, text.lower())
+        self.keys.insert(index, text.lower())
+        self.items.insert(index, item)
+
+    def remove(self, text, item):
+        index = bisect.bisect_left(self.keys, text.lower())
+        while index < len(self.keys) and self.keys[index] == text.lower():
+            if self.items[index] == item:
+                del(self.keys[index])
+                del(self.items[index])
+                return
+            index += 1
+
+    def get_prefix_matches(self, prefix):
+        prefix = prefix.lower()
+        index = bisect.bisect_left(self.keys, prefix)
+        while index < len(self.keys) and self.keys[index].startswith(prefix):
+            yield self.items[index]
+            index += 1
+
+    def get_fuzzy_matches(self, word):
+        ''' (distance, item) for the items with the letters of word in
+            order, but not starting with word. The distance counts the
+            letters skipped, then how late the match starts. '''
+
+        word = word.lower()
+        # a new pattern for each word, so it's not kept by the service locator
+        regex = re.compile('.*?'.join(re.escape(char) for char in word))
+        for key, item in zip(self.keys, self.items):
+            if key.startswith(word): continue
+
+            match = regex.search(key)
+            if match != None:
+                yield ((match.end() - match.start() - len(word), match.start()), item)
+
+
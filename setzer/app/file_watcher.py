@@ -0,0 +1,117 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import gi
+from gi.repository import Gio, GLib
+
+import os
+
+
+class FileWatcher():
+    ''' Calls back subscribers when a file changes on disk, is created,
+        deleted or replaced. Files on filesystems without change
+        notifications (e.g. network mounts) are polled together. '''
+
+    subscribers = dict()
+    monitors = dict()
+    polled_files = dict()
+    is_polling = False
+    pending_notifications = dict()
+
+    # events within this interval are reported once, so saving by
+    # writing a temporary file and renaming it over the original, or
+    # checking out a branch, doesn't trigger several reloads.
+    debounce_interval = 250
+    polling_interval = 2000
+
+    def watch(filename, callback):
+        if filename not in FileWatcher.subscribers:
+            FileWatcher.subscribers[filename] = list()
+            FileWatcher.start_monitor(filename)
+        FileWatcher.subscribers[filename].append(callback)
+
+    def unwatch(filename, callback):
+        if filename not in FileWatcher.subscribers: return
+        if callback not in FileWatcher.subscribers[filename]: return
+
+        FileWatcher.subscribers[filename].remove(callback)
+        if len(FileWatcher.subscribers[filename]) == 0:
+            del(FileWatcher.subscribers[filename])
+            FileWatcher.stop_monitor(filename)
+
+    def start_monitor(filename):
+        monitor = None
+        file = Gio.File.new_for_path(filename)
+        try:
+            info = file.get_parent().query_filesystem_info('filesystem::remote', None)
+            if not info.get_attribute_boolean('filesystem::remote'):
+                monitor = file.monitor_file(Gio.FileMonitorFlags.WATCH_MOVES, None)
+        except GLib.Error:
+            monitor = None
+
+        if monitor != None:
+            monitor.connect('changed', FileWatcher.on_monitor_changed, filename)
+            FileWatcher.monitors[filename] = monitor
+        else:
+            FileWatcher.polled_files[filename] = FileWatcher.get_file_state(filename)
+            if not FileWatcher.is_polling:
+                FileWatcher.is_polling = True
+                GLib.timeout_add(FileWatcher.polling_interval, FileWatcher.poll_files)
+
+    def stop_monitor(filename):
+        if filename in FileWatcher.monitors:
+            FileWatcher.monitors[filename].cancel()
+            del(FileWatcher.monitors[filename])
+        if filename in FileWatcher.polled_files:
+            del(FileWatcher.polled_files[filename])
+        if filename in FileWatcher.pending_notifications:
+            GLib.source_remove(FileWatcher.pending_notifications[filename])
+            del(FileWatcher.pending_notifications[filename])
+
+    def on_monitor_changed(monitor, file, other_file, event_type, filename):
+        FileWatcher.schedule_notification(filename)
+
+    def poll_files():
+        if len(FileWatcher.polled_files) == 0:
+            FileWatcher.is_polling = False
+            return False
+
+        for filename, state in FileWatcher.polled_files.items():
+            new_state = FileWatcher.get_file_state(filename)
+            if new_state != state:
+                FileWatcher.polled_files[filename] = new_state
+                FileWatcher.schedule_notification(filename)
+        return True
+
+    def get_file_state(filename):
+        try: stat_result = os.stat(filename)
+        except OSError:
+            return None
+        return (stat_result.st_mtime, stat_result.st_size)
+
+    def schedule_notification(filename):
+        if filename in FileWatcher.pending_notifications:
+            GLib.source_remove(FileWatcher.pending_notifications[filename])
+        FileWatcher.pending_notifications[filename] = GLib.timeout_add(FileWatcher.debounce_interval, FileWatcher.notify, filename)
+
+    def notify(filename):
+        del(FileWatcher.pending_notifications[filename])
+        for callback in list(FileWatcher.subscribers.get(filename, [])):
+            callback(filename)
+        return False
+
+
@@ -0,0 +1,82 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import gi
+from gi.repository import GLib
+
+from setzer.app.service_locator import ServiceLocator
+
+
+class IdleBuilder():
+    ''' Builds the text of the root (or active) document as it is in the
+        editor, once typing has stopped for a moment. Other project files
+        are built as they are on disk, so saving one also starts a build. '''
+
+    timeout_id = None
+
+    # milliseconds without changes before a build starts
+    delay = 1000
+
+    def init(workspace):
+        workspace.connect('new_document', IdleBuilder.on_new_document)
+        workspace.connect('document_removed', IdleBuilder.on_document_removed)
+        for document in workspace.open_documents:
+            IdleBuilder.on_new_document(workspace, document)
+
+    def on_new_document(workspace, document):
+        document.connect('changed', IdleBuilder.on_document_changed)
+        document.connect('modified_changed', IdleBuilder.on_modified_changed)
+
+    def on_document_removed(workspace, document):
+        document.disconnect('changed', IdleBuilder.on_document_changed)
+        document.disconnect('modified_changed', IdleBuilder.on_modified_changed)
+
+    def on_document_changed(document):
+        if document == ServiceLocator.get_workspace().get_root_or_active_latex_document():
+            IdleBuilder.schedule_build()
+
+    def on_modified_changed(document):
+        if document == ServiceLocator.get_workspace().get_root_or_active_latex_document(): return
+        if not document.source_buffer.get_modified():
+            IdleBuilder.schedule_build()
+
+    def schedule_build():
+        if not ServiceLocator.get_settings().get_value('preferences', 'build_on_idle'): return
+
+        if IdleBuilder.timeout_id != None:
+            GLib.source_remove(IdleBuilder.timeout_id)
+        IdleBuilder.timeout_id = GLib.timeout_add(IdleBuilder.delay, IdleBuilder.build)
+
+    def build():
+        workspace = ServiceLocator.get_workspace()
+        document = workspace.get_root_or_active_latex_document()
+        active_document = workspace.get_active_document()
+        if document == None or active_document == None or document.filename == None:
+            IdleBuilder.timeout_id = None
+            return False
+
+        # builds started by the user aren't interrupted, the
+        # snapshot is taken once they are done.
+        build_system = document.build_system
+        if build_system.get_build_state() != 'idle' and build_system.get_build_mode() != 'build_on_idle':
+            return True
+
+        IdleBuilder.timeout_id = None
+        build_system.build_on_idle(active_document)
+        return False
+
+
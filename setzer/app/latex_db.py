@@ -15,37 +15,98 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
-import gi
-gi.require_version('Gtk', '4.0')
-from gi.repository import GObject
-
-import os.path, re, time, bibtexparser
+import os.path, re, time, pickle
 import xml.etree.ElementTree as ET
 
-import setzer.helpers.path as path_helpers
+from setzer.app.project_index import ProjectIndex
+from setzer.app.completion_index import CompletionIndex
 from setzer.app.service_locator import ServiceLocator
 
 
 class LaTeXDB():
+    ''' Commands, packages and languages from the xml files of the
+        resources. They are read on first use, from a cache in the user
+        cache directory that is made again when the xml files change. '''
+
+    command_files = ['additional.xml', 'latex-document.xml', 'dynamic.xml', 'tex.xml', 'textcomp.xml', 'graphicx.xml', 'latex-dev.xml', 'amsmath.xml', 'amsopn.xml', 'amsbsy.xml', 'amsfonts.xml', 'amssymb.xml', 'amsthm.xml', 'color.xml', 'url.xml', 'geometry.xml', 'glossaries.xml', 'beamer.xml', 'hyperref.xml']
+    cache_version = 1
 
-    static_proposals = dict()
+    static_index = None
+    languages = None
+    packages = None
     resources_path = None
     dynamic_commands = dict()
     dynamic_commands['references'] = ['\\ref*', '\\ref', '\\pageref*', '\\pageref', '\\eqref']
     dynamic_commands['citations'] = ['\\citet*', '\\citet', '\\citep*', '\\citep', '\\citealt', '\\citealp', '\\citeauthor*', '\\citeauthor', '\\citeyearpar', '\\citeyear', '\\textcite', '\\parencite', '\\autocite', '\\cite']
-    files = dict()
     languages_dict = None
     packages_dict = None
 
+    # labels and bibitems of the project, updated when the project index
+    # reports a new version of them.
+    dynamic_indexes = {'labels': CompletionIndex(), 'bibitems': CompletionIndex()}
+    dynamic_values = {'labels': set(), 'bibitems': set()}
+    dynamic_versions = {'labels': None, 'bibitems': None}
+
+    # (number of uses, time of last use) by command, kept between sessions
+    usage = dict()
+    usage_half_life = 60 * 60 * 24 * 7
+
+    # words shorter than this are only matched by prefix
+    min_fuzzy_length = 4
+
     def init(resources_path):
         LaTeXDB.resources_path = resources_path
-        LaTeXDB.generate_static_proposals()
-        LaTeXDB.parse_included_files()
-        GObject.timeout_add(3000, LaTeXDB.parse_included_files)
+
+    def load():
+        if LaTeXDB.static_index != None: return
+
+        pathname = os.path.join(ServiceLocator.get_cache_folder(), 'latexdb.pickle')
+        mtimes = LaTeXDB.get_resource_mtimes()
+        try: filehandle = open(pathname, 'rb')
+        except IOError: data = None
+        else:
+            try: data = pickle.load(filehandle)
+            except (EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+                data = None
+            filehandle.close()
+
+        if data == None or data['version'] != LaTeXDB.cache_version or data['mtimes'] != mtimes:
+            data = {'version': LaTeXDB.cache_version, 'mtimes': mtimes}
+            data['static_index'] = LaTeXDB.generate_static_index()
+            data['languages'] = LaTeXDB.read_xml_file(os.path.join('languages', 'languages.xml'), ['code', 'name'])
+            data['packages'] = LaTeXDB.read_xml_file(os.path.join('packages', 'general.xml'), ['name', 'text', 'description'])
+            try:
+                os.makedirs(ServiceLocator.get_cache_folder(), exist_ok=True)
+                filehandle = open(pathname, 'wb')
+            except IOError: pass
+            else:
+                pickle.dump(data, filehandle)
+                filehandle.close()
+
+        LaTeXDB.static_index = data['static_index']
+        LaTeXDB.languages = data['languages']
+        LaTeXDB.packages = data['packages']
+        LaTeXDB.populate_usage_from_disk()
+
+    def get_resource_mtimes():
+        filenames = [os.path.join('commands', filename) for filename in LaTeXDB.command_files]
+        filenames += [os.path.join('languages', 'languages.xml'), os.path.join('packages', 'general.xml')]
+
+        mtimes = dict()
+        for filename in filenames:
+            try: mtimes[filename] = os.path.getmtime(os.path.join(LaTeXDB.resources_path, 'latexdb', filename))
+            except OSError: mtimes[filename] = None
+        return mtimes
+
+    def read_xml_file(filename, attributes):
+        rows = list()
+        tree = ET.parse(os.path.join(LaTeXDB.resources_path, 'latexdb', filename))
+        for child in tree.getroot():
+            rows.append(tuple(child.attrib[attribute] for attribute in attributes))
+        return rows
 
     def get_items(word, top_item=None):
-        try: static_items = LaTeXDB.static_proposals[word.lower()]
-        except KeyError: static_items = list()
+        static_items = LaTeXDB.get_static_proposals(word)
         dynamic_items = LaTeXDB.get_dynamic_proposals(word.lower())
         if len(static_items) > 0 and len(dynamic_items) > 4:
             items = dynamic_items[:5] + static_items + dynamic_items[5:]
@@ -61,37 +122,38 @@ class LaTeXDB():
                 result.append(item)
         return result
 
-    def generate_static_proposals():
+    def generate_static_index():
         commands = LaTeXDB.get_commands()
-        LaTeXDB.static_proposals = dict()
-        for command in commands.values():
-            if not command['lowpriority']:
-                for i in range(2, len(command['command']) + 1):
-                    if not command['command'][0:i].lower() in LaTeXDB.static_proposals:
-                        LaTeXDB.static_proposals[command['command'][0:i].lower()] = []
-                    if len(LaTeXDB.static_proposals[command['command'][0:i].lower()]) < 20:
-                        LaTeXDB.static_proposals[command['command'][0:i].lower()].append(command)
-        for command in commands.values():
-            if command['lowpriority']:
-                for i in range(2, len(command['command']) + 1):
-                    if not command['command'][0:i].lower() in LaTeXDB.static_proposals:
-                        LaTeXDB.static_proposals[command['command'][0:i].lower()] = []
-                    if len(LaTeXDB.static_proposals[command['command'][0:i].lower()]) < 20:
-                        LaTeXDB.static_proposals[command['command'][0:i].lower()].append(command)
+        pairs = list()
+        for order, command in enumerate(commands.values()):
+            command['order'] = order
+            pairs.append((command['command'], command))
+        return CompletionIndex(pairs)
+
+    def get_static_proposals(word):
+        # commands starting with word come first, then those with its
+        # letters in order. more often and recently used ones come first.
+        if len(word) < 2: return list()
+
+        LaTeXDB.load()
+        items = list(LaTeXDB.static_index.get_prefix_matches(word))
+        items.sort(key=lambda item: (-LaTeXDB.get_usage_score(item['command']), item['lowpriority'], item['order']))
+        if len(word) >= LaTeXDB.min_fuzzy_length:
+            matches = list(LaTeXDB.static_index.get_fuzzy_matches(word))
+            matches.sort(key=lambda match: (match[0], -LaTeXDB.get_usage_score(match[1]['command']), match[1]['lowpriority'], match[1]['order']))
+            items += [item for distance, item in matches]
+        return items
 
     def get_commands():
         commands = dict()
-        for filename in ['additional.xml', 'latex-document.xml', 'dynamic.xml', 'tex.xml', 'textcomp.xml', 'graphicx.xml', 'latex-dev.xml', 'amsmath.xml', 'amsopn.xml', 'amsbsy.xml', 'amsfonts.xml', 'amssymb.xml', 'amsthm.xml', 'color.xml', 'url.xml', 'geometry.xml', 'glossaries.xml', 'beamer.xml', 'hyperref.xml']:
-            tree = ET.parse(os.path.join(LaTeXDB.resources_path, 'latexdb', 'commands', filename))
-            root = tree.getroot()
-            for child in root:
-                attrib = child.attrib
-                commands[attrib['name']] = {'command': attrib['text'], 'description': _(attrib['description']), 'lowpriority': True if attrib['lowpriority'] == "True" else False, 'dotlabels': attrib['dotlabels']}
+        for filename in LaTeXDB.command_files:
+            for name, text, description, lowpriority, dotlabels in LaTeXDB.read_xml_file(os.path.join('commands', filename), ['name', 'text', 'description', 'lowpriority', 'dotlabels']):
+                # descriptions are translated where they are shown, as
+                # the cache is the same for all languages.
+                commands[name] = {'command': text, 'description': description, 'lowpriority': True if lowpriority == "True" else False, 'dotlabels': dotlabels}
         return commands
 
     def get_dynamic_proposals(word):
-        documents = []
-
         ref_regex = '(' + re.escape('|'.join(LaTeXDB.dynamic_commands['references'])).replace('\\|', '|') + ')'
         cite_regex = '(' + re.escape('|'.join(LaTeXDB.dynamic_commands['citations'])).replace('\\|', '|') + ')'
         matchings = dict()
@@ -100,100 +162,80 @@ class LaTeXDB():
         key = 'labels' if matchings['labels'] != None else 'bibitems'
         if matchings['labels'] == None and matchings['bibitems'] == None: return list()
 
+        # the word is a command, maybe followed by the start of a value
+        command_name = matchings[key].group(1)
+        rest = word[len(command_name):]
+        if rest == '':
+            prefix = ''
+        elif rest.startswith('{'):
+            prefix = rest[1:]
+        else:
+            return list()
+
+        LaTeXDB.update_dynamic_index(key)
         commands = list()
-        for file in LaTeXDB.files.values():
-            for value in file[key]:
-                command = matchings[key].group(1) + '{' + value + '}'
-                if command.startswith(word):
-                    commands.append({'command': command, 'description': '', 'lowpriority': False, 'dotlabels': ''})
+        for value in LaTeXDB.dynamic_indexes[key].get_prefix_matches(prefix):
+            commands.append({'command': command_name + '{' + value + '}', 'description': '', 'lowpriority': False, 'dotlabels': ''})
+        commands.sort(key=lambda item: -LaTeXDB.get_usage_score(item['command']))
         return commands
 
-    def parse_included_files():
-        workspace = ServiceLocator.get_workspace()
-        if workspace == None: return
-
-        def get_file_dict(filename):
-            if filename in LaTeXDB.files:
-                return LaTeXDB.files[filename]
-            else:
-                return {'last_parse': -1, 'bibitems': list(), 'labels': list(), 'includes': list()}
-
-        files = dict()
-        for document in ServiceLocator.get_workspace().open_documents:
-            if document.get_filename() != None:
-                files[document.get_filename()] = get_file_dict(document.get_filename())
-                files[document.get_filename()]['includes'] = list()
-
-                dirname = document.get_dirname()
-                for filename, offset in document.parser.symbols['included_latex_files']:
-                    filename = path_helpers.get_abspath(filename, dirname)
-                    files[document.get_filename()]['includes'].append(filename)
-                    files[filename] = get_file_dict(filename)
-                for filename in document.parser.symbols['bibliographies']:
-                    filename = path_helpers.get_abspath(filename, dirname)
-                    files[document.get_filename()]['includes'].append(filename)
-                    files[filename] = get_file_dict(filename)
-        LaTeXDB.files = files
-
-        for filename, file_dict in LaTeXDB.files.items():
-            if os.path.isfile(filename):
-                last_modified = os.path.getmtime(filename)
-                if file_dict['last_parse'] < last_modified:
-                    if filename.endswith('.tex'):
-                        LaTeXDB.parse_latex_file(filename)
-                    elif filename.endswith('.bib'):
-                        LaTeXDB.parse_bibtex_file(filename)
-                    LaTeXDB.files[filename]['last_parse'] = time.time()
-
-        return True
-
-    def parse_latex_file(pathname):
-        with open(pathname, 'r') as f:
-            text = f.read()
-        labels = set()
-        bibitems = set()
-        latex_parser_regex = ServiceLocator.get_regex_object(r'\\(label|include|input|bibliography|addbibresource)\{((?:\s|\w|\:|\.|,)*)\}|\\(usepackage)(?:\[.*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}')
-        for match in latex_parser_regex.finditer(text):
-            if match.group(1) == 'label':
-                labels = labels | {match.group(2).strip()}
-            elif match.group(5) == 'bibitem':
-                bibitems = bibitems | {match.group(6).strip()}
-
-        LaTeXDB.files[pathname]['bibitems'] = bibitems
-        LaTeXDB.files[pathname]['labels'] = labels
-
-    def parse_bibtex_file(pathname):
-        with open(pathname, 'r') as f:
-            db = bibtexparser.load(f)
-        bibitems = set()
-        for match in db.entries:
-            bibitems = bibitems | {match['ID']}
-
-        LaTeXDB.files[pathname]['bibitems'] = bibitems
+    def update_dynamic_index(key):
+        # only the values added or removed since the last update are
+        # put into the index or taken out of it.
+        version = ProjectIndex.get_symbols_version(key)
+        if version == LaTeXDB.dynamic_versions[key]: return
+
+        values = ProjectIndex.get_symbols(key)
+        index = LaTeXDB.dynamic_indexes[key]
+        for value in LaTeXDB.dynamic_values[key] - values:
+            index.remove(value, value)
+        for value in values - LaTeXDB.dynamic_values[key]:
+            index.add(value, value)
+        LaTeXDB.dynamic_values[key] = set(values)
+        LaTeXDB.dynamic_versions[key] = version
+
+    def add_usage(command):
+        count, last_used = LaTeXDB.usage.get(command, (0, 0))
+        LaTeXDB.usage[command] = (count + 1, time.time())
+        LaTeXDB.save_usage_to_disk()
+
+    def get_usage_score(command):
+        if command not in LaTeXDB.usage: return 0
+
+        count, last_used = LaTeXDB.usage[command]
+        return count * 0.5 ** ((time.time() - last_used) / LaTeXDB.usage_half_life)
+
+    def populate_usage_from_disk():
+        try: filehandle = open(os.path.join(ServiceLocator.get_config_folder(), 'completion_usage.pickle'), 'rb')
+        except IOError: pass
+        else:
+            try: LaTeXDB.usage = pickle.load(filehandle)
+            except (EOFError, pickle.UnpicklingError):
+                LaTeXDB.usage = dict()
+            filehandle.close()
+
+    def save_usage_to_disk():
+        try: filehandle = open(os.path.join(ServiceLocator.get_config_folder(), 'completion_usage.pickle'), 'wb')
+        except IOError: pass
+        else:
+            pickle.dump(LaTeXDB.usage, filehandle)
+            filehandle.close()
 
     def get_languages_dict():
         if LaTeXDB.languages_dict == None:
+            LaTeXDB.load()
             LaTeXDB.languages_dict = dict()
-
-            resources_path = ServiceLocator.get_resources_path()
-            tree = ET.parse(os.path.join(resources_path, 'latexdb', 'languages', 'languages.xml'))
-            root = tree.getroot()
-            for child in root:
-                attrib = child.attrib
-                LaTeXDB.languages_dict[attrib['code']] = _(attrib['name'])
+            for code, name in LaTeXDB.languages:
+                LaTeXDB.languages_dict[code] = _(name)
 
         return LaTeXDB.languages_dict
 
     def get_packages_dict():
         if LaTeXDB.packages_dict == None:
+            LaTeXDB.load()
             LaTeXDB.packages_dict = dict()
-
-            resources_path = ServiceLocator.get_resources_path()
-            tree = ET.parse(os.path.join(resources_path, 'latexdb', 'packages', 'general.xml'))
-            root = tree.getroot()
-            for child in root:
-                attrib = child.attrib
-                LaTeXDB.packages_dict[attrib['name']] = {'command': attrib['text'], 'description': _(attrib['description'])}
+            for name, text, description in LaTeXDB.packages:
+                LaTeXDB.packages_dict[name] = {'command': text, 'description': _(description)}
         return LaTeXDB.packages_dict
 
 
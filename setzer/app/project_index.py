@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import gi
+from gi.repository import GLib
+
+import os.path, time, pickle
+
+import setzer.helpers.path as path_helpers
+from setzer.document.parser.parser_latex import ParserLaTeX
+from setzer.app.service_locator import ServiceLocator
+from setzer.app.file_watcher import FileWatcher
+
+
+class ProjectIndex():
+    ''' Symbols of all files reachable from the open documents through
+        includes and bibliographies. Open documents are taken from their
+        parsers, other files are parsed once and again only when they
+        change on disk. The index is kept between sessions. '''
+
+    files = dict()
+    project_files = list()
+
+    # union of the labels and bibitems of the project files, with a
+    # version that changes whenever they do.
+    symbols = {'labels': set(), 'bibitems': set()}
+    symbols_version = {'labels': 0, 'bibitems': 0}
+    pathname = None
+    has_changes = False
+    update_scheduled = False
+
+    # closed files are checked on disk only once, and again after
+    # the file watcher reports a change.
+    watched_files = set()
+    up_to_date_files = set()
+
+    # entries not used for this long are dropped when saving
+    max_age = 60 * 60 * 24 * 30
+
+    def init(workspace):
+        ProjectIndex.pathname = os.path.join(ServiceLocator.get_config_folder(), 'project_index.pickle')
+        ProjectIndex.populate_from_disk()
+
+        workspace.connect('new_document', ProjectIndex.on_new_document)
+        workspace.connect('document_removed', ProjectIndex.on_document_removed)
+        for document in workspace.open_documents:
+            ProjectIndex.on_new_document(workspace, document)
+
+    def on_new_document(workspace, document):
+        document.parser.connect('finished_parsing', ProjectIndex.on_finished_parsing)
+        document.connect('filename_change', ProjectIndex.on_filename_change)
+        ProjectIndex.schedule_update()
+
+    def on_document_removed(workspace, document):
+        document.parser.disconnect('finished_parsing', ProjectIndex.on_finished_parsing)
+        document.disconnect('filename_change', ProjectIndex.on_filename_change)
+        ProjectIndex.up_to_date_files.discard(document.get_filename())
+        ProjectIndex.schedule_update()
+
+    def on_finished_parsing(parser):
+        ProjectIndex.schedule_update()
+
+    def on_filename_change(document, filename=None):
+        ProjectIndex.schedule_update()
+
+    def on_file_changed(filename):
+        ProjectIndex.up_to_date_files.discard(filename)
+        ProjectIndex.schedule_update()
+
+    def schedule_update():
+        if not ProjectIndex.update_scheduled:
+            ProjectIndex.update_scheduled = True
+            GLib.idle_add(ProjectIndex.update)
+
+    def update():
+        ProjectIndex.update_scheduled = False
+        workspace = ServiceLocator.get_workspace()
+        if workspace == None: return False
+
+        open_documents = dict()
+        for document in workspace.open_documents:
+            if document.get_filename() != None:
+                open_documents[document.get_filename()] = document
+
+        # walk the include graph starting from the open documents.
+        project_files = list()
+        visited = set()
+        todo = list(open_documents)
+        while len(todo) > 0:
+            filename = todo.pop()
+            if filename in visited: continue
+            visited.add(filename)
+
+            if filename in open_documents:
+                file_dict = ProjectIndex.get_file_dict_from_document(open_documents[filename])
+            else:
+                file_dict = ProjectIndex.get_file_dict_from_disk(filename)
+            if file_dict == None: continue
+
+            file_dict['last_used'] = time.time()
+            project_files.append(filename)
+            todo += [include for include, offset in file_dict['includes']]
+            todo += file_dict['bibliographies']
+        ProjectIndex.project_files = project_files
+        for key in ProjectIndex.symbols:
+            symbols = set()
+            for filename in project_files:
+                symbols |= ProjectIndex.files[filename][key]
+            if symbols != ProjectIndex.symbols[key]:
+                ProjectIndex.symbols[key] = symbols
+                ProjectIndex.symbols_version[key] += 1
+
+        # only closed files are watched here, open documents are
+        # watched by their controllers.
+        watched_files = set(filename for filename in visited if filename not in open_documents)
+        for filename in ProjectIndex.watched_files - watched_files:
+            FileWatcher.unwatch(filename, ProjectIndex.on_file_changed)
+            ProjectIndex.up_to_date_files.discard(filename)
+        for filename in watched_files - ProjectIndex.watched_files:
+            FileWatcher.watch(filename, ProjectIndex.on_file_changed)
+        ProjectIndex.watched_files = watched_files
+
+        if ProjectIndex.has_changes:
+            ProjectIndex.save_to_disk()
+        return False
+
+    def get_file_dict_from_document(document):
+        if document.is_latex_document():
+            symbols = document.parser.symbols
+            dirname = document.get_dirname()
+
+            file_dict = {'mtime': None}
+            file_dict['labels'] = symbols['labels']
+            file_dict['bibitems'] = symbols['bibitems']
+            file_dict['packages'] = symbols['packages']
+            file_dict['includes'] = ProjectIndex.get_includes(document)
+            file_dict['bibliographies'] = [path_helpers.get_abspath(filename, dirname) for filename in symbols['bibliographies']]
+            file_dict['sections'] = [(block[4], block[5], block[0]) for block in symbols['blocks'] if len(block) == 6]
+        else:
+            file_dict = ProjectIndex.get_empty_file_dict()
+            file_dict['mtime'] = None
+            file_dict['bibitems'] = document.parser.symbols['bibitems']
+
+        # the document may change on disk when it is closed or saved,
+        # no modification time makes sure it's parsed again then.
+        ProjectIndex.files[document.get_filename()] = file_dict
+        return file_dict
+
+    def get_file_dict_from_disk(filename):
+        if filename in ProjectIndex.up_to_date_files:
+            return ProjectIndex.files.get(filename, None)
+        ProjectIndex.up_to_date_files.add(filename)
+
+        try: mtime = os.path.getmtime(filename)
+        except OSError:
+            if filename in ProjectIndex.files:
+                del(ProjectIndex.files[filename])
+            return None
+
+        if filename in ProjectIndex.files and ProjectIndex.files[filename]['mtime'] == mtime:
+            return ProjectIndex.files[filename]
+
+        if filename.endswith('.tex'):
+            file_dict = ProjectIndex.parse_latex_file(filename)
+        elif filename.endswith('.bib'):
+            file_dict = ProjectIndex.parse_bibtex_file(filename)
+        else:
+            return None
+        if file_dict == None:
+            if filename in ProjectIndex.files:
+                del(ProjectIndex.files[filename])
+            return None
+
+        file_dict['mtime'] = mtime
+        ProjectIndex.files[filename] = file_dict
+        ProjectIndex.has_changes = True
+        return file_dict
+
+    def get_empty_file_dict():
+        return {'labels': set(), 'bibitems': set(), 'packages': set(), 'includes': list(), 'bibliographies': list(), 'sections': list()}
+
+    def parse_latex_file(pathname):
+        try:
+            with open(pathname, 'r') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+        dirname = os.path.dirname(pathname)
+        file_dict = ProjectIndex.get_empty_file_dict()
+        for match in ServiceLocator.get_regex_object(ParserLaTeX.symbols_pattern).finditer(text):
+            if match.group(1) == 'label':
+                file_dict['labels'].add(match.group(2).strip())
+            elif match.group(1) in ['include', 'input', 'subfile', 'subimport']:
+                filename = match.group(2).strip()
+                if not filename.endswith('.tex'):
+                    filename += '.tex'
+                file_dict['includes'].append((path_helpers.get_abspath(filename, dirname), match.start()))
+            elif match.group(1) == 'bibliography':
+                for entry in match.group(2).strip().split(','):
+                    file_dict['bibliographies'].append(path_helpers.get_abspath(entry.strip() + '.bib', dirname))
+            elif match.group(1) == 'addbibresource':
+                for entry in match.group(2).strip().split(','):
+                    file_dict['bibliographies'].append(path_helpers.get_abspath(entry.strip(), dirname))
+            elif match.group(3) == 'usepackage':
+                file_dict['packages'].add(match.group(4).strip())
+            elif match.group(5) == 'bibitem':
+                file_dict['bibitems'].add(match.group(6).strip())
+        for match in ServiceLocator.get_regex_object(ParserLaTeX.blocks_pattern).finditer(text):
+            if match.group(3) != None:
+                file_dict['sections'].append((match.group(3), match.group(4), match.start()))
+        return file_dict
+
+    def parse_bibtex_file(pathname):
+        import bibtexparser
+
+        try:
+            with open(pathname, 'r') as f:
+                db = bibtexparser.load(f)
+        except (OSError, UnicodeDecodeError):
+            return None
+
+        file_dict = ProjectIndex.get_empty_file_dict()
+        for entry in db.entries:
+            file_dict['bibitems'].add(entry['ID'])
+        return file_dict
+
+    def get_includes(document):
+        ''' (absolute filename, offset) for each file included by document. '''
+
+        dirname = document.get_dirname()
+        includes = list()
+        for filename, offset in document.parser.symbols['included_latex_files']:
+            includes.append((path_helpers.get_abspath(filename, dirname), offset))
+        return includes
+
+    def get_project_files(filename):
+        ''' The latex files reachable from filename, filename included. '''
+
+        project_files = list()
+        visited = set()
+        todo = [filename]
+        while len(todo) > 0:
+            filename = todo.pop(0)
+            if filename in visited or filename not in ProjectIndex.files: continue
+            visited.add(filename)
+            project_files.append(filename)
+            todo += [include for include, offset in ProjectIndex.files[filename]['includes']]
+        return project_files
+
+    def get_symbols(key):
+        ''' The union of labels or bibitems of all project files. '''
+
+        return ProjectIndex.symbols[key]
+
+    def get_symbols_version(key):
+        return ProjectIndex.symbols_version[key]
+
+    def get_sections(filename):
+        ''' (type, title, offset) for each section in the file. '''
+
+        if filename not in ProjectIndex.files: return list()
+        return ProjectIndex.files[filename]['sections']
+
+    def populate_from_disk():
+        try: filehandle = open(ProjectIndex.pathname, 'rb')
+        except IOError: pass
+        else:
+            try: ProjectIndex.files = pickle.load(filehandle)
+            except (EOFError, pickle.UnpicklingError):
+                ProjectIndex.files = dict()
+            filehandle.close()
+
+    def save_to_disk():
+        files = dict()
+        for filename, file_dict in ProjectIndex.files.items():
+            if file_dict['mtime'] != None and file_dict['last_used'] > time.time() - ProjectIndex.max_age:
+                files[filename] = file_dict
+
+        try: filehandle = open(ProjectIndex.pathname, 'wb')
+        except IOError: pass
+        else:
+            pickle.dump(files, filehandle)
+            filehandle.close()
+        ProjectIndex.has_changes = False
+
+
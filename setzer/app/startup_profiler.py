@@ -0,0 +1,129 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import builtins
+import contextlib
+import threading
+import json
+import time
+import sys
+import os
+
+
+class StartupProfiler():
+    ''' Records how long importing each module and each step of starting
+        up takes, until the window can be typed in. Enabled by setting
+        SETZER_PROFILE_STARTUP, to 1 for printing a report, or to the
+        name of a file the results are written to as JSON. This module
+        only imports the standard library, so it can be started before
+        anything else is imported. '''
+
+    is_enabled = False
+    output = None
+    start_time = None
+    original_import = None
+
+    # module name: (total seconds, seconds without the modules it imported)
+    imports = dict()
+    steps = list()
+
+    # seconds spent in nested imports, for each import in progress
+    import_stack = list()
+
+    def start():
+        output = os.environ.get('SETZER_PROFILE_STARTUP', '')
+        if output == '': return
+
+        StartupProfiler.is_enabled = True
+        StartupProfiler.output = output
+        StartupProfiler.start_time = time.perf_counter()
+        StartupProfiler.original_import = builtins.__import__
+        builtins.__import__ = StartupProfiler.timed_import
+
+    def timed_import(name, globals=None, locals=None, fromlist=(), level=0):
+        original_import = StartupProfiler.original_import
+        if level > 0 or threading.current_thread() is not threading.main_thread():
+            return original_import(name, globals, locals, fromlist, level)
+
+        # "from gi.repository import Gtk" loads Gtk, not gi.repository.
+        if name not in sys.modules:
+            candidates = [name]
+        else:
+            candidates = [name + '.' + item for item in (fromlist or ()) if item != '*' and name + '.' + item not in sys.modules]
+        if len(candidates) == 0:
+            return original_import(name, globals, locals, fromlist, level)
+
+        StartupProfiler.import_stack.append(0)
+        start_time = time.perf_counter()
+        try:
+            return original_import(name, globals, locals, fromlist, level)
+        finally:
+            duration = time.perf_counter() - start_time
+            nested_duration = StartupProfiler.import_stack.pop()
+
+            # names in fromlist that turn out not to be modules are
+            # counted as part of the module importing them.
+            loaded = [module_name for module_name in candidates if module_name in sys.modules]
+            if len(loaded) > 0:
+                StartupProfiler.imports[loaded[0]] = (duration, duration - nested_duration)
+                if len(StartupProfiler.import_stack) > 0:
+                    StartupProfiler.import_stack[-1] += duration
+
+    @contextlib.contextmanager
+    def measure(name):
+        start_time = time.perf_counter()
+        try:
+            yield
+        finally:
+            if StartupProfiler.is_enabled:
+                StartupProfiler.steps.append((name, time.perf_counter() - start_time))
+
+    def finish():
+        ''' Called once the window is shown with the documents loaded. '''
+
+        if not StartupProfiler.is_enabled: return False
+        StartupProfiler.is_enabled = False
+        builtins.__import__ = StartupProfiler.original_import
+
+        results = dict()
+        results['total_ms'] = (time.perf_counter() - StartupProfiler.start_time) * 1000
+        results['steps'] = [[name, duration * 1000] for name, duration in StartupProfiler.steps]
+        results['imports'] = dict()
+        for name, (duration, self_duration) in StartupProfiler.imports.items():
+            results['imports'][name] = {'total_ms': duration * 1000, 'self_ms': self_duration * 1000}
+
+        if StartupProfiler.output == '1':
+            StartupProfiler.print_results(results)
+        else:
+            try:
+                with open(StartupProfiler.output, 'w') as f:
+                    json.dump(results, f, indent=4)
+            except OSError as error:
+                print('startup profile not written: ' + str(error))
+        return False
+
+    def print_results(results, number_of_imports=30):
+        print('{:.0f} ms until the window could be edited\n'.format(results['total_ms']))
+        print('{:<60} {:>10} {:>10}'.format('slowest imports', 'self ms', 'total ms'))
+        imports = sorted(results['imports'].items(), key=lambda item: -item[1]['self_ms'])
+        for name, result in imports[:number_of_imports]:
+            print('{:<60} {:>10.1f} {:>10.1f}'.format(name, result['self_ms'], result['total_ms']))
+        print('\n{:<60} {:>10}'.format('steps', 'ms'))
+        for name, duration in results['steps']:
+            print('{:<60} {:>10.1f}'.format(name, duration))
+
+
@@ -0,0 +1,126 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import os.path, pickle
+import xml.etree.ElementTree as ET
+
+from setzer.app.completion_index import CompletionIndex
+from setzer.app.service_locator import ServiceLocator
+
+
+class SymbolCatalogue():
+    ''' The symbols of the sidebar from the xml files in the resources,
+        read on first use from a cache in the user cache directory that
+        is made again when the xml files change. Symbols are
+        (icon name, command, package, width, height) tuples. '''
+
+    categories = ['greek_letters', 'arrows', 'relations', 'operators', 'misc_math', 'misc_text']
+    cache_version = 1
+
+    symbols = None
+    symbols_by_command = None
+
+    # every suffix of the icon names, so words found anywhere in
+    # a name are found by prefix. items are (category, number).
+    search_index = None
+
+    def load():
+        if SymbolCatalogue.symbols != None: return
+
+        pathname = os.path.join(ServiceLocator.get_cache_folder(), 'symbols.pickle')
+        mtimes = SymbolCatalogue.get_resource_mtimes()
+        try: filehandle = open(pathname, 'rb')
+        except IOError: data = None
+        else:
+            try: data = pickle.load(filehandle)
+            except (EOFError, pickle.UnpicklingError, AttributeError, ImportError):
+                data = None
+            filehandle.close()
+
+        if data == None or data['version'] != SymbolCatalogue.cache_version or data['mtimes'] != mtimes:
+            data = {'version': SymbolCatalogue.cache_version, 'mtimes': mtimes}
+            data['symbols'] = SymbolCatalogue.read_symbols()
+            data['search_index'] = SymbolCatalogue.generate_search_index(data['symbols'])
+            try:
+                os.makedirs(ServiceLocator.get_cache_folder(), exist_ok=True)
+                filehandle = open(pathname, 'wb')
+            except IOError: pass
+            else:
+                pickle.dump(data, filehandle)
+                filehandle.close()
+
+        SymbolCatalogue.symbols = data['symbols']
+        SymbolCatalogue.search_index = data['search_index']
+        SymbolCatalogue.symbols_by_command = dict()
+        for category, symbols in SymbolCatalogue.symbols.items():
+            for symbol in symbols:
+                SymbolCatalogue.symbols_by_command[(category, symbol[1])] = symbol
+
+    def get_resource_mtimes():
+        mtimes = dict()
+        for category in SymbolCatalogue.categories:
+            try: mtimes[category] = os.path.getmtime(SymbolCatalogue.get_xml_filename(category))
+            except OSError: mtimes[category] = None
+        return mtimes
+
+    def get_xml_filename(category):
+        return os.path.join(ServiceLocator.get_resources_path(), 'symbols', category + '.xml')
+
+    def read_symbols():
+        symbols = dict()
+        for category in SymbolCatalogue.categories:
+            symbols[category] = list()
+            try: tree = ET.parse(SymbolCatalogue.get_xml_filename(category))
+            except (OSError, ET.ParseError): continue
+
+            for child in tree.getroot():
+                attrib = child.attrib
+                symbols[category].append((attrib['file'].rsplit('.')[0], attrib['command'], attrib.get('package', None), int(attrib.get('original_width', 10)), int(attrib.get('original_height', 10))))
+        return symbols
+
+    def generate_search_index(symbols):
+        pairs = list()
+        for category, category_symbols in symbols.items():
+            for number, symbol in enumerate(category_symbols):
+                for start in range(len(symbol[0])):
+                    pairs.append((symbol[0][start:], (category, number)))
+        return CompletionIndex(pairs)
+
+    def get_symbols(category):
+        SymbolCatalogue.load()
+        return SymbolCatalogue.symbols[category]
+
+    def get_symbol(category, command):
+        ''' The symbol, or None if there is none with command in category. '''
+
+        SymbolCatalogue.load()
+        return SymbolCatalogue.symbols_by_command.get((category, command), None)
+
+    def search(words):
+        ''' (category, number) of the symbols with every word in their
+            icon name, ignoring case. '''
+
+        SymbolCatalogue.load()
+        matches = None
+        for word in words:
+            word_matches = set(SymbolCatalogue.search_index.get_prefix_matches(word))
+            matches = word_matches if matches == None else matches & word_matches
+        if matches == None:
+            return set((category, number) for category, symbols in SymbolCatalogue.symbols.items() for number in range(len(symbols)))
+        return matches
+
+
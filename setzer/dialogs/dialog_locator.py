@@ -15,53 +15,56 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
-from setzer.dialogs.about.about import AboutDialog
-from setzer.dialogs.add_remove_packages.add_remove_packages import AddRemovePackagesDialog
-from setzer.dialogs.build_save.build_save import BuildSaveDialog
-from setzer.dialogs.building_failed.building_failed import BuildingFailedDialog
-from setzer.dialogs.close_confirmation.close_confirmation import CloseConfirmationDialog
-from setzer.dialogs.document_changed_on_disk.document_changed_on_disk import DocumentChangedOnDiskDialog
-from setzer.dialogs.document_deleted_on_disk.document_deleted_on_disk import DocumentDeletedOnDiskDialog
-from setzer.dialogs.document_wizard.document_wizard import DocumentWizard
-from setzer.dialogs.include_bibtex_file.include_bibtex_file import IncludeBibTeXFile
-from setzer.dialogs.include_latex_file.include_latex_file import IncludeLaTeXFile
-from setzer.dialogs.interpreter_missing.interpreter_missing import InterpreterMissingDialog
-from setzer.dialogs.keyboard_shortcuts.keyboard_shortcuts import KeyboardShortcutsDialog
-from setzer.dialogs.open_document.open_document import OpenDocumentDialog
-from setzer.dialogs.open_session.open_session import OpenSessionDialog
-from setzer.dialogs.preferences.preferences import PreferencesDialog
-from setzer.dialogs.replace_confirmation.replace_confirmation import ReplaceConfirmationDialog
-from setzer.dialogs.save_document.save_document import SaveDocumentDialog
-from setzer.dialogs.save_session.save_session import SaveSessionDialog
+import importlib
 
 
 class DialogLocator():
+    ''' Dialogs are created when they are first used, so their modules
+        aren't imported at startup. '''
+
+    # module, class and arguments after the main window of each dialog
+    dialog_classes = {
+        'about': ('setzer.dialogs.about.about', 'AboutDialog', []),
+        'add_remove_packages': ('setzer.dialogs.add_remove_packages.add_remove_packages', 'AddRemovePackagesDialog', []),
+        'build_save': ('setzer.dialogs.build_save.build_save', 'BuildSaveDialog', ['workspace']),
+        'document_changed_on_disk': ('setzer.dialogs.document_changed_on_disk.document_changed_on_disk', 'DocumentChangedOnDiskDialog', []),
+        'document_deleted_on_disk': ('setzer.dialogs.document_deleted_on_disk.document_deleted_on_disk', 'DocumentDeletedOnDiskDialog', []),
+        'document_wizard': ('setzer.dialogs.document_wizard.document_wizard', 'DocumentWizard', []),
+        'include_bibtex_file': ('setzer.dialogs.include_bibtex_file.include_bibtex_file', 'IncludeBibTeXFile', []),
+        'include_latex_file': ('setzer.dialogs.include_latex_file.include_latex_file', 'IncludeLaTeXFile', []),
+        'keyboard_shortcuts': ('setzer.dialogs.keyboard_shortcuts.keyboard_shortcuts', 'KeyboardShortcutsDialog', []),
+        'open_document': ('setzer.dialogs.open_document.open_document', 'OpenDocumentDialog', ['workspace']),
+        'open_session': ('setzer.dialogs.open_session.open_session', 'OpenSessionDialog', ['workspace']),
+        'preferences': ('setzer.dialogs.preferences.preferences', 'PreferencesDialog', []),
+        'replace_confirmation': ('setzer.dialogs.replace_confirmation.replace_confirmation', 'ReplaceConfirmationDialog', []),
+        'save_document': ('setzer.dialogs.save_document.save_document', 'SaveDocumentDialog', ['workspace']),
+        'save_session': ('setzer.dialogs.save_session.save_session', 'SaveSessionDialog', ['workspace']),
+        'close_confirmation': ('setzer.dialogs.close_confirmation.close_confirmation', 'CloseConfirmationDialog', ['workspace']),
+        'building_failed': ('setzer.dialogs.building_failed.building_failed', 'BuildingFailedDialog', ['preferences']),
+        'interpreter_missing': ('setzer.dialogs.interpreter_missing.interpreter_missing', 'InterpreterMissingDialog', ['preferences'])
+    }
 
     dialogs = dict()
+    main_window = None
+    workspace = None
 
     def init_dialogs(main_window, workspace):
-        dialogs = dict()
-        dialogs['about'] = AboutDialog(main_window)
-        dialogs['add_remove_packages'] = AddRemovePackagesDialog(main_window)
-        dialogs['build_save'] = BuildSaveDialog(main_window, workspace)
-        dialogs['document_changed_on_disk'] = DocumentChangedOnDiskDialog(main_window)
-        dialogs['document_deleted_on_disk'] = DocumentDeletedOnDiskDialog(main_window)
-        dialogs['document_wizard'] = DocumentWizard(main_window)
-        dialogs['include_bibtex_file'] = IncludeBibTeXFile(main_window)
-        dialogs['include_latex_file'] = IncludeLaTeXFile(main_window)
-        dialogs['keyboard_shortcuts'] = KeyboardShortcutsDialog(main_window)
-        dialogs['open_document'] = OpenDocumentDialog(main_window, workspace)
-        dialogs['open_session'] = OpenSessionDialog(main_window, workspace)
-        dialogs['preferences'] = PreferencesDialog(main_window)
-        dialogs['replace_confirmation'] = ReplaceConfirmationDialog(main_window)
-        dialogs['save_document'] = SaveDocumentDialog(main_window, workspace)
-        dialogs['save_session'] = SaveSessionDialog(main_window, workspace)
-        dialogs['close_confirmation'] = CloseConfirmationDialog(main_window, workspace)
-        dialogs['building_failed'] = BuildingFailedDialog(main_window, dialogs['preferences'])
-        dialogs['interpreter_missing'] = InterpreterMissingDialog(main_window, dialogs['preferences'])
-        DialogLocator.dialogs = dialogs
-    
+        DialogLocator.main_window = main_window
+        DialogLocator.workspace = workspace
+        DialogLocator.dialogs = dict()
+
     def get_dialog(dialog_type):
+        if dialog_type not in DialogLocator.dialogs:
+            module_name, class_name, argument_names = DialogLocator.dialog_classes[dialog_type]
+            dialog_class = getattr(importlib.import_module(module_name), class_name)
+
+            arguments = [DialogLocator.main_window]
+            for name in argument_names:
+                if name == 'workspace':
+                    arguments.append(DialogLocator.workspace)
+                else:
+                    arguments.append(DialogLocator.get_dialog(name))
+            DialogLocator.dialogs[dialog_type] = dialog_class(*arguments)
         return DialogLocator.dialogs[dialog_type]
 
 
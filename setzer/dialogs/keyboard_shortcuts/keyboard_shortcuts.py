@@ -44,6 +44,7 @@ class KeyboardShortcutsDialog(object):
         section = {'title': _('Tools'), 'items': list()}
         section['items'].append({'title': _('Save and build .pdf-file from document'), 'shortcut': 'F5'})
         section['items'].append({'title': _('Build .pdf-file from document'), 'shortcut': 'F6'})
+        section['items'].append({'title': _('Build only the current section for the preview'), 'shortcut': '&lt;shift&gt;F6'})
         section['items'].append({'title': _('Show current position in preview'), 'shortcut': 'F7'})
         data.append(section)
 
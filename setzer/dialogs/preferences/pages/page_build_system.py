@@ -36,6 +36,18 @@ class PageBuildSystem(object):
         self.view.option_cleanup_build_files.set_active(self.settings.get_value('preferences', 'cleanup_build_files'))
         self.view.option_cleanup_build_files.connect('toggled', self.preferences.on_check_button_toggle, 'cleanup_build_files')
 
+        self.view.option_stop_on_first_error.set_active(self.settings.get_value('preferences', 'stop_on_first_error'))
+        self.view.option_stop_on_first_error.connect('toggled', self.preferences.on_check_button_toggle, 'stop_on_first_error')
+
+        self.view.option_use_precompiled_preamble.set_active(self.settings.get_value('preferences', 'use_precompiled_preamble'))
+        self.view.option_use_precompiled_preamble.connect('toggled', self.preferences.on_check_button_toggle, 'use_precompiled_preamble')
+
+        self.view.option_build_on_idle.set_active(self.settings.get_value('preferences', 'build_on_idle'))
+        self.view.option_build_on_idle.connect('toggled', self.preferences.on_check_button_toggle, 'build_on_idle')
+
+        self.view.max_parallel_builds_spinbutton.set_value(self.settings.get_value('preferences', 'max_parallel_builds'))
+        self.view.max_parallel_builds_spinbutton.connect('value-changed', self.preferences.spin_button_changed, 'max_parallel_builds')
+
         self.view.option_autoshow_build_log_errors.set_active(self.settings.get_value('preferences', 'autoshow_build_log') == 'errors')
         self.view.option_autoshow_build_log_errors_warnings.set_active(self.settings.get_value('preferences', 'autoshow_build_log') == 'errors_warnings')
         self.view.option_autoshow_build_log_all.set_active(self.settings.get_value('preferences', 'autoshow_build_log') == 'all')
@@ -44,6 +56,14 @@ class PageBuildSystem(object):
         self.view.option_autoshow_build_log_errors_warnings.connect('toggled', self.preferences.on_radio_button_toggle, 'autoshow_build_log', 'errors_warnings')
         self.view.option_autoshow_build_log_all.connect('toggled', self.preferences.on_radio_button_toggle, 'autoshow_build_log', 'all')
 
+        self.view.option_build_directory_document.set_active(self.settings.get_value('preferences', 'build_directory') == 'document')
+        self.view.option_build_directory_cache.set_active(self.settings.get_value('preferences', 'build_directory') == 'cache')
+        self.view.option_build_directory_memory.set_active(self.settings.get_value('preferences', 'build_directory') == 'memory')
+
+        self.view.option_build_directory_document.connect('toggled', self.preferences.on_radio_button_toggle, 'build_directory', 'document')
+        self.view.option_build_directory_cache.connect('toggled', self.preferences.on_radio_button_toggle, 'build_directory', 'cache')
+        self.view.option_build_directory_memory.connect('toggled', self.preferences.on_radio_button_toggle, 'build_directory', 'memory')
+
         self.view.option_system_commands_disable.set_active(self.settings.get_value('preferences', 'build_option_system_commands') == 'disable')
         self.view.option_system_commands_restricted.set_active(self.settings.get_value('preferences', 'build_option_system_commands') == 'restricted')
         self.view.option_system_commands_full.set_active(self.settings.get_value('preferences', 'build_option_system_commands') == 'enable')
@@ -188,6 +208,26 @@ flatpak install org.freedesktop.Sdk.Extension.texlive'''))
         self.option_use_latexmk = Gtk.CheckButton.new_with_label(_('Use Latexmk'))
         self.append(self.option_use_latexmk)
 
+        self.option_stop_on_first_error = Gtk.CheckButton.new_with_label(_('Stop building at the first error.'))
+        self.append(self.option_stop_on_first_error)
+
+        self.option_use_precompiled_preamble = Gtk.CheckButton.new_with_label(_('Precompile the preamble (pdfLaTeX without Latexmk only).'))
+        self.append(self.option_use_precompiled_preamble)
+
+        self.option_build_on_idle = Gtk.CheckButton.new_with_label(_('Build automatically when I stop typing (the preview only changes on success).'))
+        self.append(self.option_build_on_idle)
+
+        label = Gtk.Label()
+        label.set_markup(_('Number of documents built at the same time:'))
+        label.set_xalign(0)
+        label.set_margin_top(12)
+        label.set_margin_bottom(6)
+        self.append(label)
+        box = Gtk.Box.new(Gtk.Orientation.HORIZONTAL, 0)
+        self.max_parallel_builds_spinbutton = Gtk.SpinButton.new_with_range(1, 8, 1)
+        box.append(self.max_parallel_builds_spinbutton)
+        self.append(box)
+
         label = Gtk.Label()
         label.set_markup('<b>' + _('Automatically show build log ..') + ' </b>')
         label.set_xalign(0)
@@ -203,6 +243,21 @@ flatpak install org.freedesktop.Sdk.Extension.texlive'''))
         self.append(self.option_autoshow_build_log_errors_warnings)
         self.append(self.option_autoshow_build_log_all)
 
+        label = Gtk.Label()
+        label.set_markup('<b>' + _('Build files') + '</b>')
+        label.set_xalign(0)
+        label.set_margin_top(18)
+        label.set_margin_bottom(6)
+        self.append(label)
+        self.option_build_directory_document = Gtk.CheckButton.new_with_label(_('Next to the document.'))
+        self.option_build_directory_cache = Gtk.CheckButton.new_with_label(_('In a separate folder, kept between builds (only the .pdf is copied to the document).'))
+        self.option_build_directory_cache.set_group(self.option_build_directory_document)
+        self.option_build_directory_memory = Gtk.CheckButton.new_with_label(_('In memory, kept until logout (only the .pdf is copied to the document).'))
+        self.option_build_directory_memory.set_group(self.option_build_directory_document)
+        self.append(self.option_build_directory_document)
+        self.append(self.option_build_directory_cache)
+        self.append(self.option_build_directory_memory)
+
         label_header = Gtk.Label()
         label_header.set_markup('<b>' + _('Embedded system commands') + '</b>')
         label_header.set_xalign(0)
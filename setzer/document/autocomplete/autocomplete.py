@@ -222,6 +222,8 @@ class Autocomplete(object):
                 self.move_cursor_to_offset(self.current_word_offset + len(lcp))
             else:
                 self.last_tabbed_item = self.items[self.selected_item_index]['command']
+                if lcp == command:
+                    LaTeXDB.add_usage(command)
                 if lcp == command and command.startswith('\\begin{'):
                     bracket_pos = command.find('}') + 1
                     command += '\n\t•\n\\end{' + command[7:bracket_pos]
@@ -242,6 +244,7 @@ class Autocomplete(object):
         if self.items == None or len(self.items) == 0: return
         if self.selected_item_index == None: return
 
+        LaTeXDB.add_usage(self.items[self.selected_item_index]['command'])
         result = self.match_current_command_with_buffer()
         if result != None:
             start, end = result
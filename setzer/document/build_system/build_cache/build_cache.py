@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import os, os.path, time, pickle, hashlib, shutil, threading
+
+from setzer.app.service_locator import ServiceLocator
+
+
+class BuildCache():
+    ''' Outputs of latex runs and of bibliography tools, keyed by the
+        tool, its arguments and the hashes of the files it read. A run
+        whose inputs didn't change since it was cached can be replaced by
+        copying back its outputs. Build workers share the cache. '''
+
+    lock = threading.Lock()
+    entries = None
+    folder = None
+
+    # (mtime, size, hash) by pathname, so unchanged files aren't read again
+    file_hashes = dict()
+
+    max_entries = 50
+
+    def lookup(key, output_base=None):
+        ''' Copies the cached outputs of key to output_base + ending,
+            if the inputs of the cached run are unchanged. Returns the
+            cached entry, or None. Without output_base nothing is copied,
+            outputs can be used in place with get_output_filename. '''
+
+        with BuildCache.lock:
+            BuildCache.load_entries()
+            entry = BuildCache.entries.get(key, None)
+            if entry == None: return None
+
+            for pathname, file_hash in entry['inputs'].items():
+                if BuildCache.get_file_hash(pathname) != file_hash: return None
+
+            if output_base != None:
+                for ending in entry['outputs']:
+                    try: shutil.copyfile(BuildCache.get_output_filename(entry, ending), output_base + ending)
+                    except OSError: return None
+
+            entry['last_used'] = time.time()
+            return entry
+
+    def store(key, inputs, output_base, endings, data=None):
+        ''' Caches the files output_base + ending of a run that read inputs
+            (a list of pathnames, or a dict of pathname to hash). '''
+
+        with BuildCache.lock:
+            BuildCache.load_entries()
+            if not isinstance(inputs, dict):
+                inputs = dict((pathname, BuildCache.get_file_hash(pathname)) for pathname in inputs)
+            if None in inputs.values(): return
+
+            folder = os.path.join(BuildCache.folder, hashlib.sha1(repr(key).encode('utf-8')).hexdigest())
+            os.makedirs(folder, exist_ok=True)
+            outputs = list()
+            for ending in endings:
+                try: shutil.copyfile(output_base + ending, os.path.join(folder, 'output' + ending))
+                except OSError: pass
+                else: outputs.append(ending)
+
+            BuildCache.entries[key] = {'inputs': inputs, 'outputs': outputs, 'folder': folder, 'data': data, 'last_used': time.time()}
+            BuildCache.remove_old_entries()
+            BuildCache.save_entries()
+
+    def get_output_filename(entry, ending):
+        return os.path.join(entry['folder'], 'output' + ending)
+
+    def get_entry(key):
+        with BuildCache.lock:
+            BuildCache.load_entries()
+            return BuildCache.entries.get(key, None)
+
+    def get_file_hash(pathname):
+        try: stat_result = os.stat(pathname)
+        except OSError: return None
+
+        state = (stat_result.st_mtime, stat_result.st_size)
+        if pathname in BuildCache.file_hashes and BuildCache.file_hashes[pathname][0] == state:
+            return BuildCache.file_hashes[pathname][1]
+
+        file_hash = hashlib.sha1()
+        try:
+            with open(pathname, 'rb') as f:
+                for chunk in iter(lambda: f.read(1 << 20), b''):
+                    file_hash.update(chunk)
+        except OSError: return None
+        BuildCache.file_hashes[pathname] = (state, file_hash.hexdigest())
+        return file_hash.hexdigest()
+
+    def remove_old_entries():
+        keys = sorted(BuildCache.entries, key=lambda key: BuildCache.entries[key]['last_used'])
+        for key in keys[:max(len(keys) - BuildCache.max_entries, 0)]:
+            shutil.rmtree(BuildCache.entries[key]['folder'], ignore_errors=True)
+            del(BuildCache.entries[key])
+
+    def load_entries():
+        if BuildCache.entries != None: return
+
+        BuildCache.folder = os.path.join(ServiceLocator.get_cache_folder(), 'build_cache')
+        BuildCache.entries = dict()
+        try: filehandle = open(os.path.join(BuildCache.folder, 'index.pickle'), 'rb')
+        except IOError: pass
+        else:
+            try: BuildCache.entries = pickle.load(filehandle)
+            except (EOFError, pickle.UnpicklingError):
+                BuildCache.entries = dict()
+            filehandle.close()
+
+    def save_entries():
+        try: filehandle = open(os.path.join(BuildCache.folder, 'index.pickle'), 'wb')
+        except IOError: pass
+        else:
+            pickle.dump(BuildCache.entries, filehandle)
+            filehandle.close()
+
+
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import os.path
+import hashlib
+
+
+class BuildPlanner(object):
+    ''' Decides what runs after a latex pass, from the files the pass
+        wrote (as recorded in the .fls file) instead of from log messages.
+        Tools are run when the files they read changed since they last
+        ran, latex again when a file it reads back was changed, either
+        by itself or by one of the tools. For files that didn't exist
+        before the pass, it goes by the rerun messages in the log. '''
+
+    # job, endings of the files it reads, endings of the files it writes
+    tools = [('build_biber', ['.bcf'], ['.bbl', '.blg']),
+             ('build_bibtex', ['.aux'], ['.bbl', '.blg']),
+             ('build_makeindex', ['.idx'], ['.ind', '.ilg']),
+             ('build_glossaries', ['.glo', '.acn'], ['.gls', '.glg', '.acr', '.alg'])]
+
+    # files latex writes for the next pass. they may not be in the
+    # .fls as read yet, if they didn't exist before the pass.
+    rerun_endings = ['.aux', '.toc', '.lof', '.lot', '.out', '.nav', '.snm']
+
+    # log messages of latex asking for another pass, the file name is
+    # filled in for those about the files of the document.
+    rerun_messages = ['Please rerun LaTeX.',
+                      'Label(s) may have changed. Rerun to get cross-references right.',
+                      'There were undefined references.',
+                      'Citation(s) may have changed.',
+                      'Rerun to get transparencies right.',
+                      'File `{}.out\' has changed.',
+                      'No file {}.toc.',
+                      'No file {}.aux.']
+
+    max_passes = 5
+
+    def start_pass(self, query, output_base, recorded_files):
+        ''' Takes the hashes of the files the pass may change. recorded_files
+            are the (inputs, outputs) of the last pass, or None. '''
+
+        query.build_data['latex_passes'] += 1
+        if query.build_data['rerun_files'] == None:
+            query.build_data['rerun_files'] = self.get_rerun_files(output_base, recorded_files)
+
+        hashes = dict()
+        for filename in query.build_data['rerun_files']:
+            hashes[filename] = self.get_hash(filename)
+        query.build_data['rerun_hashes'] = hashes
+
+    def get_next_jobs(self, query, output_base, log_items, recorded_files):
+        ''' Jobs to run after a pass. Tools that are needed come first,
+            as a list, since they don't depend on each other. '''
+
+        if recorded_files == None: return list()
+        if query.build_data['latex_passes'] >= self.max_passes: return list()
+
+        rerun_files = self.get_rerun_files(output_base, recorded_files)
+        query.build_data['rerun_files'] = rerun_files
+        rerun_hashes = query.build_data['rerun_hashes']
+        rerun_latex = False
+        check_log = False
+        for filename in rerun_files:
+            # a file missing before the pass (e.g. after cleaning up build
+            # files) only matters if the pass read it before writing it.
+            # latex reads its .aux back at the end, after writing it.
+            if rerun_hashes.get(filename, None) == None:
+                if filename in recorded_files[2]:
+                    rerun_latex = True
+                elif self.get_hash(filename) != None:
+                    check_log = True
+            elif self.get_hash(filename) != rerun_hashes[filename]:
+                rerun_latex = True
+        if check_log and not rerun_latex:
+            rerun_latex = self.has_new_rerun_message(query, output_base, log_items)
+
+        tools = list()
+        for job, input_endings, output_endings in self.tools:
+            if job == 'build_bibtex' and 'build_biber' in tools: continue
+
+            input_hash = self.get_tool_input_hash(job, output_base, input_endings, recorded_files[1])
+            if input_hash != None and input_hash != query.build_data['tool_inputs'].get(job, None):
+                query.build_data['tool_inputs'][job] = input_hash
+                tools.append(job)
+
+        # after the tools latex only runs again if they changed
+        # their output, or if it has to anyway.
+        if len(tools) > 0:
+            if rerun_latex:
+                query.build_data['tool_outputs'] = None
+            else:
+                query.build_data['tool_outputs'] = self.get_tool_output_hashes(tools, output_base)
+            return [tools, 'build_latex']
+        if rerun_latex:
+            return ['build_latex']
+        return list()
+
+    def can_skip_pass(self, query):
+        ''' True if the tools run before this pass left their
+            outputs as they were, so it would change nothing. '''
+
+        tool_outputs = query.build_data['tool_outputs']
+        query.build_data['tool_outputs'] = None
+        if tool_outputs == None: return False
+
+        for filename, file_hash in tool_outputs.items():
+            if self.get_hash(filename) != file_hash: return False
+        return True
+
+    def has_new_rerun_message(self, query, output_base, log_items):
+        ''' True if latex asks for another pass in the log, for a reason
+            it didn't give after the previous pass. '''
+
+        basename = os.path.basename(output_base)
+        rerun_messages = set(message.format(basename) for message in self.rerun_messages)
+        messages = set()
+        for filename, items in log_items.items():
+            for item in items['error'] + items['warning']:
+                if item[2] in rerun_messages:
+                    messages.add(item[2])
+
+        if len(messages - query.build_data['rerun_messages']) == 0: return False
+        query.build_data['rerun_messages'] = messages
+        return True
+
+    def get_rerun_files(self, output_base, recorded_files):
+        # files written by a pass and read by the next one
+        rerun_files = set(output_base + ending for ending in self.rerun_endings)
+        if recorded_files != None:
+            inputs, outputs, read_before_written = recorded_files
+            rerun_files |= inputs & outputs
+            rerun_files |= set(filename for filename in outputs if os.path.splitext(filename)[1] in self.rerun_endings)
+        return rerun_files
+
+    def get_tool_input_hash(self, job, output_base, input_endings, outputs):
+        ''' Hash of what the tool reads, None if the last pass
+            didn't write anything for it. '''
+
+        if job == 'build_bibtex':
+            lines = self.get_bibtex_lines(output_base + '.aux', set())
+            if not any(line.startswith('\\bibdata{') for line in lines): return None
+            return hashlib.sha1('\n'.join(lines).encode('utf-8')).hexdigest()
+
+        filenames = [output_base + ending for ending in input_endings if output_base + ending in outputs]
+        if len(filenames) == 0: return None
+        return ''.join(str(self.get_hash(filename)) for filename in filenames)
+
+    def get_bibtex_lines(self, aux_filename, visited):
+        # citations of included files are in .aux files of their own
+        if aux_filename in visited: return list()
+        visited.add(aux_filename)
+
+        try:
+            with open(aux_filename, 'r') as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            return list()
+
+        bibtex_lines = list()
+        for line in lines:
+            if line.startswith('\\citation') or line.startswith('\\bibstyle') or line.startswith('\\bibdata'):
+                bibtex_lines.append(line)
+            elif line.startswith('\\@input{'):
+                bibtex_lines += self.get_bibtex_lines(os.path.join(os.path.dirname(aux_filename), line[8:].rstrip('}')), visited)
+        return bibtex_lines
+
+    def get_tool_output_hashes(self, tools, output_base):
+        hashes = dict()
+        for job, input_endings, output_endings in self.tools:
+            if job in tools:
+                for ending in output_endings:
+                    hashes[output_base + ending] = self.get_hash(output_base + ending)
+        return hashes
+
+    def get_hash(self, filename):
+        # these files are small and rewritten quickly, so they
+        # are read every time instead of going by their mtime.
+        try:
+            with open(filename, 'rb') as f:
+                return hashlib.sha1(f.read()).hexdigest()
+        except OSError:
+            return None
+
+
@@ -16,21 +16,20 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
 import gi
-from gi.repository import GObject
+from gi.repository import GLib
 
-import _thread as thread, queue
-import time, re, difflib
+import os, os.path, time, re, difflib, base64, shutil, threading
 
 from setzer.app.service_locator import ServiceLocator
+from setzer.app.build_executor import BuildExecutor
 from setzer.dialogs.dialog_locator import DialogLocator
 import setzer.document.build_system.builder.builder_build_latex as builder_build_latex
 import setzer.document.build_system.builder.builder_build_bibtex as builder_build_bibtex
 import setzer.document.build_system.builder.builder_build_biber as builder_build_biber
 import setzer.document.build_system.builder.builder_build_makeindex as builder_build_makeindex
 import setzer.document.build_system.builder.builder_build_glossaries as builder_build_glossaries
-import setzer.document.build_system.builder.builder_forward_sync as builder_forward_sync
-import setzer.document.build_system.builder.builder_backward_sync as builder_backward_sync
 import setzer.document.build_system.query.query as query
+from setzer.document.build_system.synctex.synctex_index import SyncTeXIndex
 from setzer.helpers.observable import Observable
 
 
@@ -41,12 +40,14 @@ class BuildSystem(Observable):
         self.document = document
         self.settings = ServiceLocator.get_settings()
         self.active_query = None
+        self.running_future = None
+        self.build_metrics = None
 
         # possible states: idle, ready_for_building
         # building_in_progress, building_to_stop
         self.build_state = 'idle'
 
-        # possible values: build, forward_sync, build_and_forward_sync
+        # possible values: build, build_and_forward_sync, build_section, build_on_idle
         self.build_mode = 'build_and_forward_sync'
 
         self.document_has_been_built = False
@@ -54,7 +55,7 @@ class BuildSystem(Observable):
         self.last_build_start_time = None
 
         self.has_synctex_file = False
-        self.backward_sync_data = None
+        self.synctex_index = None
         self.forward_sync_arguments = None
         self.can_sync = False
         self.update_can_sync()
@@ -67,17 +68,13 @@ class BuildSystem(Observable):
         self.builders['build_biber'] = builder_build_biber.BuilderBuildBiber()
         self.builders['build_makeindex'] = builder_build_makeindex.BuilderBuildMakeindex()
         self.builders['build_glossaries'] = builder_build_glossaries.BuilderBuildGlossaries()
-        self.builders['forward_sync'] = builder_forward_sync.BuilderForwardSync()
-        self.builders['backward_sync'] = builder_backward_sync.BuilderBackwardSync()
 
         self.document.preview.connect('pdf_changed', self.update_can_sync)
 
-        GObject.timeout_add(50, self.results_loop)
-
     def change_build_state(self, state):
         self.build_state = state
 
-        if self.build_mode in ['build', 'build_and_forward_sync']:
+        if self.build_mode in ['build', 'build_and_forward_sync', 'build_section']:
             if state == 'building_in_progress':
                 self.last_build_start_time = time.time()
             elif state == 'building_to_stop':
@@ -110,31 +107,181 @@ class BuildSystem(Observable):
             self.can_sync = False
         self.add_change_code('can_sync_changed', self.can_sync)
 
+    def get_build_files_folder(self):
+        ''' Folder with the copies of build files kept for the document. '''
+
+        return ServiceLocator.get_config_folder() + '/' + base64.urlsafe_b64encode(str.encode(self.document.filename)).decode()
+
+    def get_build_directory(self):
+        ''' Folder the document is built in when build files are kept
+            away from it, or None. '''
+
+        build_directory = self.settings.get_value('preferences', 'build_directory')
+        if build_directory == 'cache':
+            folder = GLib.get_user_cache_dir()
+        elif build_directory == 'memory':
+            folder = GLib.get_user_runtime_dir()
+        else:
+            return None
+
+        folder = os.path.join(folder, 'setzer', 'builds', base64.urlsafe_b64encode(str.encode(self.document.filename)).decode())
+        return self.make_build_directory(folder)
+
+    def make_build_directory(self, folder):
+        try: os.makedirs(folder, exist_ok=True)
+        except OSError: return None
+
+        # latex writes the .aux files of included files to the same
+        # subfolders in the output directory, but doesn't create them.
+        for filename, offset in self.document.parser.symbols['included_latex_files']:
+            subfolder = os.path.dirname(os.path.normpath(filename))
+            if subfolder != '' and not os.path.isabs(subfolder) and not subfolder.startswith('..'):
+                try: os.makedirs(os.path.join(folder, subfolder), exist_ok=True)
+                except OSError: pass
+        return folder
+
+    def get_synctex_index(self):
+        # after a restart the index is read from the copy kept
+        # in the config folder, when it's first needed.
+        if self.synctex_index == None and self.has_synctex_file and self.document.filename != None:
+            synctex_index = SyncTeXIndex(self.document.filename)
+            if synctex_index.read_file(self.get_build_files_folder() + '/' + os.path.splitext(os.path.basename(self.document.filename))[0] + '.synctex.gz'):
+                synctex_index.rename_input(self.get_snapshot_filename(), self.document.filename)
+                self.synctex_index = synctex_index
+        return self.synctex_index
+
     def forward_sync(self, active_document):
         if not self.can_sync: return
 
         self.set_forward_sync_arguments(active_document)
-        self.set_build_mode('forward_sync')
-        self.start_building()
+        self.show_forward_sync_result(self.forward_sync_arguments)
+
+    def show_forward_sync_result(self, forward_sync_arguments):
+        synctex_index = self.get_synctex_index()
+        if synctex_index == None: return
+
+        rectangles = synctex_index.forward_sync(forward_sync_arguments['filename'], forward_sync_arguments['line'])
+        if len(rectangles) > 0:
+            self.document.preview.set_synctex_rectangles(rectangles)
 
     def backward_sync(self, page, x, y, word, context):
         if not self.can_sync: return
 
-        self.backward_sync_data = {'page': page, 'x': x, 'y': y, 'word': word, 'context': context}
-        self.set_build_mode('backward_sync')
-        self.start_building()
+        synctex_index = self.get_synctex_index()
+        if synctex_index == None: return
+
+        result = synctex_index.backward_sync(page, x, y)
+        if result == None: return
+
+        position = {'filename': result[0], 'line': max(result[1] - 1, 0), 'word': word, 'context': context}
+        if not self.document.root_is_set:
+            if position['filename'] == self.document.get_filename():
+                self.set_synctex_position(self.document, position)
+                self.document.scroll_cursor_onscreen()
+        elif self.document.is_root:
+            workspace = ServiceLocator.get_workspace()
+            document = workspace.open_document_by_filename(position['filename'])
+            if document != None:
+                self.set_synctex_position(document, position)
+                document.scroll_cursor_onscreen()
 
     def build_and_forward_sync(self, active_document):
         self.set_forward_sync_arguments(active_document)
         self.set_build_mode('build_and_forward_sync')
         self.start_building()
 
+    def build_section(self, active_document):
+        ''' Builds only the section at the cursor of active_document, with
+            the preamble of this document, and shows it in the preview.
+            Without such a section the whole document is built. '''
+
+        if self.document.filename == None: return
+
+        self.document.parser.parse_now()
+        begin_document_offset = self.document.parser.symbols['begin_document_offset']
+        section_text = self.get_section_text(active_document)
+        if begin_document_offset == None or section_text == None:
+            self.build_and_forward_sync(active_document)
+            return
+
+        # the section is built in a scratch directory, references to
+        # other sections come from the .aux of the last full build.
+        folder = self.get_build_files_folder() + '/section'
+        tex_filename = folder + '/' + os.path.basename(self.document.filename)
+        try:
+            os.makedirs(folder, exist_ok=True)
+            with open(tex_filename, 'w') as f:
+                f.write(self.document.get_all_text()[:begin_document_offset] + '\\begin{document}\n' + section_text + '\n\\end{document}\n')
+        except OSError:
+            self.build_and_forward_sync(active_document)
+            return
+        try: shutil.copyfile(self.get_build_files_folder() + '/' + os.path.splitext(os.path.basename(tex_filename))[0] + '.aux', os.path.splitext(tex_filename)[0] + '.aux')
+        except OSError: pass
+
+        self.set_build_mode('build_section')
+        self.build_time = None
+        query_obj = self.get_build_query(tex_filename)
+        query_obj.build_data['section_build'] = True
+        query_obj.build_data['working_directory'] = self.document.get_dirname()
+        query_obj.build_data['do_cleanup'] = False
+        query_obj.build_data['log_callback'] = None
+        query_obj.build_data['begin_document_offset'] = begin_document_offset
+        self.add_query(query_obj)
+
+    def build_on_idle(self, active_document):
+        ''' Builds the text of the document as it is in the editor, without
+            saving it. The preview and build log are left as they are
+            unless the build succeeds. '''
+
+        if self.document.filename == None: return
+
+        # the snapshot is built in a folder of its own, so its build
+        # files are kept, and the pdf is only copied next to it on success.
+        tex_filename = self.get_snapshot_filename()
+        build_directory = self.make_build_directory(os.path.dirname(tex_filename) + '/build')
+        if build_directory == None: return
+        try:
+            with open(tex_filename, 'w') as f:
+                f.write(self.document.get_all_text())
+        except OSError:
+            return
+
+        self.set_build_mode('build_on_idle')
+        query_obj = self.get_build_query(tex_filename)
+        query_obj.build_data['source_filename'] = self.document.filename
+        query_obj.build_data['working_directory'] = self.document.get_dirname()
+        query_obj.build_data['build_directory'] = build_directory
+        query_obj.build_data['do_cleanup'] = False
+        query_obj.build_data['log_callback'] = None
+        query_obj.build_data['low_priority'] = True
+        self.add_query(query_obj)
+
+    def get_snapshot_filename(self):
+        return self.get_build_files_folder() + '/snapshot/' + os.path.basename(self.document.filename)
+
+    def get_section_text(self, document):
+        ''' Text of the innermost part, chapter or section at the cursor
+            of document. Included files without one are used as a whole. '''
+
+        document.parser.parse_now()
+        offset = document.source_buffer.get_iter_at_mark(document.source_buffer.get_insert()).get_offset()
+        section = None
+        for block in document.parser.symbols['blocks']:
+            if len(block) == 6 and block[4] in ['part', 'chapter', 'section'] and block[0] <= offset <= block[1]:
+                if section == None or block[0] > section[0]:
+                    section = block
+
+        if section != None:
+            return document.get_all_text()[section[0]:section[1]]
+        if document != self.document and document.is_latex_document() and document.parser.symbols['begin_document_offset'] == None:
+            return document.get_all_text()
+        return None
+
     def set_forward_sync_arguments(self, active_document):
         sb = active_document.source_buffer
         self.forward_sync_arguments = dict()
         self.forward_sync_arguments['filename'] = active_document.get_filename()
         self.forward_sync_arguments['line'] = sb.get_iter_at_mark(sb.get_insert()).get_line() + 1
-        self.forward_sync_arguments['line_offset'] = sb.get_iter_at_mark(sb.get_insert()).get_line_offset() + 1
 
     def set_build_log_items(self, log_items):
         build_log_items = list()
@@ -162,6 +309,16 @@ class BuildSystem(Observable):
 
         self.build_log_data = {'items': build_log_items, 'error_count': error_count, 'warning_count': warning_count, 'badbox_count': badbox_count}
 
+    def on_log_stream_update(self, query, log_items):
+        # called by the worker running the query
+        GLib.idle_add(self.show_log_stream_items, query, log_items)
+
+    def show_log_stream_items(self, query, log_items):
+        if query == self.active_query:
+            self.set_build_log_items(log_items)
+            self.invalidate_build_log()
+        return False
+
     def invalidate_build_log(self):
         self.add_change_code('build_log_update')
 
@@ -174,158 +331,187 @@ class BuildSystem(Observable):
     def get_badbox_count(self):
         return self.build_log_data['badbox_count']
 
-    def results_loop(self):
-        if self.active_query != None:
-            if self.active_query.is_done():
-                build_result = self.active_query.get_build_result()
-                forward_sync_result = self.active_query.get_forward_sync_result()
-                backward_sync_result = self.active_query.get_backward_sync_result()
-                if forward_sync_result != None or backward_sync_result != None or build_result != None:
-                    self.parse_result({'build': build_result, 'forward_sync': forward_sync_result, 'backward_sync': backward_sync_result})
-                self.active_query = None
-        return True
-
-    def parse_result(self, result_blob):
-        if result_blob['build'] != None or result_blob['forward_sync'] != None:
-            if result_blob['build'] != None:
-                try:
-                    self.document.preview.set_pdf_filename(result_blob['build']['pdf_filename'])
-                except KeyError: pass
-                self.document.add_change_code('pdf_updated')
-
-            if result_blob['forward_sync'] != None:
-                self.document.preview.set_synctex_rectangles(result_blob['forward_sync'])
+    def on_query_done(self, query, future):
+        self.running_future = None
+
+        if query == self.active_query:
+            self.active_query = None
+            self.build_metrics = query.metrics
+            if future.cancelled() or future.exception() != None:
                 self.show_build_state('')
+                self.change_build_state('idle')
+            else:
+                build_result = query.get_build_result()
+                if build_result != None and query.build_data['section_build']:
+                    self.parse_section_build_result(build_result)
+                elif build_result != None and query.build_data['source_filename'] != None:
+                    self.parse_idle_build_result(build_result)
+                elif build_result != None:
+                    self.parse_build_result(build_result, query.forward_sync_data)
+
+        # a query added while a stopped one was still running
+        elif self.active_query != None:
+            self.submit_query(self.active_query)
+
+    def parse_build_result(self, build_blob, forward_sync_arguments):
+        try:
+            self.document.preview.set_pdf_filename(build_blob['pdf_filename'])
+        except KeyError: pass
+        self.document.add_change_code('pdf_updated')
+
+        if build_blob['error'] == 'interpreter_missing':
+            self.show_build_state('')
+            self.change_build_state('idle')
+            DialogLocator.get_dialog('interpreter_missing').run(build_blob['error_arg'])
+            return
+
+        if build_blob['error'] == 'interpreter_not_working':
+            self.show_build_state('')
+            self.change_build_state('idle')
+            DialogLocator.get_dialog('building_failed').run(build_blob['error_arg'])
+            return
+
+        build_blob['log_messages']['BibTeX'] = build_blob['bibtex_log_messages']
+        self.set_build_log_items(build_blob['log_messages'])
+        self.build_time = time.time() - self.last_build_start_time
+
+        error_count = self.get_error_count()
+        if error_count > 0:
+            self.show_build_state('error')
+        else:
+            self.show_build_state('success')
+
+        self.synctex_index = build_blob['synctex_index']
+        self.set_has_synctex_file(build_blob['has_synctex_file'])
+        self.document_has_been_built = True
 
-            if result_blob['build'] != None:
-                build_blob = result_blob['build']
-
-                if build_blob['error'] == 'interpreter_missing':
-                    self.show_build_state('')
-                    self.change_build_state('idle')
-                    DialogLocator.get_dialog('interpreter_missing').run(build_blob['error_arg'])
-                    return
-
-                if build_blob['error'] == 'interpreter_not_working':
-                    self.show_build_state('')
-                    self.change_build_state('idle')
-                    DialogLocator.get_dialog('building_failed').run(build_blob['error_arg'])
-                    return
-
-                build_blob['log_messages']['BibTeX'] = build_blob['bibtex_log_messages']
-                self.set_build_log_items(build_blob['log_messages'])
-                self.build_time = time.time() - self.last_build_start_time
-
-                error_count = self.get_error_count()
-                if error_count > 0:
-                    self.show_build_state('error')
-                else:
-                    self.show_build_state('success')
-
-                self.set_has_synctex_file(build_blob['has_synctex_file'])
-                self.document_has_been_built = True
-
-        elif result_blob['backward_sync'] != None:
-            if not self.document.root_is_set:
-                if result_blob['backward_sync']['filename'] == self.document.get_filename():
-                    self.set_synctex_position(self.document, result_blob['backward_sync'])
-                    self.document.scroll_cursor_onscreen()
-            elif self.document.is_root:
-                workspace = ServiceLocator.get_workspace()
-                document = workspace.open_document_by_filename(result_blob['backward_sync']['filename'])
-                if document != None:
-                    self.set_synctex_position(document, result_blob['backward_sync'])
-                    document.scroll_cursor_onscreen()
+        if forward_sync_arguments != None:
+            self.show_forward_sync_result(forward_sync_arguments)
 
         self.change_build_state('idle')
+        self.invalidate_build_log()
+
+    def parse_section_build_result(self, build_blob):
+        if build_blob['error'] != None:
+            self.parse_build_result(build_blob, None)
+            return
+
+        # the build log stays that of the last full build. the preview
+        # keeps showing the last pdf if the section has errors.
+        self.build_time = time.time() - self.last_build_start_time
+        if build_blob['pdf_filename'] != None:
+            self.document.preview.set_pdf_filename(build_blob['pdf_filename'])
+            self.document.add_change_code('pdf_updated')
+            self.synctex_index = None
+            self.set_has_synctex_file(False)
+            self.show_build_state('success')
+        else:
+            self.show_build_state('error')
+        self.change_build_state('idle')
 
-        if result_blob['build'] != None:
-            self.invalidate_build_log()
+    def parse_idle_build_result(self, build_blob):
+        # builds with errors have no pdf, they are dropped silently.
+        if build_blob['error'] == None and build_blob['pdf_filename'] != None:
+            self.document.preview.set_pdf_filename(build_blob['pdf_filename'])
+            self.document.add_change_code('pdf_updated')
+            self.synctex_index = build_blob['synctex_index']
+            self.set_has_synctex_file(build_blob['has_synctex_file'])
+            self.document_has_been_built = True
+        self.change_build_state('idle')
 
     def add_query(self, query):
         self.stop_building(notify=False)
         self.active_query = query
-        thread.start_new_thread(self.execute_query, (query,))
+
+        # the builders of a document run one query at a time, a new
+        # query waits until a stopped one has ended.
+        if self.running_future == None:
+            self.submit_query(query)
 
         self.change_build_state('building_in_progress')
 
+    def submit_query(self, query):
+        self.running_future = BuildExecutor.submit(self.execute_query, query, self.on_query_done)
+
     def execute_query(self, query):
-        while len(query.jobs) > 0:
-            if not query.force_building_to_stop:
-                self.builders[query.jobs.pop(0)].run(query)
-        query.mark_done()
+        # a build result before the last job is an error, e.g. a missing tool.
+        while len(query.jobs) > 0 and not query.force_building_to_stop and query.build_result == None:
+            job = query.jobs.pop(0)
+            if isinstance(job, list):
+                self.run_jobs_at_once(job, query)
+            else:
+                self.builders[job].run(query)
+
+    def run_jobs_at_once(self, jobs, query):
+        ''' Runs jobs that don't depend on each other, like bibtex and
+            makeindex, on threads of their own and waits for them. '''
+
+        threads = list()
+        for job in jobs[1:]:
+            threads.append(threading.Thread(target=self.builders[job].run, args=(query,)))
+            threads[-1].start()
+        self.builders[jobs[0]].run(query)
+        for thread in threads:
+            thread.join()
 
     def start_building(self):
-        if self.build_mode == 'forward_sync' and not self.has_synctex_file: return
-        if self.build_mode == 'backward_sync' and self.backward_sync_data == None: return
         if self.document.filename == None: return
 
         self.build_time = None
-        mode = self.get_build_mode()
-        query_obj = query.Query(self.document.get_filename()[:])
+        query_obj = self.get_build_query(self.document.get_filename()[:])
 
-        if mode in ['forward_sync', 'build_and_forward_sync']:
-            synctex_arguments = self.forward_sync_arguments
+        # build files in a separate folder are kept, so the next build
+        # starts from the .aux files of this one.
+        build_directory = self.get_build_directory()
+        if build_directory != None:
+            query_obj.build_data['build_directory'] = build_directory
+            query_obj.build_data['do_cleanup'] = False
 
-        if mode in ['build', 'build_and_forward_sync']:
-            interpreter = self.settings.get_value('preferences', 'latex_interpreter')
-            use_latexmk = self.settings.get_value('preferences', 'use_latexmk')
-            build_option_system_commands = self.settings.get_value('preferences', 'build_option_system_commands')
-            additional_arguments = ''
-
-            if interpreter == 'tectonic':
-                pass
-            else:
-                lualatex_prefix = ' -' if interpreter == 'lualatex' else ' '
-                if build_option_system_commands == 'disable':
-                    additional_arguments += lualatex_prefix + '-no-shell-escape'
-                elif build_option_system_commands == 'restricted':
-                    additional_arguments += lualatex_prefix + '-shell-restricted'
-                elif build_option_system_commands == 'enable':
-                    additional_arguments += lualatex_prefix + '-shell-escape'
-
-            text = self.document.get_all_text()
-            do_cleanup = self.settings.get_value('preferences', 'cleanup_build_files')
-
-        if mode == 'build':
-            query_obj.jobs = ['build_latex']
-            query_obj.build_data['text'] = text
-            query_obj.build_data['latex_interpreter'] = interpreter
-            query_obj.build_data['use_latexmk'] = use_latexmk
-            query_obj.build_data['additional_arguments'] = additional_arguments
-            query_obj.build_data['do_cleanup'] = do_cleanup
-        elif mode == 'forward_sync':
-            query_obj.jobs = ['forward_sync']
-            query_obj.can_sync = True
-            query_obj.forward_sync_data['filename'] = synctex_arguments['filename']
-            query_obj.forward_sync_data['line'] = synctex_arguments['line']
-            query_obj.forward_sync_data['line_offset'] = synctex_arguments['line_offset']
-        elif mode == 'backward_sync' and self.backward_sync_data != None:
-            query_obj.jobs = ['backward_sync']
-            query_obj.can_sync = True
-            query_obj.backward_sync_data['page'] = self.backward_sync_data['page']
-            query_obj.backward_sync_data['x'] = self.backward_sync_data['x']
-            query_obj.backward_sync_data['y'] = self.backward_sync_data['y']
-            query_obj.backward_sync_data['word'] = self.backward_sync_data['word']
-            query_obj.backward_sync_data['context'] = self.backward_sync_data['context']
-        else:
-            query_obj.jobs = ['build_latex', 'forward_sync']
-            query_obj.build_data['text'] = text
-            query_obj.build_data['latex_interpreter'] = interpreter
-            query_obj.build_data['use_latexmk'] = use_latexmk
-            query_obj.build_data['additional_arguments'] = additional_arguments
-            query_obj.build_data['do_cleanup'] = do_cleanup
-            query_obj.can_sync = False
-            query_obj.forward_sync_data['filename'] = synctex_arguments['filename']
-            query_obj.forward_sync_data['line'] = synctex_arguments['line']
-            query_obj.forward_sync_data['line_offset'] = synctex_arguments['line_offset']
+        # the synctex data of the new build is used for forward sync.
+        if self.get_build_mode() == 'build_and_forward_sync':
+            query_obj.forward_sync_data = self.forward_sync_arguments
 
         self.add_query(query_obj)
 
+    def get_build_query(self, tex_filename):
+        query_obj = query.Query(tex_filename)
+
+        interpreter = self.settings.get_value('preferences', 'latex_interpreter')
+        use_latexmk = self.settings.get_value('preferences', 'use_latexmk')
+        build_option_system_commands = self.settings.get_value('preferences', 'build_option_system_commands')
+        additional_arguments = ''
+
+        if interpreter == 'tectonic':
+            pass
+        else:
+            lualatex_prefix = ' -' if interpreter == 'lualatex' else ' '
+            if build_option_system_commands == 'disable':
+                additional_arguments += lualatex_prefix + '-no-shell-escape'
+            elif build_option_system_commands == 'restricted':
+                additional_arguments += lualatex_prefix + '-shell-restricted'
+            elif build_option_system_commands == 'enable':
+                additional_arguments += lualatex_prefix + '-shell-escape'
+
+        query_obj.jobs = ['build_latex']
+        query_obj.build_data['text'] = self.document.get_all_text()
+        query_obj.build_data['latex_interpreter'] = interpreter
+        query_obj.build_data['use_latexmk'] = use_latexmk
+        query_obj.build_data['additional_arguments'] = additional_arguments
+        query_obj.build_data['do_cleanup'] = self.settings.get_value('preferences', 'cleanup_build_files')
+        query_obj.build_data['stop_on_first_error'] = self.settings.get_value('preferences', 'stop_on_first_error')
+        query_obj.build_data['log_callback'] = lambda log_items: self.on_log_stream_update(query_obj, log_items)
+        query_obj.build_data['use_precompiled_preamble'] = self.settings.get_value('preferences', 'use_precompiled_preamble')
+        if query_obj.build_data['use_precompiled_preamble']:
+            self.document.parser.parse_now()
+            query_obj.build_data['begin_document_offset'] = self.document.parser.symbols['begin_document_offset']
+        return query_obj
+
     def stop_building(self, notify=True):
         if self.active_query != None:
-            self.active_query.jobs = []
+            self.active_query.cancel()
             self.active_query = None
+        if self.running_future != None:
+            self.running_future.cancel()
         for builder in self.builders.values():
             builder.stop_running()
         if notify:
@@ -22,13 +22,41 @@ import shutil
 
 class BuilderBuild(object):
 
+    build_file_endings = ['.aux', '.blg', '.bbl', '.dvi', '.xdv', '.fdb_latexmk', '.fls', '.idx' , '.ilg',
+                          '.ind', '.log', '.nav', '.out', '.snm', '.synctex.gz', '.toc',
+                          '.ist', '.glo', '.glg', '.acn', '.alg',
+                          '.bcf', '.run.xml', '.out.ps']
+    glossaries_file_endings = ['.gls', '.acr']
+
     def __init__(self):
         self.process = None
 
+    def get_output_base(self, query):
+        ''' Build files are written to the build directory of the query,
+            if it has one, or else next to the document. '''
+
+        if query.build_data['build_directory'] != None:
+            return os.path.join(query.build_data['build_directory'], os.path.splitext(os.path.basename(query.tex_filename))[0])
+        return os.path.splitext(query.tex_filename)[0]
+
+    def get_working_directory(self, query):
+        # section builds and builds on idle run in the directory of the
+        # document, so relative paths still work, but write elsewhere.
+        if query.build_data['working_directory'] != None:
+            return query.build_data['working_directory']
+        return os.path.dirname(query.tex_filename)
+
+    def get_preexec_fn(self, query):
+        ''' Builds on idle run with a lower priority, so they don't
+            slow down typing or builds started by the user. '''
+
+        if query.build_data['low_priority']:
+            return lambda: os.nice(10)
+        return None
+
     def throw_build_error(self, query, error, error_arg):
-        with query.build_result_lock:
-            query.build_result = {'error': error,
-                                 'error_arg': error_arg}
+        query.build_result = {'error': error,
+                              'error_arg': error_arg}
 
     def cleanup_files(self, query):
         if query.build_data['do_cleanup']:
@@ -36,17 +64,13 @@ class BuilderBuild(object):
             self.cleanup_glossaries_files(query)
 
     def cleanup_build_files(self, query):
-        file_endings = ['.aux', '.blg', '.bbl', '.dvi', '.xdv', '.fdb_latexmk', '.fls', '.idx' , '.ilg',
-                        '.ind', '.log', '.nav', '.out', '.snm', '.synctex.gz', '.toc',
-                        '.ist', '.glo', '.glg', '.acn', '.alg',
-                        '.bcf', '.run.xml', '.out.ps']
-        for ending in file_endings:
-            try: os.remove(os.path.splitext(query.tex_filename)[0] + ending)
+        for ending in self.build_file_endings:
+            try: os.remove(self.get_output_base(query) + ending)
             except FileNotFoundError: pass
 
     def cleanup_glossaries_files(self, query):
-        for ending in ['.gls', '.acr']:
-            try: os.remove(os.path.splitext(query.tex_filename)[0] + ending)
+        for ending in self.glossaries_file_endings:
+            try: os.remove(self.get_output_base(query) + ending)
             except FileNotFoundError: pass
 
 
@@ -21,6 +21,7 @@ import shutil
 import subprocess
 
 import setzer.document.build_system.builder.builder_build as builder_build
+from setzer.document.build_system.build_cache.build_cache import BuildCache
 from setzer.app.service_locator import ServiceLocator
 
 
@@ -30,27 +31,48 @@ class BuilderBuildBiber(builder_build.BuilderBuild):
         builder_build.BuilderBuild.__init__(self)
 
     def run(self, query):
-        tex_filename = query.tex_filename
+        tex_filename = self.get_output_base(query) + '.tex'
         filename = tex_filename.rsplit('/', 1)[1][:-4]
 
         arguments = ['biber']
         arguments.append(filename)
 
-        query.biber_data['ran_on_files'].append(filename)
-
-        custom_env = os.environ.copy()
-        custom_env['BIBINPUTS'] = os.path.dirname(query.tex_filename) + ':' + os.path.dirname(tex_filename)
-        try:
-            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename), env=custom_env)
-        except FileNotFoundError:
-            self.cleanup_files(query)
-            self.throw_build_error(query, 'interpreter_not_working', 'biber missing')
-            return
-        self.process.wait()
+        # biber is skipped if neither the .bcf file nor the data sources
+        # it names changed since its last run.
+        bcf_filename = tex_filename[:-3] + 'bcf'
+        bib_files = self.get_data_sources(bcf_filename, self.get_working_directory(query))
+        cache_key = ('biber', tex_filename)
+        query.build_data['bibliography_files'] += bib_files
+
+        if BuildCache.lookup(cache_key, tex_filename[:-4]) == None:
+            custom_env = os.environ.copy()
+            custom_env['BIBINPUTS'] = self.get_working_directory(query) + ':' + os.path.dirname(tex_filename)
+            try:
+                process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename), env=custom_env, preexec_fn=self.get_preexec_fn(query))
+            except FileNotFoundError:
+                self.cleanup_files(query)
+                self.throw_build_error(query, 'interpreter_not_working', 'biber missing')
+                return
+            self.process = process
+            process.wait()
+
+            # runs that failed or were stopped aren't cached.
+            if process.returncode == 0 and not query.force_building_to_stop:
+                BuildCache.store(cache_key, [bcf_filename] + bib_files, tex_filename[:-4], ['.bbl', '.blg'])
 
         self.parse_biber_log(query, tex_filename[:-3] + 'blg')
 
-        query.jobs.insert(0, 'build_latex')
+    def get_data_sources(self, bcf_filename, dirname):
+        try:
+            with open(bcf_filename, 'r') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError):
+            return list()
+
+        bib_files = list()
+        for match in ServiceLocator.get_regex_object(r'<bcf:datasource[^>]*type="file"[^>]*>([^<]*)</bcf:datasource>').finditer(text):
+            bib_files.append(os.path.join(dirname, match.group(1).strip()))
+        return bib_files
 
     def stop_running(self):
         if self.process != None:
@@ -19,9 +19,11 @@ import os
 import os.path
 import shutil
 import subprocess
+import hashlib
 from operator import itemgetter
 
 import setzer.document.build_system.builder.builder_build as builder_build
+from setzer.document.build_system.build_cache.build_cache import BuildCache
 from setzer.app.service_locator import ServiceLocator
 
 
@@ -33,24 +35,69 @@ class BuilderBuildBibTeX(builder_build.BuilderBuild):
         self.bibtex_log_item_regex = ServiceLocator.get_regex_object(r'Warning--(.*)\n--line ([0-9]+) of file (.*)|I couldn' + "'" + r't open style file (.*)\n---line ([0-9]+) of file (.*)|Warning--(.*)')
 
     def run(self, query):
-        tex_filename = query.tex_filename
+        tex_filename = self.get_output_base(query) + '.tex'
         filename = tex_filename.rsplit('/', 1)[1][:-4]
 
         arguments = ['bibtex']
         arguments.append(filename + '.aux')
 
-        query.bibtex_data['ran_on_files'].append(filename)
-
-        try:
-            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename))
-        except FileNotFoundError:
-            self.cleanup_files(query)
-            self.throw_build_error(query, 'interpreter_not_working', 'bibtex missing')
-            return
-        self.process.wait()
+        # bibtex only depends on the citations and bibliography commands
+        # in the .aux files, and on the .bib files.
+        aux_lines, bib_files = self.get_inputs(tex_filename[:-3] + 'aux', self.get_working_directory(query))
+        cache_key = ('bibtex', tex_filename, hashlib.sha1('\n'.join(aux_lines).encode('utf-8')).hexdigest())
+        query.build_data['bibliography_files'] += bib_files
+
+        if BuildCache.lookup(cache_key, tex_filename[:-4]) == None:
+            # bibtex runs in the build directory, .bib and .bst files
+            # are also looked for next to the document.
+            custom_env = os.environ.copy()
+            custom_env['BIBINPUTS'] = self.get_working_directory(query) + ':' + custom_env.get('BIBINPUTS', '')
+            custom_env['BSTINPUTS'] = self.get_working_directory(query) + ':' + custom_env.get('BSTINPUTS', '')
+            try:
+                process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename), env=custom_env, preexec_fn=self.get_preexec_fn(query))
+            except FileNotFoundError:
+                self.cleanup_files(query)
+                self.throw_build_error(query, 'interpreter_not_working', 'bibtex missing')
+                return
+            self.process = process
+            process.wait()
+
+            # runs that failed or were stopped aren't cached.
+            if process.returncode == 0 and not query.force_building_to_stop:
+                BuildCache.store(cache_key, bib_files, tex_filename[:-4], ['.bbl', '.blg'])
 
         self.parse_bibtex_log(query, tex_filename[:-3] + 'blg')
-        query.jobs.insert(0, 'build_latex')
+
+    def get_inputs(self, aux_filename, bib_dirname, visited=None):
+        ''' Lines of the .aux file (and the .aux files it includes) read by
+            bibtex, and the .bib files they name, relative to bib_dirname. '''
+
+        if visited == None: visited = set()
+        if aux_filename in visited: return (list(), list())
+        visited.add(aux_filename)
+
+        try:
+            with open(aux_filename, 'r') as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            return (list(), list())
+
+        dirname = os.path.dirname(aux_filename)
+        aux_lines = list()
+        bib_files = list()
+        for line in lines:
+            if line.startswith('\\citation') or line.startswith('\\bibstyle'):
+                aux_lines.append(line)
+            elif line.startswith('\\bibdata{'):
+                aux_lines.append(line)
+                for name in line[9:].rstrip('}').split(','):
+                    name = name.strip()
+                    bib_files.append(os.path.join(bib_dirname, name if name.endswith('.bib') else name + '.bib'))
+            elif line.startswith('\\@input{'):
+                included_lines, included_bib_files = self.get_inputs(os.path.join(dirname, line[8:].rstrip('}')), bib_dirname, visited)
+                aux_lines += included_lines
+                bib_files += included_bib_files
+        return (aux_lines, bib_files)
 
     def stop_running(self):
         if self.process != None:
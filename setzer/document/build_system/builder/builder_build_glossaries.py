@@ -29,25 +29,18 @@ class BuilderBuildGlossaries(builder_build.BuilderBuild):
         builder_build.BuilderBuild.__init__(self)
 
     def run(self, query):
-        tex_filename = query.tex_filename
+        tex_filename = self.get_output_base(query) + '.tex'
 
         basename = os.path.basename(tex_filename).rsplit('.', 1)[0]
         arguments = ['makeglossaries']
         arguments.append(basename)
         try:
-            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename))
+            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename), preexec_fn=self.get_preexec_fn(query))
         except FileNotFoundError:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_not_working', 'makeglossaries missing')
             return
         self.process.wait()
-        for ending in ['.gls', '.acr']:
-            move_from = os.path.join(os.path.dirname(tex_filename), basename + ending)
-            move_to = os.path.join(os.path.dirname(query.tex_filename), basename + ending)
-            try: shutil.move(move_from, move_to)
-            except FileNotFoundError: pass
-
-        query.jobs.insert(0, 'build_latex')
 
     def stop_running(self):
         if self.process != None:
@@ -18,13 +18,19 @@
 import os
 import os.path
 import sys
+import time
 import base64
 import shutil
+import hashlib
+import tempfile
 import pexpect
 from operator import itemgetter
 
 import setzer.document.build_system.builder.builder_build as builder_build
 import setzer.document.build_system.latex_log_parser.latex_log_parser as latex_log_parser
+from setzer.document.build_system.build_cache.build_cache import BuildCache
+from setzer.document.build_system.synctex.synctex_index import SyncTeXIndex
+from setzer.document.build_system.build_planner.build_planner import BuildPlanner
 from setzer.app.service_locator import ServiceLocator
 
 
@@ -35,79 +41,292 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
 
         self.config_folder = ServiceLocator.get_config_folder()
         self.latex_log_parser = latex_log_parser.LaTeXLogParser()
+        self.build_planner = BuildPlanner()
 
     def run(self, query):
         build_command_defaults = dict()
-        build_command_defaults['pdflatex'] = 'pdflatex -synctex=1 -interaction=nonstopmode'
-        build_command_defaults['xelatex'] = 'xelatex -synctex=1 -interaction=nonstopmode'
-        build_command_defaults['lualatex'] = 'lualatex --synctex=1 --interaction=nonstopmode'
+        build_command_defaults['pdflatex'] = 'pdflatex -synctex=1 -interaction=nonstopmode -recorder'
+        build_command_defaults['xelatex'] = 'xelatex -synctex=1 -interaction=nonstopmode -recorder'
+        build_command_defaults['lualatex'] = 'lualatex --synctex=1 --interaction=nonstopmode --recorder'
         build_command_defaults['tectonic'] = 'tectonic --synctex --keep-logs'
 
+        output_base = self.get_output_base(query)
         latex_interpreter = query.build_data['latex_interpreter']
         if latex_interpreter == 'tectonic':
             build_command = build_command_defaults[latex_interpreter]
-            build_command += ' --outdir "' + os.path.dirname(query.tex_filename) + '" "' 
+            build_command += ' --outdir "' + os.path.dirname(output_base) + '" "' 
         elif query.build_data['use_latexmk']:
             if latex_interpreter == 'pdflatex':
                 interpreter_option = 'pdf'
             else:
                 interpreter_option = latex_interpreter
-            build_command = 'latexmk -' + interpreter_option + ' -synctex=1 -interaction=nonstopmode'
+            build_command = 'latexmk -' + interpreter_option + ' -synctex=1 -interaction=nonstopmode -recorder'
             build_command += query.build_data['additional_arguments']
-            build_command += ' -output-directory="' + os.path.dirname(query.tex_filename) + '" "'
+            build_command += ' -output-directory="' + os.path.dirname(output_base) + '" "'
         else:
             build_command = build_command_defaults[latex_interpreter]
+            if query.build_data['use_precompiled_preamble'] and latex_interpreter == 'pdflatex':
+                format_filename = self.get_format(query)
+                if query.force_building_to_stop: return
+                if format_filename != None:
+                    build_command += ' -fmt="' + format_filename + '"'
             build_command += query.build_data['additional_arguments']
-            build_command += ' -output-directory="' + os.path.dirname(query.tex_filename) + '" "'
+            build_command += ' -output-directory="' + os.path.dirname(output_base) + '" "'
         build_command += query.tex_filename + '"'
 
+        # tectonic doesn't record its inputs, so its builds aren't cached.
+        cache_key = None if latex_interpreter == 'tectonic' else ('latex', build_command)
+        if cache_key != None and not query.build_data['cache_checked']:
+            query.build_data['cache_checked'] = True
+            if self.restore_from_cache(query, cache_key):
+                return
+
+        # a pass after tools that left their outputs as they were
+        # would change nothing, the last one is used instead.
+        if self.build_planner.can_skip_pass(query):
+            self.finish_build(query, cache_key, False)
+            return
+        self.build_planner.start_pass(query, output_base, self.read_recorder_file(output_base + '.fls', self.get_working_directory(query)))
+
+        # the log is read while latex runs, so messages show up early.
+        # the log of the previous run is removed, so it isn't read instead.
+        log_filename = output_base + '.log'
+        try: os.remove(log_filename)
+        except FileNotFoundError: pass
+        log_stream = latex_log_parser.LaTeXLogStream(self.latex_log_parser, query.tex_filename)
+        log_offset = 0
+
         try:
-            self.process = pexpect.spawn(build_command, cwd=os.path.dirname(query.tex_filename))
+            self.process = pexpect.spawn(build_command, cwd=self.get_working_directory(query), preexec_fn=self.get_preexec_fn(query))
         except pexpect.exceptions.ExceptionPexpect:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_missing', latex_interpreter)
             return
+        process = self.process
 
+        seconds_without_output = 0
         while True:
             try:
-                out = self.process.expect(['\r\n\r\n', pexpect.TIMEOUT, pexpect.EOF], timeout=20)
+                out = self.process.expect(['\r\n\r\n', pexpect.TIMEOUT, pexpect.EOF], timeout=1)
             except AttributeError:
                 break
+
+            log_offset = self.read_log(query, log_filename, log_offset, log_stream)
+            if query.build_data['stop_on_first_error'] and log_stream.error_count > 0 and out != 2:
+                query.build_data['stopped_at_error'] = True
+                try: self.process.terminate(True)
+                except AttributeError: pass
+                break
+
             if out == 0:
-                pass
+                seconds_without_output = 0
             elif out == 1:
-                for line in self.process.before.split(b'\n'):
-                    if line.startswith(b'!'):
-                        self.process.sendcontrol('c')
-                        self.process.sendline('x')
+                seconds_without_output += 1
+                if seconds_without_output >= 20:
+                    seconds_without_output = 0
+                    for line in self.process.before.split(b'\n'):
+                        if line.startswith(b'!'):
+                            self.process.sendcontrol('c')
+                            self.process.sendline('x')
             else:
                 break
 
+        # the exit status is known once the process is closed.
+        try: process.close()
+        except pexpect.exceptions.ExceptionPexpect: pass
+        query.build_data['latex_exit_status'] = process.exitstatus
+
+        self.finish_build(query, cache_key, True)
+
+    def finish_build(self, query, cache_key, plan_jobs):
+        output_base = self.get_output_base(query)
+
         # parse results
         try:
-            if self.parse_build_log(query):
+            if self.parse_build_log(query, plan_jobs):
                 return
         except FileNotFoundError as e:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_not_working', 'log file missing')
             return
 
-        query.can_sync = self.copy_synctex_file(query)
+        # the kept synctex file goes with the pdf on screen, which
+        # builds with errors don't replace.
+        if query.error_count == 0:
+            query.can_sync = self.copy_build_file(query, '.synctex.gz')
+            self.read_synctex_file(query)
+        else:
+            query.can_sync = False
+            query.synctex_index = None
+        if not query.build_data['section_build'] and query.build_data['source_filename'] == None:
+            self.copy_build_file(query, '.aux')
+        # outputs of builds that were stopped or where latex failed
+        # may be incomplete, so they aren't cached.
+        build_completed = query.build_data['latex_exit_status'] == 0 and not query.force_building_to_stop and not query.build_data['stopped_at_error']
+        if cache_key != None and query.error_count == 0 and build_completed:
+            self.add_to_cache(query, cache_key)
         self.cleanup_files(query)
 
-        pdf_filename = query.tex_filename.rsplit('.tex', 1)[0] + '.pdf'
+        pdf_filename = output_base + '.pdf'
         if query.error_count > 0:
             if os.path.isfile(pdf_filename):
                 os.remove(pdf_filename)
             pdf_filename = None
 
-        with query.build_result_lock:
-            query.build_result = {'pdf_filename': pdf_filename, 
-                                  'has_synctex_file': query.can_sync,
-                                  'log_messages': query.log_messages,
-                                  'bibtex_log_messages': query.bibtex_log_messages,
-                                  'error': None,
-                                  'error_arg': None}
+        self.set_build_result(query, pdf_filename)
+
+    def set_build_result(self, query, pdf_filename):
+        # of the files in the build directory only the pdf is copied
+        # to the document. it's replaced at once, so the preview
+        # doesn't see it half written.
+        if query.build_data['build_directory'] != None and pdf_filename != None:
+            output_filename = os.path.splitext(query.tex_filename)[0] + '.pdf'
+            try:
+                shutil.copyfile(pdf_filename, output_filename + '.part')
+                os.replace(output_filename + '.part', output_filename)
+            except OSError: pdf_filename = None
+            else: pdf_filename = output_filename
+
+        query.build_result = {'pdf_filename': pdf_filename, 
+                              'has_synctex_file': query.can_sync,
+                              'synctex_index': query.synctex_index,
+                              'log_messages': query.log_messages,
+                              'bibtex_log_messages': query.bibtex_log_messages,
+                              'error': None,
+                              'error_arg': None}
+
+    def restore_from_cache(self, query, cache_key):
+        entry = BuildCache.lookup(cache_key, self.get_output_base(query))
+        if entry == None: return False
+
+        query.log_messages = entry['data']['log_messages']
+        query.bibtex_log_messages = entry['data']['bibtex_log_messages']
+        query.error_count = 0
+        query.can_sync = self.copy_build_file(query, '.synctex.gz')
+        self.read_synctex_file(query)
+        self.cleanup_files(query)
+        self.set_build_result(query, self.get_output_base(query) + '.pdf')
+        return True
+
+    def add_to_cache(self, query, cache_key):
+        base = self.get_output_base(query)
+        inputs = self.get_recorded_inputs(base + '.fls', self.get_working_directory(query))
+        if inputs == None or not os.path.isfile(base + '.pdf'): return
+
+        # the document's own helper files are left out, as they are
+        # removed after building. bibliographies stand in for the .bbl.
+        helper_files = set(base + ending for ending in self.build_file_endings + self.glossaries_file_endings)
+        inputs = [pathname for pathname in inputs if pathname not in helper_files]
+        inputs += [pathname for pathname in query.build_data['bibliography_files'] if os.path.isfile(pathname)]
+
+        data = {'log_messages': query.log_messages, 'bibtex_log_messages': query.bibtex_log_messages}
+        BuildCache.store(cache_key, inputs, base, ['.pdf', '.synctex.gz', '.log'], data)
+
+    def read_log(self, query, log_filename, offset, log_stream):
+        ''' Feeds the complete lines latex added to the log since offset
+            to log_stream, and passes new messages to the log callback. '''
+
+        try:
+            with open(log_filename, 'rb') as f:
+                f.seek(offset)
+                data = f.read()
+        except OSError:
+            return offset
+
+        length = data.rfind(b'\n') + 1
+        if length > 0 and log_stream.feed(data[:length].decode('utf-8', errors='ignore')):
+            if query.build_data['log_callback'] != None:
+                log_items = dict()
+                for filename, items in log_stream.log_items.items():
+                    log_items[filename] = {'error': list(items['error']), 'warning': list(items['warning']), 'badbox': list(items['badbox'])}
+                query.build_data['log_callback'](log_items)
+        return offset + length
+
+    def get_recorded_inputs(self, fls_filename, working_directory):
+        ''' Files read but not written by a latex run, from the
+            .fls file written with -recorder. '''
+
+        recorded_files = self.read_recorder_file(fls_filename, working_directory)
+        if recorded_files == None: return None
+        return sorted(recorded_files[0] - recorded_files[1])
+
+    def read_recorder_file(self, fls_filename, working_directory):
+        ''' Sets of the files read and written by a latex run, and of
+            those read before the run wrote them, or None. '''
+
+        try:
+            with open(fls_filename, 'r') as f:
+                lines = f.read().splitlines()
+        except (OSError, UnicodeDecodeError):
+            return None
+
+        inputs = set()
+        outputs = set()
+        read_before_written = set()
+        for line in lines:
+            if line.startswith('PWD '):
+                working_directory = line[4:]
+            elif line.startswith('INPUT '):
+                filename = os.path.normpath(os.path.join(working_directory, line[6:]))
+                inputs.add(filename)
+                if filename not in outputs:
+                    read_before_written.add(filename)
+            elif line.startswith('OUTPUT '):
+                outputs.add(os.path.normpath(os.path.join(working_directory, line[7:])))
+        return (inputs, outputs, read_before_written)
+
+    def get_format(self, query):
+        ''' Filename of a format with the preamble of the document dumped
+            into it by mylatexformat, or None. The format is made again
+            when the preamble or one of the files read for it changes. '''
+
+        # the parser's offset must match the file on disk, which
+        # differs from the buffer if it wasn't saved.
+        offset = query.build_data['begin_document_offset']
+        if offset == None: return None
+        try:
+            with open(query.tex_filename, 'r') as f:
+                text = f.read()
+        except (OSError, UnicodeDecodeError):
+            return None
+        if not text.startswith('\\begin{document}', offset): return None
+        preamble_hash = hashlib.sha1(text[:offset].encode('utf-8')).hexdigest()
+
+        # the jobname is the document's, as packages may use it in the preamble.
+        jobname = os.path.splitext(os.path.basename(query.tex_filename))[0]
+        format_command = query.build_data['latex_interpreter'] + ' -ini -interaction=nonstopmode -recorder' + query.build_data['additional_arguments'] + ' -jobname="' + jobname + '"'
+        cache_key = ('format', query.tex_filename, format_command)
+
+        entry = BuildCache.lookup(cache_key)
+        if entry == None or entry['data']['preamble_hash'] != preamble_hash:
+            self.make_format(query, format_command, jobname, cache_key, preamble_hash)
+            entry = BuildCache.lookup(cache_key)
+
+        # formats that couldn't be made are cached without output,
+        # so they aren't tried again before something changes.
+        if entry == None or entry['data']['preamble_hash'] != preamble_hash or '.fmt' not in entry['outputs']:
+            return None
+        return BuildCache.get_output_filename(entry, '.fmt')
+
+    def make_format(self, query, format_command, jobname, cache_key, preamble_hash):
+        folder = tempfile.mkdtemp()
+        arguments = format_command + ' -output-directory="' + folder + '" "&' + query.build_data['latex_interpreter'] + '" mylatexformat.ltx "' + os.path.basename(query.tex_filename) + '"'
+        try:
+            try:
+                self.process = pexpect.spawn(arguments, cwd=self.get_working_directory(query), preexec_fn=self.get_preexec_fn(query))
+                self.process.expect(pexpect.EOF, timeout=None)
+            except (pexpect.exceptions.ExceptionPexpect, AttributeError):
+                return
+            self.process = None
+            if query.force_building_to_stop: return
+
+            # the document itself is covered by the preamble hash.
+            inputs = self.get_recorded_inputs(os.path.join(folder, jobname + '.fls'), self.get_working_directory(query))
+            if inputs == None: inputs = list()
+            inputs = [pathname for pathname in inputs if pathname != query.tex_filename]
+            BuildCache.store(cache_key, inputs, os.path.join(folder, jobname), ['.fmt'], {'preamble_hash': preamble_hash})
+        finally:
+            shutil.rmtree(folder, ignore_errors=True)
 
     def stop_running(self):
         if self.process != None:
@@ -116,16 +335,23 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
             self.process.terminate(True)
             self.process = None
 
-    def parse_build_log(self, query):
+    def parse_build_log(self, query, plan_jobs):
         query.log_messages = list()
         query.error_count = 0
 
-        log_items = self.latex_log_parser.parse_build_log(query.tex_filename)
-        additional_jobs = self.latex_log_parser.get_additional_jobs(log_items, query)
-        file_no = 0
+        output_base = self.get_output_base(query)
+        start_time = time.time()
+        log_items = self.latex_log_parser.parse_build_log(query.tex_filename, output_base + '.log')
+        # section builds are a single pass, with the .aux of the last full
+        # build. latexmk runs the tools and passes it needs by itself.
+        if not plan_jobs or query.build_data['stopped_at_error'] or query.build_data['section_build'] or query.build_data['use_latexmk']:
+            additional_jobs = list()
+        else:
+            additional_jobs = self.build_planner.get_next_jobs(query, output_base, log_items, self.read_recorder_file(output_base + '.fls', self.get_working_directory(query)))
+        query.metrics['parse_time'] += time.time() - start_time
 
-        for job in additional_jobs:
-            query.jobs.insert(0, job)
+        if len(additional_jobs) > 0:
+            query.jobs = additional_jobs + query.jobs
             return True
 
         for filename, items in log_items.items():
@@ -137,10 +363,13 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
 
         return False
 
-    def copy_synctex_file(self, query):
-        move_from = os.path.splitext(query.tex_filename)[0] + '.synctex.gz'
-        folder = self.config_folder + '/' + base64.urlsafe_b64encode(str.encode(query.tex_filename)).decode()
-        move_to = folder + '/' + os.path.splitext(os.path.basename(query.tex_filename))[0] + '.synctex.gz'
+    def copy_build_file(self, query, ending):
+        ''' Keeps a copy of a build file in the config folder,
+            as build files may be removed after building. '''
+
+        move_from = self.get_output_base(query) + ending
+        folder = self.config_folder + '/' + base64.urlsafe_b64encode(str.encode(self.get_source_filename(query))).decode()
+        move_to = folder + '/' + os.path.splitext(os.path.basename(query.tex_filename))[0] + ending
 
         if not os.path.exists(folder):
             os.makedirs(folder)
@@ -149,4 +378,19 @@ class BuilderBuildLaTeX(builder_build.BuilderBuild):
         except FileNotFoundError: return False
         else: return True
 
+    def read_synctex_file(self, query):
+        query.synctex_index = None
+        if not query.can_sync: return
+
+        synctex_index = SyncTeXIndex(self.get_source_filename(query))
+        if synctex_index.read_file(self.get_output_base(query) + '.synctex.gz'):
+            synctex_index.rename_input(query.tex_filename, self.get_source_filename(query))
+            query.synctex_index = synctex_index
+
+    def get_source_filename(self, query):
+        # builds of a snapshot stand in for the document it was taken of.
+        if query.build_data['source_filename'] != None:
+            return query.build_data['source_filename']
+        return query.tex_filename
+
 
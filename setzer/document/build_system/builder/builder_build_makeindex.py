@@ -32,24 +32,20 @@ class BuilderBuildMakeindex(builder_build.BuilderBuild):
         self.bibtex_log_item_regex = ServiceLocator.get_regex_object(r'Warning--(.*)\n--line ([0-9]+) of file (.*)|I couldn' + "'" + r't open style file (.*)\n---line ([0-9]+) of file (.*)')
 
     def run(self, query):
-        tex_filename = query.tex_filename
+        tex_filename = self.get_output_base(query) + '.tex'
         filename = tex_filename.rsplit('/', 1)[1][:-4]
 
         arguments = ['makeindex']
         arguments.append(filename + '.idx')
 
-        query.makeindex_data['ran_on_files'].append(filename)
-
         try:
-            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename))
+            self.process = subprocess.Popen(arguments, stdout=subprocess.PIPE, stderr=subprocess.STDOUT, cwd=os.path.dirname(tex_filename), preexec_fn=self.get_preexec_fn(query))
         except FileNotFoundError:
             self.cleanup_files(query)
             self.throw_build_error(query, 'interpreter_not_working', 'makeindex missing')
             return
         self.process.wait()
 
-        query.jobs.insert(0, 'build_latex')
-
     def stop_running(self):
         if self.process != None:
             self.process.kill()
@@ -34,8 +34,7 @@ class LaTeXLogParser():
         self.badbox_line_number_regex = ServiceLocator.get_regex_object(r'lines ([0-9]+)--([0-9]+)')
         self.other_line_number_regex = ServiceLocator.get_regex_object(r'(l\.| input line \n| input line )([0-9]+)( |\.)')
 
-    def parse_build_log(self, tex_filename):
-        log_filename = os.path.dirname(tex_filename) + '/' + os.path.basename(tex_filename).rsplit('.tex', 1)[0] + '.log'
+    def parse_build_log(self, tex_filename, log_filename):
         try: file = open(log_filename, 'rb')
         except FileNotFoundError as e: raise e
         else:
@@ -50,77 +49,6 @@ class LaTeXLogParser():
 
         return log_items
 
-    def get_additional_jobs(self, log_items, query):
-        jobs = set()
-        rerun_latex_reasons = set()
-        for filename, items in log_items.items():
-            for item in items['error'] + items['warning']:
-
-                if item[2].startswith('No file ') and item[2].find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0 and item[2].find('.bbl.') >= 0:
-                    if not query.tex_filename.rsplit('/', 1)[1][:-4] in query.bibtex_data['ran_on_files']:
-                        jobs |= {'build_bibtex'}
-
-                elif item[2].startswith('No file ') and item[2].find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0 and item[2].find('.ind.') >= 0:
-                    if not query.tex_filename.rsplit('/', 1)[1][:-4] in query.makeindex_data['ran_on_files']:
-                        jobs |= {'build_makeindex'}
-
-                elif item[2] == 'Please (re)run Biber on the file:':
-                    line = item[3]
-                    if line.find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0:
-                        if not query.tex_filename.rsplit('/', 1)[1][:-4] in query.biber_data['ran_on_files']:
-                            jobs |= {'build_biber'}
-
-                elif item[2] == 'File `' + query.tex_filename.rsplit('/', 1)[1][:-4] + '.out\' has changed.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {1}
-
-                elif item[2] == 'Please rerun LaTeX.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {2}
-
-                elif item[2] == 'Label(s) may have changed. Rerun to get cross-references right.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {3}
-
-                elif item[2] == 'There were undefined references.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {3}
-
-                elif item[2] == 'Citation(s) may have changed.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {4}
-
-                elif item[2].startswith('No file ') and item[2].find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0 and (item[2].find('.toc.') >= 0 or item[2].find('.aux.') >= 0):
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {5}
-
-                elif item[2] == 'Rerun to get transparencies right.':
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {6}
-
-                elif item[2].startswith('No file ') and item[2].find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0 and (item[2].find('.gls.') >= 0 or item[2].find('.acr.') >= 0):
-                    jobs |= {'build_glossaries'}
-
-                elif item[2].startswith('No file ') and item[2].find(query.tex_filename.rsplit('.', 1)[0].rsplit('/', 1)[1]) >= 0 and (item[2].find('.aux.') >= 0):
-                    jobs |= {'build_latex'}
-                    rerun_latex_reasons |= {7}
-
-        if 'build_biber' in jobs:
-            return {'build_biber'}
-        if 'build_bibtex' in jobs:
-            return {'build_bibtex'}
-        if 'build_makeindex' in jobs:
-            return {'build_makeindex'}
-        if 'build_glossaries' in jobs:
-            return {'build_glossaries'}
-        if 'build_latex' in jobs:
-            if len(rerun_latex_reasons - query.build_data['rerun_latex_reasons']) > 0:
-                query.build_data['rerun_latex_reasons'] = rerun_latex_reasons
-                return {'build_latex'}
-            else:
-                jobs -= {'build_latex'}
-        return jobs
-
     def parse_log_text(self, filename, text):
         log_messages = {'error': list(), 'warning': list(), 'badbox': list()}
         matches = self.item_regex.split(text)
@@ -234,37 +162,22 @@ class LaTeXLogParser():
             return line.strip()
 
     def split_log_text_by_file(self, log_text, tex_filename):
-        doc_texts = dict()
+        ''' The lines of the log for each .tex or .gls file, in a single
+            pass. Each line belongs to the innermost of these files open
+            at its start. '''
+
+        file_stack = LaTeXLogFileStack(self, tex_filename)
+        doc_lines = {tex_filename: list()}
+        for line in log_text.split('\n'):
+            filename = file_stack.current_filename
+            if filename not in doc_lines:
+                doc_lines[filename] = list()
+            doc_lines[filename].append(line)
+            file_stack.add_line(line)
 
-        matches = self.doc_regex.split(log_text)
-        buffer = ''
-        for match in reversed(matches):
-            if not self.doc_regex.fullmatch(match):
-                buffer += match
-            else:
-                match = match.strip() + buffer
-                buffer = ''
-                filename = self.doc_regex.match(match).group(2).strip()
-                if not filename.startswith('/'):
-                    filename = path_helpers.get_abspath(filename, os.path.dirname(tex_filename))
-                else:
-                    filename = os.path.normpath(filename)
-                if not filename == tex_filename:
-                    open_brackets = 0
-                    char_count = 0
-                    for char in match:
-                        if char == ')':
-                            open_brackets -= 1
-                        if char == '(':
-                            open_brackets += 1
-                        char_count += 1
-                        if open_brackets == 0:
-                            break
-                    match = match[:char_count]
-                    doc_texts[filename] = match
-                    log_text = log_text.replace(match, '')
-                buffer = ''
-        doc_texts[tex_filename] = log_text
+        doc_texts = dict()
+        for filename, lines in doc_lines.items():
+            doc_texts[filename] = '\n'.join(lines) + '\n'
         return doc_texts
 
     def bl_get_line_number(self, line, matchiter):
@@ -280,3 +193,112 @@ class LaTeXLogParser():
         return -1
 
 
+class LaTeXLogStream(object):
+    ''' Parses a log while it's being written. Text is fed in chunks of
+        any size; the stream keeps the incomplete last line, the message
+        being read and the stack of open files between chunks. '''
+
+    # a message ends when the next one starts, or after this many lines
+    # (enough for bl_get_line_number to find its line number).
+    max_message_lines = 11
+
+    def __init__(self, log_parser, tex_filename):
+        self.log_parser = log_parser
+        self.tex_filename = tex_filename
+
+        self.pending_text = ''
+        self.message_lines = None
+        self.message_filename = None
+        self.file_stack = LaTeXLogFileStack(log_parser, tex_filename)
+
+        self.log_items = dict()
+        self.error_count = 0
+
+    def feed(self, text):
+        ''' Returns True if new messages were found. '''
+
+        lines = (self.pending_text + text).split('\n')
+        self.pending_text = lines.pop()
+
+        error_count = self.error_count
+        number_of_items = self.count_items()
+        for line in lines:
+            self.add_line(line + '\n')
+        return self.count_items() != number_of_items or self.error_count != error_count
+
+    def close(self):
+        if self.pending_text != '':
+            self.add_line(self.pending_text + '\n')
+            self.pending_text = ''
+        self.end_message()
+
+    def add_line(self, line):
+        if self.log_parser.item_regex.fullmatch(line):
+            self.end_message()
+            self.message_lines = [line]
+            self.message_filename = self.file_stack.current_filename
+        elif self.message_lines != None:
+            self.message_lines.append(line)
+            if len(self.message_lines) >= self.max_message_lines:
+                self.end_message()
+        self.file_stack.add_line(line[:-1])
+
+    def end_message(self):
+        if self.message_lines == None: return
+
+        messages = self.log_parser.parse_log_text(self.message_filename, ''.join(self.message_lines))
+        items = self.log_items.setdefault(self.message_filename, {'error': list(), 'warning': list(), 'badbox': list()})
+        for item_type in ['error', 'warning', 'badbox']:
+            items[item_type] += messages[item_type]
+        self.error_count += len(messages['error'])
+        self.message_lines = None
+
+    def count_items(self):
+        return sum(len(items['error']) + len(items['warning']) + len(items['badbox']) for items in self.log_items.values())
+
+
+class LaTeXLogFileStack(object):
+    ''' Follows which file TeX is reading through the parentheses it
+        writes around the files it opens. Lines TeX wrapped at
+        max_print_line are joined first, so file names broken across
+        lines are found. Only .tex and .gls files count, text of other
+        files belongs to the file that opened them. '''
+
+    max_print_line = 79
+
+    def __init__(self, log_parser, tex_filename):
+        self.doc_regex = log_parser.doc_regex
+        self.paren_regex = ServiceLocator.get_regex_object(r'\(|\)')
+        self.dirname = os.path.dirname(tex_filename)
+
+        # the file current after each open parenthesis
+        self.stack = list()
+        self.current_filename = tex_filename
+        self.tex_filename = tex_filename
+        self.wrapped_text = ''
+
+    def add_line(self, line):
+        ''' Takes the next line of the log, without its newline. '''
+
+        if len(line) == self.max_print_line or len(line.encode('utf-8')) == self.max_print_line:
+            self.wrapped_text += line
+            return
+        text = self.wrapped_text + line
+        self.wrapped_text = ''
+
+        for match in self.paren_regex.finditer(text):
+            if match.group(0) == '(':
+                file_match = self.doc_regex.match(text, match.start())
+                if file_match != None:
+                    self.current_filename = self.get_abspath(file_match.group(2).strip())
+                self.stack.append(self.current_filename)
+            elif len(self.stack) > 0:
+                self.stack.pop()
+                self.current_filename = self.stack[-1] if len(self.stack) > 0 else self.tex_filename
+
+    def get_abspath(self, filename):
+        if filename.startswith('/'):
+            return os.path.normpath(filename)
+        return path_helpers.get_abspath(filename, self.dirname)
+
+
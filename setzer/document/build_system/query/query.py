@@ -15,30 +15,18 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
-import _thread as thread
-
 
 class Query(object):
 
     def __init__(self, tex_filename):
+        # results are written by the worker running the query and read
+        # on the main loop once it's done.
         self.build_result = None
-        self.build_result_lock = thread.allocate_lock()
-        self.forward_sync_result = None
-        self.forward_sync_result_lock = thread.allocate_lock()
-        self.backward_sync_result = None
-        self.backward_sync_result_lock = thread.allocate_lock()
-        self.done_executing = False
-        self.done_executing_lock = thread.allocate_lock()
-        self.synctex_file = None
-        self.synctex_file_lock = thread.allocate_lock()
+        self.synctex_index = None
 
-        self.build_data = {'rerun_latex_reasons': set()}
-        self.biber_data = {'ran_on_files': []}
-        self.bibtex_data = {'ran_on_files': []}
-        self.makeindex_data = {'ran_on_files': []}
+        self.build_data = {'bibliography_files': list(), 'cache_checked': False, 'stopped_at_error': False, 'stop_on_first_error': False, 'log_callback': None, 'use_precompiled_preamble': False, 'begin_document_offset': None, 'section_build': False, 'working_directory': None, 'build_directory': None, 'source_filename': None, 'low_priority': False, 'latex_passes': 0, 'latex_exit_status': None, 'rerun_files': None, 'rerun_hashes': dict(), 'rerun_messages': set(), 'tool_inputs': dict(), 'tool_outputs': None}
         self.can_sync = False
-        self.forward_sync_data = dict()
-        self.backward_sync_data = dict()
+        self.forward_sync_data = None
         self.tex_filename = tex_filename
 
         self.log_messages = dict()
@@ -46,33 +34,16 @@ class Query(object):
         self.force_building_to_stop = False
         self.error_count = 0
 
+        # seconds spent waiting for a worker, running and parsing logs
+        self.metrics = {'queue_wait': 0, 'run_time': 0, 'parse_time': 0}
+
     def get_build_result(self):
-        return_value = None
-        with self.build_result_lock:
-            if self.build_result != None:
-                return_value = self.build_result
-        return return_value
+        return self.build_result
 
-    def get_forward_sync_result(self):
-        return_value = None
-        with self.forward_sync_result_lock:
-            if self.forward_sync_result != None:
-                return_value = self.forward_sync_result
-        return return_value
+    def cancel(self):
+        ''' Jobs check this between steps, running processes are
+            stopped by the builders. '''
 
-    def get_backward_sync_result(self):
-        return_value = None
-        with self.backward_sync_result_lock:
-            if self.backward_sync_result != None:
-                return_value = self.backward_sync_result
-        return return_value
+        self.force_building_to_stop = True
 
-    def mark_done(self):
-        with self.done_executing_lock:
-            self.done_executing = True
-    
-    def is_done(self):
-        with self.done_executing_lock:
-            return self.done_executing
-    
 
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import os.path
+import math
+import gzip
+import zlib
+
+
+class SyncTeXIndex(object):
+    ''' The boxes of a .synctex.gz file, indexed by source line for
+        forward sync and by position on the page for backward sync.
+        The file is read once after building, lookups don't touch it
+        again. Positions are in big points from the top left of the page. '''
+
+    # boxes are grouped in horizontal bands of this height on each page
+    band_height = 32
+
+    # forward sync looks this many lines around a line without output
+    max_line_distance = 100
+
+    def __init__(self, tex_filename):
+        self.dirname = os.path.dirname(tex_filename)
+
+        self.filenames_by_tag = dict()
+        self.tags_by_filename = dict()
+
+        # (page, left, top, right, bottom, tag, line) of hboxes and void boxes
+        self.boxes = list()
+
+        # box numbers by (tag, line), for the nodes inside of the boxes
+        # and for the boxes themselves.
+        self.node_boxes = dict()
+        self.line_boxes = dict()
+
+        # (h, tag, line) of the nodes inside of each hbox
+        self.box_nodes = dict()
+
+        self.page_boxes = dict()
+        self.page_bands = dict()
+
+    def read_file(self, pathname):
+        ''' Returns False if the file can't be read. '''
+
+        try:
+            with gzip.open(pathname, 'rt', encoding='utf-8', errors='replace') as f:
+                lines = f.read().split('\n')
+        except (OSError, EOFError, zlib.error):
+            return False
+
+        unit = 1
+        magnification = 1000
+        x_offset = 0
+        y_offset = 0
+        content_start = len(lines)
+        try:
+            for number, line in enumerate(lines):
+                if line.startswith('Input:'):
+                    self.add_input(line)
+                elif line.startswith('Unit:'):
+                    unit = float(line[5:])
+                elif line.startswith('Magnification:'):
+                    magnification = float(line[14:])
+                elif line.startswith('X Offset:'):
+                    x_offset = float(line[9:])
+                elif line.startswith('Y Offset:'):
+                    y_offset = float(line[9:])
+                elif line.startswith('Content:'):
+                    content_start = number + 1
+                    break
+        except ValueError:
+            return False
+
+        # synctex units to big points
+        scale = unit * magnification / 1000 / 65781.76
+        x_offset *= unit / 65781.76
+        y_offset *= unit / 65781.76
+
+        page = 0
+        # number of each open box, None for vboxes
+        open_boxes = list()
+        for line in lines[content_start:]:
+            if line == '': continue
+            kind = line[0]
+
+            if kind == ')' or kind == ']':
+                if len(open_boxes) > 0:
+                    open_boxes.pop()
+                continue
+            if kind == '{':
+                page = int(line[1:])
+                open_boxes = list()
+                continue
+            if kind not in '([hvkgx$':
+                if line.startswith('Input:'):
+                    self.add_input(line)
+                elif line.startswith('Postamble:'):
+                    break
+                continue
+
+            try:
+                link, position = line[1:].split(':', 1)
+                link = link.split(',')
+                tag = int(link[0])
+                line_number = int(link[1])
+                values = position.replace(':', ',').split(',')
+                h = int(values[0]) * scale + x_offset
+                v = int(values[1]) * scale + y_offset
+                if kind in '([hv':
+                    width = int(values[2]) * scale
+                    height = int(values[3]) * scale
+                    depth = int(values[4]) * scale
+            except (ValueError, IndexError):
+                if kind == '(' or kind == '[':
+                    open_boxes.append(None)
+                continue
+
+            parent = open_boxes[-1] if len(open_boxes) > 0 else None
+            if kind == '[':
+                open_boxes.append(None)
+                continue
+
+            # glue, kerns and the like are shown by the box around them
+            if parent != None:
+                self.box_nodes[parent].append((h, tag, line_number))
+                if kind in 'kgx$':
+                    self.add_to_index(self.node_boxes, (tag, line_number), parent)
+
+            if kind in '(hv':
+                left, right = min(h, h + width), max(h, h + width)
+                box = len(self.boxes)
+                self.boxes.append((page, left, v - height, right, v + depth, tag, line_number))
+                self.add_to_page(page, box)
+                if kind == '(':
+                    self.box_nodes[box] = list()
+                    self.add_to_index(self.line_boxes, (tag, line_number), box)
+                    open_boxes.append(box)
+                else:
+                    self.add_to_index(self.node_boxes, (tag, line_number), box)
+        return True
+
+    def add_input(self, line):
+        tag, filename = line[6:].split(':', 1)
+        filename = os.path.normpath(os.path.join(self.dirname, filename))
+        self.filenames_by_tag[int(tag)] = filename
+        self.add_to_index(self.tags_by_filename, filename, int(tag))
+
+    def rename_input(self, filename, new_filename):
+        ''' Output of filename is shown as that of new_filename. '''
+
+        for tag in self.tags_by_filename.pop(os.path.normpath(filename), list()):
+            self.filenames_by_tag[tag] = os.path.normpath(new_filename)
+            self.add_to_index(self.tags_by_filename, os.path.normpath(new_filename), tag)
+
+    def add_to_index(self, index, key, value):
+        if key not in index:
+            index[key] = [value]
+        elif index[key][-1] != value:
+            index[key].append(value)
+
+    def add_to_page(self, page, box):
+        if page not in self.page_boxes:
+            self.page_boxes[page] = list()
+            self.page_bands[page] = dict()
+        self.page_boxes[page].append(box)
+
+        bands = self.page_bands[page]
+        for band in range(math.floor(self.boxes[box][2] / self.band_height), math.floor(self.boxes[box][4] / self.band_height) + 1):
+            if band not in bands:
+                bands[band] = list()
+            bands[band].append(box)
+
+    def forward_sync(self, filename, line):
+        ''' Rectangles of the output of line (counted from 1) of filename,
+            on the first page it shows up. Lines without output are
+            replaced by the closest line that has some. '''
+
+        tags = self.tags_by_filename.get(os.path.normpath(filename), list())
+        if len(tags) == 0: return list()
+
+        line_numbers = [line]
+        for distance in range(1, self.max_line_distance + 1):
+            line_numbers += [line + distance, line - distance]
+
+        for line_number in line_numbers:
+            boxes = self.get_boxes_at_line(tags, line_number)
+            if len(boxes) > 0:
+                return self.get_rectangles(boxes)
+        return list()
+
+    def get_boxes_at_line(self, tags, line):
+        # boxes carry the line they were finished on, their nodes the
+        # line they came from, so boxes are only used if no node matches.
+        for index in [self.node_boxes, self.line_boxes]:
+            boxes = list()
+            for tag in tags:
+                boxes += index.get((tag, line), list())
+            if len(boxes) > 0:
+                return boxes
+        return list()
+
+    def get_rectangles(self, boxes):
+        page = min(self.boxes[box][0] for box in boxes)
+
+        rectangles = list()
+        for box in sorted(set(boxes)):
+            box_page, left, top, right, bottom, tag, line = self.boxes[box]
+            if box_page == page:
+                rectangles.append({'page': page, 'h': left, 'v': bottom, 'width': right - left, 'height': bottom - top})
+        return rectangles
+
+    def backward_sync(self, page, x, y):
+        ''' (filename, line) of the source of position x, y on page, or None.
+            Lines are counted from 1. '''
+
+        if page not in self.page_boxes: return None
+
+        # the innermost box at the position, or else the closest box.
+        best_box = None
+        best_area = None
+        for box in self.page_bands[page].get(math.floor(y / self.band_height), list()):
+            box_page, left, top, right, bottom, tag, line = self.boxes[box]
+            if left <= x <= right and top <= y <= bottom:
+                area = (right - left) * (bottom - top)
+                if best_area == None or area < best_area:
+                    best_box = box
+                    best_area = area
+
+        if best_box == None:
+            best_distance = None
+            for box in self.page_boxes[page]:
+                box_page, left, top, right, bottom, tag, line = self.boxes[box]
+                distance = math.hypot(max(left - x, 0, x - right), max(top - y, 0, y - bottom))
+                if best_distance == None or distance < best_distance:
+                    best_box = box
+                    best_distance = distance
+
+        # the last node in the box starting left of the position
+        tag, line = self.boxes[best_box][5:7]
+        nodes = self.box_nodes.get(best_box, list())
+        if len(nodes) > 0:
+            h, tag, line = nodes[0]
+            for node in nodes:
+                if node[0] <= x:
+                    h, tag, line = node
+
+        if tag not in self.filenames_by_tag: return None
+        return (self.filenames_by_tag[tag], line)
+
+
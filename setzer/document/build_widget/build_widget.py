@@ -58,7 +58,7 @@ class BuildWidget(Observable):
 
     def on_build_state_change(self, build_system, build_state):
         document = self.document
-        if document.build_system.build_mode in ['build', 'build_and_forward_sync']:
+        if document.build_system.build_mode in ['build', 'build_and_forward_sync', 'build_section']:
             state = document.build_system.get_build_state()
             selfstate = self.build_button_state
             if state == 'idle' or state == '':
@@ -89,6 +89,8 @@ class BuildWidget(Observable):
         self.set_clean_button_state()
 
     def on_build_state(self, build_system, message):
+        self.update_metrics_tooltip(build_system.build_metrics if message in ['success', 'error'] else None)
+
         if message == '':
             self.show_message('')
         elif message == 'success':
@@ -109,6 +111,13 @@ class BuildWidget(Observable):
         if (section, item) == ('preferences', 'cleanup_build_files'):
             self.set_clean_button_state()
 
+    def update_metrics_tooltip(self, metrics):
+        if metrics == None:
+            self.view.label.set_tooltip_text(None)
+        else:
+            tooltip = _('Waited {queue_wait:.1f}s, built in {run_time:.1f}s, log parsed in {parse_time:.2f}s').format(**metrics)
+            self.view.label.set_tooltip_text(tooltip)
+
     def show_message(self, message=''):
         self.view.stop_timer()
         self.view.show_result(message)
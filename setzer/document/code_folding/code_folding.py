@@ -15,6 +15,8 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
+import bisect
+
 from setzer.helpers.observable import Observable
 from setzer.app.service_locator import ServiceLocator
 from setzer.helpers.timer import timer
@@ -30,10 +32,9 @@ class CodeFolding(Observable):
         self.tag = self.source_buffer.create_tag('invisible_region', invisible=1)
 
         self.folding_regions = dict()
-        self.folding_regions_by_line = dict()
         self.initial_folded_regions = None
 
-        self.document.parser.connect('finished_parsing', self.on_parser_update)
+        self.document.parser.connect('blocks_changed', self.on_blocks_changed)
         self.settings.connect('settings_changed', self.on_settings_changed)
 
     def on_settings_changed(self, settings, parameter):
@@ -42,79 +43,48 @@ class CodeFolding(Observable):
             for region in self.folding_regions.values():
                 self.unfold(region)
 
-    def on_parser_update(self, parser):
-        # this method updates the dict of folding regions after the
-        # main text changed and the parser has updated the blocks (potential
-        # folding regions). the first step is to update the offsets of
-        # previous folding regions (update their positions w.r.t. the
-        # amount of text inserted or deleted). these updated positions
-        # will be used in the algorithm further below.
-
-        folding_regions = dict()
-        if parser.last_edit[0] == 'insert':
-            _, location_iter, text, text_length = parser.last_edit
-            length = len(text)
-            offset_start = location_iter.get_offset() + length - 1
-            offset_end = offset_start + 1
-        elif parser.last_edit[0] == 'delete':
-            _, start_iter, end_iter = parser.last_edit
-            offset_start = start_iter.get_offset()
-            offset_end = end_iter.get_offset()
-            length = offset_start - offset_end
-        for index, region in self.folding_regions.items():
-            if index <= offset_start:
-                folding_regions[index] = region
-            elif index >= offset_end:
-                folding_regions[index + length] = region
-
-        # now update the folding regions w.r.t. the new parsing results.
-        # if the offset of a region matches a previously included region,
-        # that region is assumed to be the same as the previous one:
-        # it will match if it's in the same place, after the above
-        # relocations are taken into account.
-        # this step is important, because we want to keep track of
-        # which regions are folded, so we have to transfer that
-        # state to the new regions, by identifying them with previous
-        # ones.
-
-        last_line = -1
-        self.folding_regions = dict()
-        self.folding_regions_by_line = dict()
-        for block in parser.symbols['blocks']:
-            if block[1] != None:
-                if block[2] != last_line:
-                    if block[0] in folding_regions:
-                        region = folding_regions[block[0]]
-                        del(folding_regions[block[0]])
-                    else:
-                        region = {'is_folded': False}
-                    region['offset_start'] = block[0]
-                    region['offset_end'] = block[1]
-                    region['starting_line'] = block[2]
-                    region['ending_line'] = block[3]
-                    self.folding_regions[block[0]] = region
-                    self.folding_regions_by_line[block[2]] = region
-                last_line = block[2]
-
-        # in a last step, the regions that are no longer
-        # included, but were previously, are unfolded.
-
-        for region in folding_regions.values():
-            self.unfold(region)
+    def on_blocks_changed(self, parser, blocks_diff):
+        # this method updates the folding regions after the parser has
+        # updated the blocks (potential folding regions). the parser
+        # keeps the identity of blocks across edits, so regions are
+        # kept by block, and with them their folding state. blocks
+        # move with the text, so region bounds are taken from them
+        # when a region is used.
+
+        for block in blocks_diff['removed']:
+            region = self.folding_regions.pop(id(block), None)
+            if region != None and region['is_folded']:
+                self.unfold(region)
+        for block in blocks_diff['added']:
+            self.folding_regions[id(block)] = {'is_folded': False, 'block': block}
 
         self.initial_folding()
 
+    def set_region_bounds(self, region):
+        block = region['block']
+        region['offset_start'] = block[0]
+        region['offset_end'] = block[1]
+        region['starting_line'] = block[2]
+        region['ending_line'] = block[3]
+
     def get_region_by_line(self, line):
-        if line in self.folding_regions_by_line:
-            return self.folding_regions_by_line[line]
+        # only the first block on each line gets a folding region.
+        blocks = self.document.parser.symbols['blocks']
+        index = bisect.bisect_left(blocks, line, key=lambda block: block[2])
+        if index < len(blocks) and blocks[index][2] == line:
+            region = self.folding_regions[id(blocks[index])]
+            self.set_region_bounds(region)
+            return region
         return None
 
     def fold(self, region):
         region['is_folded'] = True
+        self.set_region_bounds(region)
         self.hide_region(region)
 
     def unfold(self, region):
         region['is_folded'] = False
+        self.set_region_bounds(region)
         self.show_region(region)
 
     def show_region(self, region):
@@ -129,6 +99,7 @@ class CodeFolding(Observable):
         self.source_buffer.remove_tag(self.tag, start_iter, end_iter)
         for some_region in self.folding_regions.values():
             if some_region['is_folded']:
+                self.set_region_bounds(some_region)
                 if some_region['starting_line'] >= region['starting_line'] and some_region['ending_line'] <= region['ending_line']:
                     self.hide_region(some_region)
         self.add_change_code('folding_state_changed')
@@ -149,6 +120,7 @@ class CodeFolding(Observable):
         folded_regions = list()
         for region in self.folding_regions.values():
             if region['is_folded']:
+                self.set_region_bounds(region)
                 folded_regions.append({'starting_line': region['starting_line'], 'ending_line': region['ending_line']})
         return folded_regions
 
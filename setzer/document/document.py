@@ -232,6 +232,7 @@ class Document(Observable):
         self.insert_text_after_packages_if_possible(text)
 
     def insert_text_after_packages_if_possible(self, text):
+        self.parser.parse_now()
         self.source_buffer.begin_user_action()
         package_data = self.parser.symbols['packages_detailed']
         if package_data:
@@ -259,6 +260,7 @@ class Document(Observable):
         self.source_buffer.end_user_action()
 
     def remove_packages(self, packages):
+        self.parser.parse_now()
         packages_data = self.parser.symbols['packages_detailed']
         for package in packages:
             if package in packages_data:
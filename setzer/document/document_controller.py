@@ -24,6 +24,7 @@ from gi.repository import Gdk, GLib, Gtk, GObject, Pango
 from setzer.dialogs.dialog_locator import DialogLocator
 from setzer.app.service_locator import ServiceLocator
 from setzer.app.font_manager import FontManager
+from setzer.app.file_watcher import FileWatcher
 
 
 class DocumentController(object):
@@ -35,9 +36,9 @@ class DocumentController(object):
 
         self.deleted_on_disk_dialog_shown_after_last_save = False
         self.changed_on_disk_dialog_shown_after_last_change = False
-        self.continue_save_date_loop = True
+        self.watched_filename = None
         self.zoom_threshold = 0
-        GObject.timeout_add(500, self.save_date_loop)
+        self.document.connect('filename_change', self.on_filename_change)
 
         self.primary_click_controller = Gtk.GestureClick()
         self.primary_click_controller.set_button(1)
@@ -63,6 +64,16 @@ class DocumentController(object):
         key_controller.set_propagation_phase(Gtk.PropagationPhase.CAPTURE)
         self.document.view.source_view.add_controller(key_controller)
 
+    def on_filename_change(self, document, filename=None):
+        self.set_watched_filename(self.document.get_filename())
+
+    def set_watched_filename(self, filename):
+        if self.watched_filename != None:
+            FileWatcher.unwatch(self.watched_filename, self.on_file_changed)
+        self.watched_filename = filename
+        if self.watched_filename != None:
+            FileWatcher.watch(self.watched_filename, self.on_file_changed)
+
     def on_primary_buttonpress(self, controller, n_press, x, y):
         modifiers = Gtk.accelerator_get_default_mod_mask()
 
@@ -131,11 +142,10 @@ class DocumentController(object):
     def on_decelerate(self, controller, vel_x, vel_y):
         self.zoom_threshold = 0
 
-    def save_date_loop(self):
-        if self.document.filename == None: return True
-        if self.deleted_on_disk_dialog_shown_after_last_save: return True
-        if self.changed_on_disk_dialog_shown_after_last_change:
-            return True
+    def on_file_changed(self, filename):
+        if self.document.filename == None: return
+        if self.deleted_on_disk_dialog_shown_after_last_save: return
+        if self.changed_on_disk_dialog_shown_after_last_change: return
 
         if self.document.get_deleted_on_disk():
             self.deleted_on_disk_dialog_shown_after_last_save = True
@@ -145,8 +155,6 @@ class DocumentController(object):
             self.changed_on_disk_dialog_shown_after_last_change = True
             DialogLocator.get_dialog('document_changed_on_disk').run({'document': self.document}, self.changed_on_disk_cb)
 
-        return self.continue_save_date_loop
-
     def changed_on_disk_cb(self, do_reload):
         if do_reload:
             self.document.populate_from_filename()
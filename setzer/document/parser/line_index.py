@@ -0,0 +1,208 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import bisect
+import itertools
+
+
+class LineIndex(object):
+    ''' Keeps the matches found by a parser grouped by the line they
+        start on, with offsets relative to the start of that line.
+        Lines are kept in chunks, with Fenwick trees over the number of
+        lines and characters of the chunks. An edit only touches the
+        chunk with the edited lines, and line starts and positions of
+        matches are found in O(log n). '''
+
+    chunk_size = 256
+
+    def __init__(self):
+        self.chunks = [LineIndexChunk([0], [()])]
+
+        # (chunk, line in the chunk, offset in the line) for each match
+        self.token_locations = dict()
+
+        self.update_trees()
+
+    def replace_lines(self, first_line, last_line, text, tokens):
+        ''' Replace lines first_line to last_line (inclusive) by the lines
+            of text. Tokens are (kind, match, offset) with offsets relative
+            to the start of text. '''
+
+        lengths = [len(line) + 1 for line in text.split('\n')]
+        if last_line == self.get_number_of_lines() - 1:
+            lengths[-1] -= 1
+
+        local_line_starts = list(itertools.accumulate(lengths))
+        line_tokens = [()] * len(lengths)
+        for kind, match, offset in tokens:
+            line = bisect.bisect_right(local_line_starts, offset)
+            line_start = local_line_starts[line - 1] if line > 0 else 0
+            if not line_tokens[line]:
+                line_tokens[line] = list()
+            line_tokens[line].append((kind, match, offset - line_start))
+
+        first_chunk, lines_before = self.find_chunk(self.line_tree, first_line)
+        last_chunk, lines_before_last = self.find_chunk(self.line_tree, last_line)
+        start = first_line - lines_before
+        end = last_line - lines_before_last + 1
+        if first_chunk == last_chunk:
+            self.forget_tokens(self.chunks[first_chunk].line_tokens[start:end])
+        else:
+            self.forget_tokens(self.chunks[first_chunk].line_tokens[start:])
+            for chunk in self.chunks[first_chunk + 1:last_chunk]:
+                self.forget_tokens(chunk.line_tokens)
+            self.forget_tokens(self.chunks[last_chunk].line_tokens[:end])
+
+        # usually the edited lines are in a single chunk, which is changed
+        # in place. otherwise the chunks they span are put together again.
+        chunk = self.chunks[first_chunk]
+        if first_chunk == last_chunk and len(chunk.line_lengths) - (end - start) + len(lengths) <= self.chunk_size:
+            length = chunk.length
+            number_of_lines = len(chunk.line_lengths)
+            chunk.line_lengths[start:end] = lengths
+            chunk.line_tokens[start:end] = line_tokens
+            chunk.update()
+            self.add_to_tree(self.line_tree, first_chunk, len(chunk.line_lengths) - number_of_lines)
+            self.add_to_tree(self.char_tree, first_chunk, chunk.length - length)
+            last_changed_line = start + len(lengths) if number_of_lines == len(chunk.line_lengths) else len(chunk.line_lengths)
+            for line in range(start, last_changed_line):
+                self.add_tokens(chunk, line)
+        else:
+            line_lengths = self.chunks[first_chunk].line_lengths[:start] + lengths + self.chunks[last_chunk].line_lengths[end:]
+            line_tokens = self.chunks[first_chunk].line_tokens[:start] + line_tokens + self.chunks[last_chunk].line_tokens[end:]
+            number_of_chunks = (len(line_lengths) - 1) // self.chunk_size + 1
+            chunk_length = (len(line_lengths) - 1) // number_of_chunks + 1
+            chunks = list()
+            for i in range(0, len(line_lengths), chunk_length):
+                chunks.append(LineIndexChunk(line_lengths[i:i + chunk_length], line_tokens[i:i + chunk_length]))
+            self.chunks[first_chunk:last_chunk + 1] = chunks
+            self.update_trees()
+            for chunk in chunks:
+                for line in range(len(chunk.line_lengths)):
+                    self.add_tokens(chunk, line)
+
+    def forget_tokens(self, lines):
+        for line_tokens in lines:
+            for kind, match, offset in line_tokens:
+                del(self.token_locations[match])
+
+    def add_tokens(self, chunk, line):
+        for kind, match, offset in chunk.line_tokens[line]:
+            self.token_locations[match] = (chunk, line, offset)
+
+    def get_line_tokens(self, first_line, last_line):
+        chunk_index, lines_before = self.find_chunk(self.line_tree, first_line)
+        tokens = list()
+        while chunk_index < len(self.chunks) and lines_before <= last_line:
+            chunk = self.chunks[chunk_index]
+            for line_tokens in chunk.line_tokens[max(first_line - lines_before, 0):last_line - lines_before + 1]:
+                tokens += line_tokens
+            lines_before += len(chunk.line_lengths)
+            chunk_index += 1
+        return tokens
+
+    def get_number_of_lines(self):
+        return self.get_sum_before(self.line_tree, len(self.chunks))
+
+    def get_line_start(self, line):
+        chunk_index, lines_before = self.find_chunk(self.line_tree, line)
+        return self.get_sum_before(self.char_tree, chunk_index) + self.chunks[chunk_index].get_line_starts()[line - lines_before]
+
+    def get_line_at_offset(self, offset):
+        chunk_index, chars_before = self.find_chunk(self.char_tree, offset)
+        line = bisect.bisect_right(self.chunks[chunk_index].get_line_starts(), offset - chars_before) - 1
+        return self.get_sum_before(self.line_tree, chunk_index) + line
+
+    def contains(self, match):
+        return match in self.token_locations
+
+    def get_position(self, match):
+        ''' (line, offset) of match. '''
+
+        chunk, line, offset = self.token_locations[match]
+        line_number = self.get_sum_before(self.line_tree, chunk.index) + line
+        return (line_number, self.get_sum_before(self.char_tree, chunk.index) + chunk.get_line_starts()[line] + offset)
+
+    def get_offset(self, match):
+        return self.get_position(match)[1]
+
+    def update_trees(self):
+        for index, chunk in enumerate(self.chunks):
+            chunk.index = index
+        self.line_tree = self.get_tree([len(chunk.line_lengths) for chunk in self.chunks])
+        self.char_tree = self.get_tree([chunk.length for chunk in self.chunks])
+
+    def get_tree(self, values):
+        tree = [0] + values
+        for i in range(1, len(tree)):
+            j = i + (i & -i)
+            if j < len(tree):
+                tree[j] += tree[i]
+        return tree
+
+    def add_to_tree(self, tree, index, value):
+        index += 1
+        while index < len(tree):
+            tree[index] += value
+            index += index & -index
+
+    def get_sum_before(self, tree, index):
+        result = 0
+        while index > 0:
+            result += tree[index]
+            index -= index & -index
+        return result
+
+    def find_chunk(self, tree, value):
+        ''' The chunk containing value (a line or offset), and the sum
+            of the chunks before it. Values past the end are taken to be
+            in the last chunk. '''
+
+        index = 0
+        total = 0
+        step = 1 << (len(tree) - 1).bit_length()
+        while step > 0:
+            if index + step < len(tree) and total + tree[index + step] <= value:
+                index += step
+                total += tree[index]
+            step >>= 1
+        if index == len(self.chunks):
+            index -= 1
+            total = self.get_sum_before(tree, index)
+        return (index, total)
+
+
+class LineIndexChunk(object):
+    ''' A run of lines: their lengths, tokens and starts relative to the
+        start of the chunk. '''
+
+    def __init__(self, line_lengths, line_tokens):
+        self.line_lengths = line_lengths
+        self.line_tokens = line_tokens
+        self.index = 0
+        self.update()
+
+    def update(self):
+        self.length = sum(self.line_lengths)
+        self.line_starts = None
+
+    def get_line_starts(self):
+        if self.line_starts == None:
+            self.line_starts = list(itertools.accumulate(self.line_lengths[:-1], initial=0))
+        return self.line_starts
+
+
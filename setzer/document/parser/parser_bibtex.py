@@ -55,6 +55,9 @@ class ParserBibTeX(Observable):
         self.text = self.text[:offset] + text + self.text[offset:]
         self.parse_symbols(self.text)
 
+    def parse_now(self):
+        pass
+
     #@timer
     def parse_symbols(self, text):
         bibitems = set()
@@ -62,5 +65,6 @@ class ParserBibTeX(Observable):
             bibitems = bibitems | {match.group(2).strip()}
 
         self.symbols['bibitems'] = bibitems
+        self.add_change_code('finished_parsing')
 
 
@@ -45,4 +45,7 @@ class ParserDummy(Observable):
     def on_text_inserted(self, buffer, location_iter, text, text_length):
         pass
 
+    def parse_now(self):
+        pass
+
 
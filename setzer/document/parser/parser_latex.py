@@ -15,6 +15,14 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
+import gi
+from gi.repository import GLib
+
+import _thread as thread, threading
+import bisect
+
+import setzer.document.parser.line_index as line_index
+import setzer.document.parser.positions as positions
 from setzer.app.service_locator import ServiceLocator
 from setzer.helpers.observable import Observable
 from setzer.helpers.timer import timer
@@ -22,30 +30,88 @@ from setzer.helpers.timer import timer
 
 class ParserLaTeX(Observable):
 
+    blocks_pattern = r'\\(begin|end)\{((?:\w|•|\*)+)\}|\\(part|chapter|section|subsection|subsubsection|paragraph|subparagraph)(?:\*){0,1}\{([^\{]*)\}'
+    symbols_pattern = r'\\(label|include|input|subfile|subimport|bibliography|addbibresource|todo)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|\.|,|\/|\\|\'|-|\"|\(|\))*)\}|\\(usepackage)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}'
+    section_levels = {'part': 0, 'chapter': 1, 'section': 2, 'subsection': 3, 'subsubsection': 4, 'paragraph': 5, 'subparagraph': 6}
+
     def __init__(self, document):
         Observable.__init__(self)
         self.document = document
         self.text_length = 0
         self.number_of_lines = 0
-        self.block_symbol_matches = {'begin_or_end': list(), 'others': list()}
-        self.other_symbols = list()
-
-        self.symbols = dict()
+        self.line_index = line_index.LineIndex()
+
+        # state of the block structure, kept between edits. blocks
+        # are identified by their delimiter matches, which are reused
+        # for lines that are parsed again but didn't change. block_ends
+        # has the end of each block by its start: the paired \end of
+        # environments, the next section on the same or a higher level
+        # for sections (None if there is none).
+        self.environment_delimiters = dict()
+        self.sections = list()
+        self.block_ends = dict()
+        self.begins_by_end = dict()
+        self.begin_document = None
+        self.end_document = None
+        self.blocks_by_delimiter = dict()
+        self.preamble_block = None
+        self.preamble_end = None
+
+        # block starts that may have a different end after the edits
+        # being parsed, and the offsets of delimiters they removed.
+        self.changed_starts = set()
+        self.changed_environments = set()
+        self.removed_offsets = dict()
+
+        # blocks, positions and symbols are read by the main thread.
+        # the worker hands over what changed: the positions of tokens
+        # on edited lines (None for removed tokens), the delimiters of
+        # changed blocks, and symbols added (True) or removed (False).
+        # blocks compute their values from the positions when they're
+        # read, so blocks after an edit don't have to be touched.
+        self.positions = positions.Positions()
+        self.edit_shifts = list()
+        self.published_version = 0
+        self.published_begin_document = None
+        self.published_end_document = None
+        self.symbol_counts = dict()
+        self.symbol_matches = {'labels_with_offset': set(), 'todos_with_offset': set(), 'included_latex_files': set(), 'packages_detailed': set()}
+
+        self.symbols = ParserLaTeXSymbols(self)
         self.symbols['bibitems'] = set()
         self.symbols['labels'] = set()
-        self.symbols['labels_with_offset'] = list()
         self.symbols['todos'] = set()
-        self.symbols['todos_with_offset'] = set()
-        self.symbols['included_latex_files'] = set()
         self.symbols['bibliographies'] = set()
         self.symbols['packages'] = set()
-        self.symbols['packages_detailed'] = dict()
         self.symbols['blocks'] = list()
 
         self.last_edit = None
 
+        # edits are recorded on the main thread and parsed on a worker
+        # thread. results are published on idle, and only if no edit
+        # came in since, so stale results are never seen. the state of
+        # the parser is guarded by parsing_lock, which is held while
+        # parsing. results are handed over under results_lock, which
+        # is only held briefly, so publishing doesn't wait for a parse.
+        self.generation = 0
+        self.edits = list()
+        self.edits_submitted = True
+        self.pending_edits = list()
+        self.pending_edits_condition = threading.Condition()
+        self.parsing_lock = thread.allocate_lock()
+        self.results_lock = thread.allocate_lock()
+        self.parsed_generation = 0
+        self.published_generation = 0
+        self.unpublished_blocks_diff = {'added': list(), 'removed': list(), 'changed': list()}
+        self.unpublished_definitions = dict()
+        self.unpublished_positions = dict()
+        self.unpublished_symbol_changes = dict()
+        self.unpublished_document = (None, None)
+        self.is_stopped = False
+
         self.document.source_buffer.connect('insert-text', self.on_insert_text)
         self.document.source_buffer.connect('delete-range', self.on_text_deleted)
+        thread.start_new_thread(self.parse_loop, ())
 
     #@timer
     def on_text_deleted(self, buffer, start_iter, end_iter):
@@ -55,249 +121,589 @@ class ParserLaTeX(Observable):
         offset_end = end_iter.get_offset()
         line_start = start_iter.get_line()
         line_end = end_iter.get_line()
-        char_count = buffer.get_char_count()
         _, before_iter = buffer.get_iter_at_line(line_start)
-        _, after_iter = buffer.get_iter_at_line(line_end + 1)
-        if not after_iter.get_offset() == char_count:
-            after_iter.backward_char()
+        after_iter = end_iter.copy()
+        if not after_iter.ends_line():
+            after_iter.forward_to_line_end()
 
-        text_length = offset_end - offset_start
-        text = buffer.get_text(start_iter, end_iter, True)
-        deleted_line_count = text.count('\n')
         text_before = buffer.get_text(before_iter, start_iter, True)
         text_after = buffer.get_text(end_iter, after_iter, True)
-        offset_line_start = before_iter.get_offset()
-        self.text_length = char_count - offset_end + offset_start
-
-        block_symbol_matches = {'begin_or_end': list(), 'others': list()}
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] < line_start:
-                block_symbol_matches['begin_or_end'].append(match)
-        for match in self.block_symbol_matches['others']:
-            if match[1] < line_start:
-                block_symbol_matches['others'].append(match)
-        other_symbols = list()
-        for match in self.other_symbols:
-            if match[1] < offset_line_start:
-                other_symbols.append((match[0], match[1]))
-
-        offset_line_end = offset_end + len(text_after)
-        text = text_before + text_after
-
-        additional_matches = self.parse_for_blocks(text, line_start, offset_line_start)
-        block_symbol_matches['begin_or_end'] += additional_matches['begin_or_end']
-        block_symbol_matches['others'] += additional_matches['others']
-        for match in ServiceLocator.get_regex_object(r'\\(label|include|input|subfile|subimport|bibliography|addbibresource|todo)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|\.|,|\/|\\|\'|-|\"|\(|\))*)\}|\\(usepackage)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}').finditer(text):
-            other_symbols.append((match, match.start() + offset_line_start))
-
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] > line_end:
-                block_symbol_matches['begin_or_end'].append((match[0], match[1] - deleted_line_count, match[2] - text_length))
-        for match in self.block_symbol_matches['others']:
-            if match[1] > line_end:
-                block_symbol_matches['others'].append((match[0], match[1] - deleted_line_count, match[2] - text_length))
-        for match in self.other_symbols:
-            if match[1] > offset_line_end:
-                other_symbols.append((match[0], match[1] - text_length))
-
-        self.block_symbol_matches = block_symbol_matches
-        self.number_of_lines = self.number_of_lines - deleted_line_count
-        self.parse_blocks()
-
-        self.other_symbols = other_symbols
-        self.parse_symbols()
+        text_length = buffer.get_char_count() - offset_end + offset_start
+        number_of_lines = buffer.get_line_count() - 1 - line_end + line_start
 
-        self.add_change_code('finished_parsing')
+        # only the lines touched by the deletion are parsed again,
+        # the index takes care of moving everything after them.
+        self.edit_shifts.append((offset_end, line_start - line_end, offset_start - offset_end))
+        self.add_edit(line_start, line_end, text_before + text_after, text_length, number_of_lines)
 
     #@timer
     def on_insert_text(self, buffer, location_iter, text, text_length):
         self.last_edit = ('insert', location_iter, text, text_length)
 
-        text_length = len(text)
-        offset = location_iter.get_offset()
-        new_line_count = text.count('\n')
         line_start = location_iter.get_line()
-        char_count = buffer.get_char_count()
         _, before_iter = buffer.get_iter_at_line(line_start)
-        _, after_iter = buffer.get_iter_at_line(line_start + 1)
-        if not after_iter.get_offset() == char_count:
-            after_iter.backward_char()
+        after_iter = location_iter.copy()
+        if not after_iter.ends_line():
+            after_iter.forward_to_line_end()
 
         text_before = buffer.get_text(before_iter, location_iter, True)
-        offset_line_start = before_iter.get_offset()
         text_after = buffer.get_text(location_iter, after_iter, True)
-        offset_line_end = offset + len(text_after)
-        self.text_length = char_count + text_length
-        text_parse = text_before + text + text_after
-
-        block_symbol_matches = {'begin_or_end': list(), 'others': list()}
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] < line_start:
-                block_symbol_matches['begin_or_end'].append(match)
-        for match in self.block_symbol_matches['others']:
-            if match[1] < line_start:
-                block_symbol_matches['others'].append(match)
-        other_symbols = list()
-        for match in self.other_symbols:
-            if match[1] < offset_line_start:
-                other_symbols.append((match[0], match[1]))
-
-        additional_matches = self.parse_for_blocks(text_parse, line_start, offset_line_start)
-        block_symbol_matches['begin_or_end'] += additional_matches['begin_or_end']
-        block_symbol_matches['others'] += additional_matches['others']
-        for match in ServiceLocator.get_regex_object(r'\\(label|include|input|subfile|subimport|bibliography|addbibresource|todo)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|\.|,|\/|\\|\'|-|\"|\(|\))*)\}|\\(usepackage)(?:\[[^\{\[]*\]){0,1}\{((?:\s|\w|\:|,)*)\}|\\(bibitem)(?:\[.*\]){0,1}\{((?:\s|\w|\:)*)\}').finditer(text_parse):
-            other_symbols.append((match, match.start() + offset_line_start))
-
-        for match in self.block_symbol_matches['begin_or_end']:
-            if match[1] > line_start:
-                block_symbol_matches['begin_or_end'].append((match[0], match[1] + new_line_count, match[2] + text_length))
-        for match in self.block_symbol_matches['others']:
-            if match[1] > line_start:
-                block_symbol_matches['others'].append((match[0], match[1] + new_line_count, match[2] + text_length))
-        for match in self.other_symbols:
-            if match[1] > offset_line_end:
-                other_symbols.append((match[0], match[1] + text_length))
-
-        self.block_symbol_matches = block_symbol_matches
-        self.number_of_lines = self.number_of_lines + new_line_count
-        self.parse_blocks()
-
-        self.other_symbols = other_symbols
-        self.parse_symbols()
+        text_length = buffer.get_char_count() + len(text)
+        number_of_lines = buffer.get_line_count() - 1 + text.count('\n')
+
+        # the line the text is inserted into is parsed again,
+        # the index takes care of moving everything after it.
+        self.edit_shifts.append((location_iter.get_offset(), text.count('\n'), len(text)))
+        self.add_edit(line_start, line_start, text_before + text + text_after, text_length, number_of_lines)
+
+    def add_edit(self, line_start, line_end, text, text_length, number_of_lines):
+        self.generation += 1
+        self.edits.append((line_start, line_end, text, text_length, number_of_lines, self.generation))
+
+        # edits coming in before the main loop gets idle (e.g. while
+        # pasting or replacing all) are handed to the worker together.
+        if self.edits_submitted:
+            self.edits_submitted = False
+            GLib.idle_add(self.submit_edits)
+
+    def submit_edits(self):
+        with self.pending_edits_condition:
+            self.pending_edits += self.edits
+            self.pending_edits_condition.notify()
+        self.edits = list()
+        self.edits_submitted = True
+        return False
+
+    def stop(self):
+        ''' Ends the worker thread, for documents that are closed. '''
+
+        with self.pending_edits_condition:
+            self.is_stopped = True
+            self.pending_edits_condition.notify()
+
+    def parse_loop(self):
+        while True:
+            with self.pending_edits_condition:
+                while len(self.pending_edits) == 0 and not self.is_stopped:
+                    self.pending_edits_condition.wait()
+                if self.is_stopped: return
+
+            with self.parsing_lock:
+                with self.pending_edits_condition:
+                    edits = self.pending_edits
+                    self.pending_edits = list()
+                if len(edits) > 0:
+                    self.parse_edits(edits)
+            GLib.idle_add(self.publish_results)
+
+    def parse_now(self):
+        ''' Parse all outstanding edits right away, for callers on the
+            main thread that need symbols matching the buffer. '''
+
+        with self.parsing_lock:
+            with self.pending_edits_condition:
+                edits = self.pending_edits + self.edits
+                self.pending_edits = list()
+            self.edits = list()
+            if len(edits) > 0:
+                self.parse_edits(edits)
+        self.publish_results()
+
+    #@timer
+    def parse_edits(self, edits):
+        self.changed_starts = set()
+        self.changed_environments = set()
+        self.removed_offsets = dict()
+        edited_matches = set()
+        positions = dict()
+        symbol_changes = dict()
+        for line_start, line_end, text, text_length, number_of_lines, generation in edits:
+            tokens = self.parse_for_symbols(text)
+            removed, added = self.reuse_unchanged_matches(self.line_index.get_line_tokens(line_start, line_end), tokens)
+
+            # delimiters are taken out of the block structure while their
+            # positions are still known, and put in once they are.
+            self.remove_delimiters(removed)
+            self.line_index.replace_lines(line_start, line_end, text, tokens)
+            self.add_delimiters(added)
+
+            for kind, match, offset in removed:
+                positions[match] = None
+                if kind == 'other_symbols':
+                    self.add_symbol_change(symbol_changes, match, False)
+            for kind, match, offset in added:
+                if kind == 'other_symbols':
+                    self.add_symbol_change(symbol_changes, match, True)
+            edited_matches.update(match for kind, match, offset in tokens)
+        self.text_length, self.number_of_lines = text_length, number_of_lines
+
+        for name in self.changed_environments:
+            self.pair_environments(name)
+        blocks_diff = {'added': list(), 'removed': list(), 'changed': list()}
+        self.update_block_structure(blocks_diff)
+        self.update_preamble_block(blocks_diff)
+
+        for match in edited_matches:
+            if self.line_index.contains(match):
+                positions[match] = self.line_index.get_position(match)
+        positions[None] = (self.number_of_lines, self.text_length)
+
+        with self.results_lock:
+            self.merge_blocks_diff(blocks_diff)
+            self.unpublished_positions.update(positions)
+            for match, is_added in symbol_changes.items():
+                self.add_symbol_change(self.unpublished_symbol_changes, match, is_added)
+            self.unpublished_document = (self.begin_document, self.end_document)
+            self.parsed_generation = generation
+
+    def add_symbol_change(self, symbol_changes, match, is_added):
+        # symbols added and removed again before they're published
+        # are never seen.
+        if not is_added and symbol_changes.get(match) == True:
+            del(symbol_changes[match])
+        else:
+            symbol_changes[match] = is_added
+
+    def merge_blocks_diff(self, blocks_diff):
+        # folds the diff into the one waiting to be published, so
+        # observers see a single diff against what they saw last.
+        diff = self.unpublished_blocks_diff
+        added = set(id(block) for block in diff['added'])
+        removed = set(id(block) for block in blocks_diff['removed'])
+
+        diff['added'] = [block for block in diff['added'] if id(block) not in removed]
+        diff['changed'] = [block for block in diff['changed'] if id(block) not in removed]
+        diff['removed'] += [block for block in blocks_diff['removed'] if id(block) not in added]
+        diff['added'] += blocks_diff['added']
+        for block in blocks_diff['removed']:
+            self.unpublished_definitions.pop(id(block), None)
+
+        known = set(id(block) for block in diff['added'] + diff['changed'])
+        for block in blocks_diff['changed']:
+            if id(block) not in known:
+                diff['changed'].append(block)
+                known.add(id(block))
+
+    def publish_results(self):
+        with self.results_lock:
+            if self.parsed_generation != self.generation or self.published_generation == self.generation:
+                return False
+            self.published_generation = self.generation
+
+            blocks_diff = self.unpublished_blocks_diff
+            definitions = self.unpublished_definitions
+            positions = self.unpublished_positions
+            symbol_changes = self.unpublished_symbol_changes
+            begin_document, end_document = self.unpublished_document
+            self.unpublished_blocks_diff = {'added': list(), 'removed': list(), 'changed': list()}
+            self.unpublished_definitions = dict()
+            self.unpublished_positions = dict()
+            self.unpublished_symbol_changes = dict()
+
+        # blocks are kept sorted. changed and removed blocks are taken
+        # out where they were before the edits, removed blocks keep the
+        # values they had then.
+        for block in blocks_diff['removed'] + blocks_diff['changed']:
+            self.remove_published_block(block)
+        for block in blocks_diff['removed']:
+            block.set_delimiters(None)
+
+        for shift in self.edit_shifts:
+            self.positions.add_shift(*shift)
+        self.edit_shifts = list()
+        for match, position in positions.items():
+            if position == None:
+                self.positions.remove(match)
+            else:
+                self.positions.set(match, *position)
+        self.published_begin_document = begin_document
+        self.published_end_document = end_document
+        self.published_version += 1
+
+        for block, delimiters in definitions.values():
+            block.set_delimiters(delimiters)
+        for block in blocks_diff['added'] + blocks_diff['changed']:
+            self.insert_published_block(block)
+
+        for match, is_added in symbol_changes.items():
+            self.update_symbols(match, is_added)
+        for key in self.symbol_matches:
+            self.symbols.pop(key, None)
+        self.symbols.pop('begin_document_offset', None)
 
         self.add_change_code('finished_parsing')
+        if blocks_diff['added'] or blocks_diff['removed'] or blocks_diff['changed']:
+            self.add_change_code('blocks_changed', blocks_diff)
+        return False
 
-    #@timer
-    def parse_for_blocks(self, text, line_start, offset_line_start):
-        block_symbol_matches = {'begin_or_end': list(), 'others': list()}
-        counter = line_start
-        for match in ServiceLocator.get_regex_object(r'\n|\\(begin|end)\{((?:\w|•|\*)+)\}|\\(part|chapter|section|subsection|subsubsection|paragraph|subparagraph)(?:\*){0,1}\{([^\{]*)\}').finditer(text):
-            if match.group(1) != None:
-                block_symbol_matches['begin_or_end'].append((match, counter, match.start() + offset_line_start))
-            elif match.group(3) != None:
-                block_symbol_matches['others'].append((match, counter, match.start() + offset_line_start))
-                counter += len(match.group(0).splitlines()) - 1
-            if match.group(0) == '\n':
-                counter += 1
-        return block_symbol_matches
+    def remove_published_block(self, block):
+        blocks = self.symbols['blocks']
+        index = bisect.bisect_left(blocks, block[0], key=lambda block: block[0])
+        while blocks[index] is not block:
+            index += 1
+        del(blocks[index])
+
+    def insert_published_block(self, block):
+        blocks = self.symbols['blocks']
+        blocks.insert(bisect.bisect_left(blocks, block[0], key=lambda block: block[0]), block)
 
     #@timer
-    def parse_blocks(self):
-        blocks = dict()
-
-        add_preamble_folding = True
-        end_document_offset = None
-        end_document_line = None
-        begin_document_offset = None
-        begin_document_line = None
-        blocks_list = list()
-        for (match, line_number, offset) in self.block_symbol_matches['begin_or_end']:
-            if line_number == 0:
-                add_preamble_folding = False
+    def parse_for_symbols(self, text):
+        tokens = list()
+        for match in ServiceLocator.get_regex_object(self.blocks_pattern).finditer(text):
+            if match.group(1) != None:
+                tokens.append(('begin_or_end', match, match.start()))
+            else:
+                tokens.append(('others', match, match.start()))
+        for match in ServiceLocator.get_regex_object(self.symbols_pattern).finditer(text):
+            tokens.append(('other_symbols', match, match.start()))
+        return tokens
+
+    def reuse_unchanged_matches(self, old_tokens, tokens):
+        # tokens at the start and the end of the parsed lines that are
+        # the same as before keep their previous match objects, so the
+        # blocks they delimit keep their identity. only the tokens in
+        # between count as removed and added.
+
+        def same(old_token, token):
+            return old_token[0] == token[0] and old_token[1].group(0) == token[1].group(0)
+
+        prefix_length = 0
+        while prefix_length < min(len(old_tokens), len(tokens)) and same(old_tokens[prefix_length], tokens[prefix_length]):
+            tokens[prefix_length] = (tokens[prefix_length][0], old_tokens[prefix_length][1], tokens[prefix_length][2])
+            prefix_length += 1
+        suffix_length = 0
+        while suffix_length < min(len(old_tokens), len(tokens)) - prefix_length and same(old_tokens[-suffix_length - 1], tokens[-suffix_length - 1]):
+            tokens[-suffix_length - 1] = (tokens[-suffix_length - 1][0], old_tokens[-suffix_length - 1][1], tokens[-suffix_length - 1][2])
+            suffix_length += 1
+
+        removed_tokens = old_tokens[prefix_length:len(old_tokens) - suffix_length]
+        added_tokens = tokens[prefix_length:len(tokens) - suffix_length]
+        return (removed_tokens, added_tokens)
+
+    def get_delimiters_by_kind(self, tokens):
+        # the delimiters of a kind removed or added by an edit follow
+        # each other, as the tokens of the edited lines do.
+        sections = list()
+        environments = dict()
+        for kind, match, offset in tokens:
+            if kind == 'others':
+                sections.append(match)
+            elif kind == 'begin_or_end':
+                environments.setdefault(match.group(2), list()).append(match)
+        return (sections, environments)
+
+    def remove_delimiters(self, tokens):
+        sections, environments = self.get_delimiters_by_kind(tokens)
+        for match in sections:
+            self.removed_offsets[match] = self.line_index.get_offset(match)
+        if sections:
+            self.remove_sections(sections)
+
+        for name, matches in environments.items():
+            delimiters = self.environment_delimiters[name]
+            index = self.get_index(delimiters, matches[0])
+            del(delimiters[index:index + len(matches)])
+            if len(delimiters) == 0:
+                del(self.environment_delimiters[name])
+            for match in matches:
+                self.removed_offsets[match] = self.line_index.get_offset(match)
+                if match in self.block_ends:
+                    del(self.block_ends[match])
+                    self.changed_starts.add(match)
+                self.begins_by_end.pop(match, None)
+            self.changed_environments.add(name)
+
+    def add_delimiters(self, tokens):
+        sections, environments = self.get_delimiters_by_kind(tokens)
+        if sections:
+            self.add_sections(sections)
+
+        for name, matches in environments.items():
+            delimiters = self.environment_delimiters.setdefault(name, list())
+            index = self.get_index(delimiters, matches[0])
+            delimiters[index:index] = matches
+            self.changed_environments.add(name)
+
+    def get_index(self, matches, match):
+        return bisect.bisect_left(matches, self.line_index.get_offset(match), key=self.line_index.get_offset)
+
+    def pair_environments(self, name):
+        delimiters = self.environment_delimiters.get(name, list())
+        stack = list()
+        ends = dict()
+        for match in delimiters:
+            if match.group(1) == 'begin':
+                stack.append(match)
+            elif len(stack) > 0:
+                ends[stack.pop()] = match
 
+        for match in delimiters:
             if match.group(1) == 'begin':
-                if match.group(2).strip() == 'document':
-                    begin_document_offset = offset
-                    begin_document_line = line_number
-                try: blocks[match.group(2)].append([offset, None, line_number, None])
-                except KeyError: blocks[match.group(2)] = [[offset, None, line_number, None]]
+                if self.block_ends.get(match) is not ends.get(match):
+                    if match in ends:
+                        self.block_ends[match] = ends[match]
+                    else:
+                        del(self.block_ends[match])
+                    self.changed_starts.add(match)
             else:
-                if match.group(2).strip() == 'document':
-                    end_document_offset = offset
-                    end_document_line = line_number
-                try: blocks_begin = blocks[match.group(2)]
-                except KeyError: pass
+                self.begins_by_end.pop(match, None)
+        for begin_match, end_match in ends.items():
+            self.begins_by_end[end_match] = begin_match
+
+        if name == 'document':
+            self.begin_document = None
+            self.end_document = None
+            for match in delimiters:
+                if match.group(1) == 'begin':
+                    self.begin_document = match
                 else:
-                    try: block_begin = blocks_begin.pop()
-                    except IndexError: pass
-                    else:
-                        block_begin[1] = offset
-                        block_begin[3] = line_number
-                        block_begin.append(match.group(2))
-                        blocks_list.append(block_begin)
-
-        relevant_following_blocks = [list(), list(), list(), list(), list(), list(), list()]
-        levels = {'part': 0, 'chapter': 1, 'section': 2, 'subsection': 3, 'subsubsection': 4, 'paragraph': 5, 'subparagraph': 6}
-        for (match, line_number, offset) in reversed(self.block_symbol_matches['others']):
-            if line_number == 0:
+                    self.end_document = match
+
+    def get_section_level(self, match):
+        return self.section_levels[match.group(3)]
+
+    def remove_sections(self, matches):
+        index = self.get_index(self.sections, matches[0])
+        del(self.sections[index:index + len(matches)])
+        for match in matches:
+            del(self.block_ends[match])
+            self.changed_starts.add(match)
+
+        # sections before them that ended at one of them end further on.
+        for match in self.get_open_sections(index, min(self.get_section_level(match) for match in matches)):
+            self.set_section_end(match, self.find_section_end(index, self.get_section_level(match)))
+
+    def add_sections(self, matches):
+        index = self.get_index(self.sections, matches[0])
+        self.sections[index:index] = matches
+        for i in range(index, index + len(matches)):
+            self.set_section_end(self.sections[i], self.find_section_end(i + 1, self.get_section_level(self.sections[i])))
+
+        # sections before them might end at one of them now.
+        for match in self.get_open_sections(index, min(self.get_section_level(match) for match in matches)):
+            self.set_section_end(match, self.find_section_end(index, self.get_section_level(match)))
+
+    def get_open_sections(self, index, min_level):
+        ''' Sections before index that don't end before it, on min_level
+            or below. Each ends on a higher level than the one after it,
+            so there are at most seven. '''
+
+        open_sections = list()
+        level_between = len(self.section_levels)
+        for i in range(index - 1, -1, -1):
+            level = self.get_section_level(self.sections[i])
+            if level < level_between:
+                if level >= min_level:
+                    open_sections.append(self.sections[i])
+                level_between = level
+            if level <= min_level: break
+        return open_sections
+
+    def find_section_end(self, index, level):
+        ''' The first section from index on, on the same or a higher level. '''
+
+        for i in range(index, len(self.sections)):
+            if self.get_section_level(self.sections[i]) <= level:
+                return self.sections[i]
+        return None
+
+    def set_section_end(self, match, end_match):
+        if match not in self.block_ends or self.block_ends[match] is not end_match:
+            self.block_ends[match] = end_match
+            self.changed_starts.add(match)
+
+    def update_block_structure(self, blocks_diff):
+        # blocks whose delimiters changed are taken out. a new block
+        # starting where a previous one started is taken as that same
+        # block, changed (e.g. a renamed environment or section).
+        previous_blocks_by_offset = dict()
+        for match in self.changed_starts:
+            if match in self.blocks_by_delimiter:
+                block, end_match = self.blocks_by_delimiter[match]
+                if match in self.block_ends and self.block_ends[match] is end_match: continue
+
+                del(self.blocks_by_delimiter[match])
+                offset = self.removed_offsets[match] if match in self.removed_offsets else self.line_index.get_offset(match)
+                if offset in previous_blocks_by_offset:
+                    blocks_diff['removed'].append(block)
+                else:
+                    previous_blocks_by_offset[offset] = block
+
+        for match in self.changed_starts:
+            if match in self.block_ends and match not in self.blocks_by_delimiter:
+                offset = self.line_index.get_offset(match)
+                if offset in previous_blocks_by_offset:
+                    block = previous_blocks_by_offset.pop(offset)
+                    blocks_diff['changed'].append(block)
+                else:
+                    block = ParserLaTeXBlock(self)
+                    blocks_diff['added'].append(block)
+                self.blocks_by_delimiter[match] = (block, self.block_ends[match])
+                self.unpublished_definitions[id(block)] = (block, (match, self.block_ends[match]))
+        blocks_diff['removed'] += previous_blocks_by_offset.values()
+
+    def update_preamble_block(self, blocks_diff):
+        add_preamble_folding = self.begin_document != None
+        for kind, match, offset in self.line_index.get_line_tokens(0, 0):
+            if kind != 'other_symbols':
                 add_preamble_folding = False
-
-            level = levels[match.group(3)]
-            block = [offset, None, line_number, None]
-
-            if len(relevant_following_blocks[level]) >= 1:
-                # - 1 to go one line up
-                block[1] = relevant_following_blocks[level][-1][0] - 1
-                block[3] = relevant_following_blocks[level][-1][2] - 1
+        if add_preamble_folding:
+            add_preamble_folding = self.line_index.get_position(self.begin_document)[0] > 0
+
+        if add_preamble_folding:
+            if self.preamble_block == None:
+                self.preamble_block = ParserLaTeXBlock(self)
+                blocks_diff['added'].append(self.preamble_block)
+            elif self.preamble_end is not self.begin_document:
+                blocks_diff['changed'].append(self.preamble_block)
             else:
-                if end_document_offset != None and block[0] < end_document_offset:
-                    # - 1 to go one line up
-                    block[1] = end_document_offset - 1
-                    block[3] = end_document_line - 1
-                else:
-                    block[1] = self.text_length
-                    block[3] = self.number_of_lines
-
-            block.append(match.group(3))
-            block.append(match.group(4))
-            blocks_list.append(block)
-            for i in range(level, 7):
-                relevant_following_blocks[i].append(block)
-
-        if add_preamble_folding and begin_document_offset and begin_document_line:
-            blocks_list.append([0, begin_document_offset - 1, 0, begin_document_line - 1, 'preamble'])
-
-        self.symbols['blocks'] = sorted(blocks_list, key=lambda block: block[0])
-
-    #@timer
-    def parse_symbols(self):
-        labels = set()
-        labels_with_offset = list()
-        todos = set()
-        todos_with_offset = list()
-        included_latex_files = list()
-        bibliographies = set()
-        bibitems = set()
-        packages = set()
-        packages_detailed = dict()
-        for match in self.other_symbols:
-            offset = match[1]
-            match = match[0]
-            if match.group(1) == 'label':
-                labels = labels | {match.group(2).strip()}
-                labels_with_offset.append([match.group(2).strip(), offset])
-            elif match.group(1) == 'include' or match.group(1) == 'input' or match.group(1) == 'subfile' or match.group(1) == 'subimport':
+                return
+            self.preamble_end = self.begin_document
+            self.unpublished_definitions[id(self.preamble_block)] = (self.preamble_block, (None, self.begin_document))
+        elif self.preamble_block != None:
+            blocks_diff['removed'].append(self.preamble_block)
+            self.preamble_block = None
+            self.preamble_end = None
+
+    def get_block_values(self, delimiters):
+        ''' Values of the block with the given (start, end) delimiters,
+            from their published positions. '''
+
+        match, end_match = delimiters
+        if match == None:
+            end_line_number, end_offset = self.positions.get(end_match)
+            return [0, end_offset - 1, 0, end_line_number - 1, 'preamble']
+
+        line_number, offset = self.positions.get(match)
+        if match.group(1) != None:
+            end_line_number, end_offset = self.positions.get(end_match)
+            return [offset, end_offset, line_number, end_line_number, match.group(2)]
+
+        # - 1 to go one line up
+        if end_match != None:
+            end_line_number, end_offset = self.positions.get(end_match)
+            end_line_number, end_offset = end_line_number - 1, end_offset - 1
+        elif self.published_end_document != None and offset < self.positions.get_offset(self.published_end_document):
+            end_line_number, end_offset = self.positions.get(self.published_end_document)
+            end_line_number, end_offset = end_line_number - 1, end_offset - 1
+        else:
+            end_line_number, end_offset = self.positions.get(None)
+        return [offset, end_offset, line_number, end_line_number, match.group(3), match.group(4)]
+
+    def get_environment_block_at_offset(self, offset):
+        self.parse_now()
+
+        line_number = self.line_index.get_line_at_offset(offset)
+        line_start = self.line_index.get_line_start(line_number)
+        for kind, match, line_offset in self.line_index.get_line_tokens(line_number, line_number):
+            if kind == 'begin_or_end' and line_start + line_offset == offset:
+                if match in self.begins_by_end:
+                    match = self.begins_by_end[match]
+                if match in self.blocks_by_delimiter:
+                    return self.blocks_by_delimiter[match][0]
+        return None
+
+    def update_symbols(self, match, is_added):
+        if match.group(1) == 'label':
+            self.update_symbol('labels', 'labels_with_offset', match, match.group(2).strip(), is_added)
+        elif match.group(1) == 'include' or match.group(1) == 'input' or match.group(1) == 'subfile' or match.group(1) == 'subimport':
+            self.update_symbol(None, 'included_latex_files', match, None, is_added)
+        elif match.group(1) == 'bibliography':
+            for entry in match.group(2).strip().split(','):
+                self.update_symbol('bibliographies', None, match, entry.strip() + '.bib', is_added)
+        elif match.group(1) == 'addbibresource':
+            for entry in match.group(2).strip().split(','):
+                self.update_symbol('bibliographies', None, match, entry.strip(), is_added)
+        elif match.group(1) == 'todo':
+            self.update_symbol('todos', 'todos_with_offset', match, match.group(2).strip(), is_added)
+        elif match.group(3) == 'usepackage':
+            self.update_symbol('packages', 'packages_detailed', match, match.group(4).strip(), is_added)
+        elif match.group(5) == 'bibitem':
+            self.update_symbol('bibitems', None, match, match.group(6).strip(), is_added)
+
+    def update_symbol(self, key, key_with_offset, match, name, is_added):
+        # symbol sets count how often each name occurs.
+        if key != None:
+            count = self.symbol_counts.get((key, name), 0) + (1 if is_added else -1)
+            if count == 0:
+                del(self.symbol_counts[(key, name)])
+                self.symbols[key].discard(name)
+            else:
+                self.symbol_counts[(key, name)] = count
+                self.symbols[key].add(name)
+        if key_with_offset != None:
+            if is_added:
+                self.symbol_matches[key_with_offset].add(match)
+            else:
+                self.symbol_matches[key_with_offset].discard(match)
+
+    def get_symbols_with_offset(self, key):
+        if key == 'begin_document_offset':
+            if self.published_begin_document == None: return None
+            return self.positions.get_offset(self.published_begin_document)
+
+        matches = sorted((self.positions.get_offset(match), match) for match in self.symbol_matches[key])
+        if key == 'labels_with_offset' or key == 'todos_with_offset':
+            return [[match.group(2).strip(), offset] for offset, match in matches]
+        elif key == 'included_latex_files':
+            included_latex_files = list()
+            for offset, match in matches:
                 filename = match.group(2).strip()
                 if not filename.endswith('.tex'):
                     filename += '.tex'
                 included_latex_files.append((filename, offset))
-            elif match.group(1) == 'bibliography':
-                bibfiles = match.group(2).strip().split(',')
-                for entry in bibfiles:
-                    bibliographies = bibliographies | {entry.strip() + '.bib'}
-            elif match.group(1) == 'addbibresource':
-                bibfiles = match.group(2).strip().split(',')
-                for entry in bibfiles:
-                    bibliographies = bibliographies | {entry.strip()}
-            elif match.group(1) == 'todo':
-                todos = todos | {match.group(2).strip()}
-                todos_with_offset.append([match.group(2).strip(), offset])
-            elif match.group(3) == 'usepackage':
-                packages = packages | {match.group(4).strip()}
-                if match.group(4).strip() not in packages_detailed:
-                    packages_detailed[match.group(4).strip()] = []
-                packages_detailed[match.group(4).strip()].append([offset, match])
-            elif match.group(5) == 'bibitem':
-                bibitems = bibitems | {match.group(6).strip()}
-
-        self.symbols['labels'] = labels
-        self.symbols['labels_with_offset'] = labels_with_offset
-        self.symbols['included_latex_files'] = included_latex_files
-        self.symbols['todos'] = todos
-        self.symbols['todos_with_offset'] = todos_with_offset
-        self.symbols['bibliographies'] = bibliographies
-        self.symbols['bibitems'] = bibitems
-        self.symbols['packages'] = packages
-        self.symbols['packages_detailed'] = packages_detailed
+            return included_latex_files
+        else:
+            packages_detailed = dict()
+            for offset, match in matches:
+                packages_detailed.setdefault(match.group(4).strip(), list()).append([offset, match])
+            return packages_detailed
+
+
+class ParserLaTeXBlock(list):
+    ''' [offset, end offset, line, end line, name] of environments,
+        [offset, end offset, line, end line, type, title] of sections and
+        [0, end offset, 0, end line, 'preamble'] of the preamble. Values
+        are computed from the positions of the delimiters when they're
+        read after parsing. '''
+
+    def __init__(self, parser):
+        list.__init__(self)
+        self.parser = parser
+        self.delimiters = None
+        self.version = None
+
+    def __getitem__(self, index):
+        self.update()
+        return list.__getitem__(self, index)
+
+    def __iter__(self):
+        self.update()
+        return list.__iter__(self)
+
+    def set_delimiters(self, delimiters):
+        # blocks without delimiters keep their last values.
+        self.delimiters = delimiters
+        self.version = None
+
+    def update(self):
+        if self.delimiters != None and self.version != self.parser.published_version:
+            list.__setitem__(self, slice(None), self.parser.get_block_values(self.delimiters))
+            self.version = self.parser.published_version
+
+
+class ParserLaTeXSymbols(dict):
+    ''' Symbols with offsets are put together from their matches when
+        they're first read after parsing. '''
+
+    def __init__(self, parser):
+        dict.__init__(self)
+        self.parser = parser
+
+    def __missing__(self, key):
+        value = self.parser.get_symbols_with_offset(key)
+        self[key] = value
+        return value
 
 
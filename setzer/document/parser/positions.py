@@ -0,0 +1,70 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+
+class Positions(object):
+    ''' (line, offset) of the matches published by a parser. A position
+        is set when its line is parsed, edits elsewhere are recorded as
+        shifts and only applied to a position when it's read. '''
+
+    def __init__(self):
+        # [line, offset, number of shifts applied] for each match
+        self.positions = dict()
+
+        # (offset, lines, chars): positions at or after offset move by
+        # lines and chars. shifts before first_shift are applied to all
+        # positions and dropped.
+        self.shifts = list()
+        self.first_shift = 0
+
+    def set(self, match, line, offset):
+        self.positions[match] = [line, offset, self.first_shift + len(self.shifts)]
+
+    def remove(self, match):
+        self.positions.pop(match, None)
+
+    def get(self, match):
+        position = self.positions[match]
+        if position[2] < self.first_shift + len(self.shifts):
+            self.apply_shifts(position)
+        return (position[0], position[1])
+
+    def get_offset(self, match):
+        return self.get(match)[1]
+
+    def add_shift(self, offset, lines, chars):
+        self.shifts.append((offset, lines, chars))
+
+        # bringing all positions up to date now and then keeps the
+        # shifts to apply on reading few, at O(1) per edit.
+        if len(self.shifts) > max(1000, len(self.positions)):
+            for position in self.positions.values():
+                self.apply_shifts(position)
+            self.first_shift += len(self.shifts)
+            self.shifts = list()
+
+    def apply_shifts(self, position):
+        line, offset, shifts_applied = position
+        for shift_offset, lines, chars in self.shifts[shifts_applied - self.first_shift:]:
+            if offset >= shift_offset:
+                line += lines
+                offset += chars
+        position[0] = line
+        position[1] = offset
+        position[2] = self.first_shift + len(self.shifts)
+
+
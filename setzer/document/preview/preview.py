@@ -35,6 +35,7 @@ import setzer.document.preview.preview_links_parser as preview_links_parser
 import setzer.document.preview.preview_zoom_manager as preview_zoom_manager
 import setzer.document.preview.context_menu.context_menu as context_menu
 from setzer.helpers.observable import Observable
+from setzer.app.file_watcher import FileWatcher
 from setzer.helpers.timer import timer
 
 
@@ -45,6 +46,7 @@ class Preview(Observable):
         self.document = document
 
         self.pdf_filename = None
+        self.pdf_date = None
         self.recolor_pdf = self.document.settings.get_value('preferences', 'recolor_pdf')
 
         self.poppler_document = None
@@ -87,18 +89,30 @@ class Preview(Observable):
     def on_pdf_updated(self, document):
         self.load_pdf()
 
+    def on_pdf_file_changed(self, filename):
+        # pdfs written by our own builds are loaded when the build is done.
+        if self.document.build_system.get_build_state() != 'idle': return
+
+        try: pdf_date = os.path.getmtime(filename)
+        except OSError:
+            return
+        if pdf_date != self.pdf_date:
+            self.load_pdf()
+
     def set_pdf_filename(self, pdf_filename):
         if pdf_filename != self.pdf_filename:
+            if self.pdf_filename != None:
+                FileWatcher.unwatch(self.pdf_filename, self.on_pdf_file_changed)
             self.pdf_filename = pdf_filename
+            if self.pdf_filename != None:
+                FileWatcher.watch(self.pdf_filename, self.on_pdf_file_changed)
 
     def get_pdf_date(self):
-        if self.pdf_filename != None:
-            return os.path.getmtime(self.pdf_filename)
-        else:
-            return None
+        return self.pdf_date
 
     def load_pdf(self):
         try:
+            self.pdf_date = os.path.getmtime(self.pdf_filename)
             self.poppler_document = Poppler.Document.new_from_file(GLib.filename_to_uri(self.pdf_filename))
         except Exception:
             self.reset_pdf_data()
@@ -113,7 +127,8 @@ class Preview(Observable):
         self.add_change_code('layout_changed')
 
     def reset_pdf_data(self):
-        self.pdf_filename = None
+        self.set_pdf_filename(None)
+        self.pdf_date = None
         self.poppler_document = None
         self.page_width = None
         self.page_height = None
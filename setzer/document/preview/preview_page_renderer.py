@@ -17,52 +17,65 @@
 
 import gi
 gi.require_version('Gtk', '4.0')
-from gi.repository import GObject, Gdk
+gi.require_version('Poppler', '0.18')
+from gi.repository import GLib, Poppler
 import cairo
 
-import _thread as thread, queue
-import time
+import _thread as thread, threading, queue
+import traceback
+import os
+import hashlib
 import math
-import numpy as np
-from PIL import Image, ImageFilter
+import heapq
+import collections
 
 from setzer.app.color_manager import ColorManager
 from setzer.helpers.observable import Observable
 
 
 class PreviewPageRenderer(Observable):
+    ''' Renders pages in square tiles for each zoom level. Tiles stay
+        cached across zoom changes, so the presenter can draw tiles of
+        the nearest zoom level scaled until the current ones are ready.
+        Tiles belong to a page fingerprint rather than a page number, so
+        pages that didn't change keep their tiles when the pdf is rebuilt. '''
 
     def __init__(self, preview):
         Observable.__init__(self)
         self.preview = preview
-        self.maximum_rendered_pixels = 20000000
+        self.tile_size = 256
+        self.tile_cache = PreviewTileCache(128 * 1024 * 1024)
+        self.number_of_workers = max(min((os.cpu_count() or 1) - 1, 8), 1)
 
-        self.visible_pages_lock = thread.allocate_lock()
-        self.visible_pages = list()
-        self.page_width = None
         self.pdf_date = None
-        self.rendered_pages = dict()
-        self.is_active_lock = thread.allocate_lock()
+        self.colors = None
+        self.page_fingerprints = dict()
+        self.previous_page_fingerprints = dict()
+
+        # render tasks are kept in a heap ordered by priority. every
+        # update replaces all tasks not started yet, so tiles that went
+        # out of view are never rendered. everything below is guarded
+        # by render_queue_condition.
+        self.render_queue_condition = threading.Condition()
+        self.render_queue = list()
+        self.tiles_in_progress = set()
         self.is_active = False
+        self.is_stopped = False
+        self.rendered_tiles_queue = queue.Queue()
+        self.rendered_tiles_loop_scheduled = False
 
         self.preview.connect('position_changed', self.on_layout_or_position_changed)
         self.preview.connect('layout_changed', self.on_layout_or_position_changed)
         self.preview.connect('recolor_pdf_changed', self.on_recolor_pdf_changed)
         self.preview.document.settings.connect('settings_changed', self.on_settings_changed)
 
-        self.page_render_count_lock = thread.allocate_lock()
-        self.page_render_count = dict()
-        self.render_queue = queue.Queue()
-        self.render_queue_low_priority = queue.Queue()
-        self.rendered_pages_queue = queue.Queue()
-        thread.start_new_thread(self.render_page_loop, ())
-        GObject.timeout_add(50, self.rendered_pages_loop)
+        # workers are started when the preview is first activated, most
+        # open documents never show theirs.
+        self.workers_started = False
 
     def on_layout_or_position_changed(self, notifying_object):
         if self.preview.layout != None:
             self.update_rendered_pages()
-        else:
-            self.rendered_pages = dict()
 
     def on_recolor_pdf_changed(self, preview):
         self.update_rendered_pages()
@@ -74,164 +87,332 @@ class PreviewPageRenderer(Observable):
             self.update_rendered_pages()
 
     def activate(self):
-        with self.is_active_lock:
+        with self.render_queue_condition:
+            if self.is_stopped: return
+
+        if not self.workers_started:
+            self.workers_started = True
+            for i in range(self.number_of_workers):
+                thread.start_new_thread(self.render_page_loop, ())
+
+        with self.render_queue_condition:
             self.is_active = True
         self.update_rendered_pages()
 
     def deactivate(self):
-        with self.is_active_lock:
+        with self.render_queue_condition:
             self.is_active = False
-        self.rendered_pages = dict()
-        with self.visible_pages_lock:
-            self.visible_pages = list()
-        self.page_width = None
+            self.render_queue = list()
+        self.tile_cache.clear()
         self.pdf_date = None
+        self.page_fingerprints = dict()
+        self.previous_page_fingerprints = dict()
+
+    def stop(self):
+        ''' Ends the worker threads, for documents that are closed. '''
+
+        with self.render_queue_condition:
+            self.is_stopped = True
+            self.is_active = False
+            self.render_queue = list()
+            self.render_queue_condition.notify_all()
 
     def render_page_loop(self):
-        while True:
-            with self.is_active_lock:
-                is_active = self.is_active
-            todo = None
-            if is_active:
-                try: todo = self.render_queue.get(block=False)
-                except queue.Empty:
-                    try: todo = self.render_queue_low_priority.get(block=False)
-                    except queue.Empty:
-                        todo = None
-            if todo != None:
-                with self.page_render_count_lock:
-                    render_count = self.page_render_count[todo['page_number']]
-                with self.visible_pages_lock:
-                    is_visible = (todo['page_number'] >= self.visible_pages_additional[0] and todo['page_number'] <= self.visible_pages_additional[1])
-                if todo['render_count'] == render_count and is_visible:
-                    colors = todo['matching_theme_colors']
-                    width = todo['page_width'] * todo['hidpi_factor']
-                    height = todo['page_height'] * 2
-                    surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
-                    ctx = cairo.Context(surface)
-
-                    ctx.set_source_rgba(1, 1, 1, 1)
-                    ctx.rectangle(0, 0, width, height)
-                    ctx.fill()
-
-                    ctx.scale(todo['scale_factor'] * todo['hidpi_factor'], todo['scale_factor'] * todo['hidpi_factor'])
-                    page = self.preview.poppler_document.get_page(todo['page_number'])
-                    page.render(ctx)
-
-                    if colors != None:
-                        pil_img = Image.frombuffer("RGBA", (width, height), surface.get_data(), "raw", "RGBA", 0, 1)
-
-                        img_data = np.array(pil_img, dtype=np.ubyte)
-                        alpha = 255 - 0.3 * img_data[..., 0] - 0.6 * img_data[..., 1] - 0.1 * img_data[..., 2]
-                        img_data[:,:,-1] = alpha
-                        pil_img = Image.fromarray(np.ubyte(img_data))
-
-                        im_bytes = bytearray(pil_img.tobytes('raw', 'BGRa'))
-                        surface = cairo.ImageSurface.create_for_data(im_bytes, cairo.FORMAT_ARGB32, width, height)
-                        temp_ctx = cairo.Context(surface)
-
-                        Gdk.cairo_set_source_rgba(temp_ctx, colors[0])
-                        temp_ctx.set_operator(cairo.Operator.IN)
-                        temp_ctx.rectangle(0, 0, width, height)
-                        temp_ctx.fill()
-
-                    self.rendered_pages_queue.put({'page_number': todo['page_number'], 'item': [surface, todo['page_width'], todo['pdf_date'], colors]})
-            else:
-                time.sleep(0.05)
+        # poppler documents can't be rendered from several threads,
+        # so each worker opens the pdf itself.
+        poppler_document = None
+        pdf_version = None
 
-    def rendered_pages_loop(self):
-        with self.is_active_lock:
+        while True:
+            with self.render_queue_condition:
+                while not self.is_stopped and (not self.is_active or len(self.render_queue) == 0):
+                    self.render_queue_condition.wait()
+                if self.is_stopped: return
+                priority, todo = heapq.heappop(self.render_queue)
+                self.tiles_in_progress.add(todo['key'])
+
+            try:
+                if (todo['pdf_filename'], todo['pdf_date']) != pdf_version:
+                    try:
+                        poppler_document = Poppler.Document.new_from_file(GLib.filename_to_uri(todo['pdf_filename']))
+                    except GLib.Error:
+                        poppler_document = None
+                    pdf_version = (todo['pdf_filename'], todo['pdf_date'])
+
+                # pages can be gone when the pdf was rebuilt with fewer of them.
+                page = poppler_document.get_page(todo['page_number']) if poppler_document != None else None
+                if page != None and todo['type'] == 'fingerprint':
+                    fingerprint = self.get_fingerprint(page)
+                    self.rendered_tiles_queue.put({'type': 'fingerprint', 'page_number': todo['page_number'], 'pdf_date': todo['pdf_date'], 'fingerprint': fingerprint})
+                elif page != None:
+                    surface = self.render_tile(todo, page)
+                    self.rendered_tiles_queue.put({'type': 'tile', 'key': todo['key'], 'item': [surface, todo['matching_theme_colors']]})
+            except (GLib.Error, cairo.Error, MemoryError):
+                # the pdf may be replaced while it's read. the tile
+                # isn't cached, so it's queued again on the next update.
+                pass
+            except Exception:
+                traceback.print_exc()
+            finally:
+                with self.render_queue_condition:
+                    self.tiles_in_progress.discard(todo['key'])
+                    if not self.rendered_tiles_loop_scheduled:
+                        self.rendered_tiles_loop_scheduled = True
+                        GLib.idle_add(self.rendered_tiles_loop)
+
+    def get_fingerprint(self, page):
+        # text alone misses changes to figures, so the page is also
+        # rendered at low resolution.
+        width, height = page.get_size()
+        surface = cairo.ImageSurface(cairo.Format.ARGB32, int(math.ceil(width / 2)), int(math.ceil(height / 2)))
+        ctx = cairo.Context(surface)
+        ctx.scale(0.5, 0.5)
+        page.render(ctx)
+        surface.flush()
+
+        fingerprint = hashlib.sha1()
+        fingerprint.update(str((width, height)).encode('utf-8'))
+        fingerprint.update((page.get_text() or '').encode('utf-8'))
+        fingerprint.update(surface.get_data())
+        return fingerprint.hexdigest()
+
+    def render_tile(self, todo, page):
+        fingerprint, scale, x, y = todo['key']
+        colors = todo['matching_theme_colors']
+        width = todo['width']
+        height = todo['height']
+        surface = cairo.ImageSurface(cairo.Format.ARGB32, width, height)
+        ctx = cairo.Context(surface)
+
+        ctx.set_source_rgba(1, 1, 1, 1)
+        ctx.rectangle(0, 0, width, height)
+        ctx.fill()
+
+        ctx.translate(- x * self.tile_size, - y * self.tile_size)
+        ctx.scale(scale, scale)
+        page.render(ctx)
+
+        if colors != None:
+            # numpy is only imported once a pdf is recolored.
+            from setzer.helpers.recolor import recolor_surface
+            recolor_surface(surface, colors[0])
+
+        return surface
+
+    def rendered_tiles_loop(self):
+        with self.render_queue_condition:
+            self.rendered_tiles_loop_scheduled = False
             is_active = self.is_active
-        if not is_active: return True
+        if not is_active: return False
 
         changed = False
-        while self.rendered_pages_queue.empty() == False:
-            try: todo = self.rendered_pages_queue.get(block=False)
+        fingerprints_changed = False
+        while self.rendered_tiles_queue.empty() == False:
+            try: todo = self.rendered_tiles_queue.get(block=False)
             except queue.Empty: pass
             else:
-                try:
-                    del(self.rendered_pages[todo['page_number']])
-                except KeyError: pass
-                self.rendered_pages[todo['page_number']] = todo['item']
-                changed = True
-        if changed:
+                if todo['type'] == 'fingerprint':
+                    if todo['pdf_date'] == self.pdf_date:
+                        self.page_fingerprints[todo['page_number']] = todo['fingerprint']
+                        fingerprints_changed = True
+                else:
+                    surface, colors = todo['item']
+                    if self.colors_equal(colors, self.colors):
+                        self.tile_cache.add(todo['key'], todo['item'], surface.get_stride() * surface.get_height())
+                        changed = True
+        if fingerprints_changed:
+            self.update_rendered_pages()
+        if changed or fingerprints_changed:
             self.add_change_code('rendered_pages_changed')
-        return True
+        return False
 
     def update_rendered_pages(self):
-        with self.is_active_lock:
+        with self.render_queue_condition:
             is_active = self.is_active
         if not is_active: return
         if self.preview.layout == None: return
 
-        hidpi_factor = self.preview.layout.hidpi_factor
-        page_width = int(self.preview.layout.page_width)
-        page_height = int(self.preview.layout.page_height)
-
-        offset = self.preview.view.content.scrolling_offset_y
-        current_page = self.preview.layout.get_page_by_offset(offset) - 1
-
-        visible_pages = [current_page, min(current_page + math.floor(self.preview.view.get_allocated_height() / page_height) + 1, self.preview.poppler_document.get_n_pages() - 1)]
-
-        max_additional_pages = max(math.floor(self.maximum_rendered_pixels / (page_width * page_height * hidpi_factor * hidpi_factor) - visible_pages[1] + visible_pages[0]), 0)
-        visible_pages_additional = [max(int(visible_pages[0] - max_additional_pages / 2), 0), min(int(visible_pages[1] + max_additional_pages / 2), self.preview.poppler_document.get_n_pages() - 1)]
-
+        layout = self.preview.layout
+        scale = self.get_scale()
         pdf_date = self.preview.get_pdf_date()
-        with self.visible_pages_lock:
-            self.visible_pages = visible_pages
-            self.visible_pages_additional = visible_pages_additional
-        self.page_width = page_width
-        self.pdf_date = pdf_date
-
         if self.preview.recolor_pdf:
             colors = (ColorManager.get_ui_color('view_fg_color'), ColorManager.get_ui_color('view_bg_color'))
         else:
             colors = None
 
-        changed = False
-        for page_number in list(self.rendered_pages):
-            if self.rendered_pages[page_number][3] == None and colors == None:
-                colors_changed = False
-            elif self.rendered_pages[page_number][3] == None and colors != None:
-                colors_changed = True
-            elif self.rendered_pages[page_number][3] != None and colors == None:
-                colors_changed = True
-            elif not self.rendered_pages[page_number][3][0].equal(colors[0]):
-                colors_changed = True
-            elif not self.rendered_pages[page_number][3][1].equal(colors[1]):
-                colors_changed = True
-            else:
-                colors_changed = False
-
-            if self.rendered_pages[page_number][2] != pdf_date or colors_changed or page_number < visible_pages_additional[0] or page_number > visible_pages_additional[1]:
-                del(self.rendered_pages[page_number])
-                changed = True
-        if changed:
+        # until pages of a new pdf are fingerprinted, the tiles of the
+        # previous version are drawn in their place.
+        if pdf_date != self.pdf_date:
+            if len(self.page_fingerprints) > 0:
+                self.previous_page_fingerprints = self.page_fingerprints
+            self.page_fingerprints = dict()
+        if not self.colors_equal(colors, self.colors):
+            self.tile_cache.clear()
             self.add_change_code('rendered_pages_changed')
-
-        scale_factor = self.preview.layout.scale_factor
-
-        for page_number in range(0, self.preview.poppler_document.get_n_pages()):
-            if page_number not in self.rendered_pages or self.rendered_pages[page_number][1] != page_width or self.rendered_pages[page_number][2] != pdf_date:
-                with self.page_render_count_lock:
-                    try:
-                        self.page_render_count[page_number] += 1
-                    except KeyError:
-                        self.page_render_count[page_number] = 1
-
-                    render_task = dict()
-                    render_task['page_number'] = page_number
-                    render_task['render_count'] = self.page_render_count[page_number]
-                    render_task['scale_factor'] = scale_factor
-                    render_task['hidpi_factor'] = hidpi_factor
-                    render_task['page_width'] = page_width
-                    render_task['page_height'] = page_height
-                    render_task['pdf_date'] = pdf_date
-                    render_task['matching_theme_colors'] = colors
-
-                    if visible_pages != None and page_number >= visible_pages[0] and page_number <= visible_pages[1]:
-                        self.render_queue.put(render_task)
-                    elif page_number >= visible_pages_additional[0] and page_number <= visible_pages_additional[1]:
-                        self.render_queue_low_priority.put(render_task)
+        self.pdf_date = pdf_date
+        self.colors = colors
+
+        # tiles in view are rendered first, then those within one
+        # screen height above and below, each by their distance from
+        # the center of the view.
+        view_width = self.preview.view.get_allocated_width()
+        view_height = self.preview.view.get_allocated_height()
+        view_x = self.preview.view.content.scrolling_offset_x - layout.get_horizontal_margin(view_width)
+        view_y = self.preview.view.content.scrolling_offset_y
+        visible_area = (view_x, view_y, view_x + view_width, view_y + view_height)
+        prefetch_area = (view_x, view_y - view_height, view_x + view_width, view_y + 2 * view_height)
+        center_x, center_y = view_x + view_width / 2, view_y + view_height / 2
+
+        # pages are fingerprinted before any of their tiles is rendered.
+        visible_tiles = set(self.get_tiles_in_area(visible_area))
+        tasks = dict()
+        for page_number, x, y in self.get_tiles_in_area(prefetch_area):
+            tile_x = (x + 0.5) * self.tile_size / layout.hidpi_factor
+            tile_y = page_number * (layout.page_height + layout.page_gap) + (y + 0.5) * self.tile_size / layout.hidpi_factor
+            distance = math.hypot(tile_x - center_x, tile_y - center_y)
+
+            if page_number not in self.page_fingerprints:
+                key = ('fingerprint', page_number)
+                priority = (-1, distance, key)
+            else:
+                key = (self.page_fingerprints[page_number], scale, x, y)
+                if self.tile_cache.get(key) != None: continue
+                priority = (0 if (page_number, x, y) in visible_tiles else 1, distance, key)
+
+            if key not in tasks or priority < tasks[key][0]:
+                tasks[key] = (priority, self.get_render_task(key, page_number))
+
+        with self.render_queue_condition:
+            self.render_queue = [item for key, item in tasks.items() if key not in self.tiles_in_progress]
+            heapq.heapify(self.render_queue)
+            self.render_queue_condition.notify_all()
+
+    def get_render_task(self, key, page_number):
+        render_task = dict()
+        render_task['key'] = key
+        render_task['page_number'] = page_number
+        render_task['pdf_filename'] = self.preview.pdf_filename
+        render_task['pdf_date'] = self.pdf_date
+        if key[0] == 'fingerprint':
+            render_task['type'] = 'fingerprint'
+        else:
+            fingerprint, scale, x, y = key
+            page_width, page_height = self.get_page_size_in_pixels(scale)
+            render_task['type'] = 'tile'
+            render_task['width'] = min(self.tile_size, page_width - x * self.tile_size)
+            render_task['height'] = min(self.tile_size, page_height - y * self.tile_size)
+            render_task['matching_theme_colors'] = self.colors
+        return render_task
+
+    def get_tiles_in_area(self, area):
+        ''' (page_number, x, y) of the tiles at the current scale covering
+            area, given in layout coordinates relative to the first page. '''
+
+        layout = self.preview.layout
+        scale = self.get_scale()
+        page_period = layout.page_height + layout.page_gap
+        first_page = max(int(area[1] // page_period), 0)
+        last_page = min(int(area[3] // page_period), self.preview.poppler_document.get_n_pages() - 1)
+
+        tiles = list()
+        for page_number in range(first_page, last_page + 1):
+            page_y = page_number * page_period
+            page_area = (area[0], area[1] - page_y, area[2], area[3] - page_y)
+            for x, y in self.get_tile_range(scale, scale, page_area):
+                tiles.append((page_number, x, y))
+        return tiles
+
+    def get_tile_range(self, tile_scale, scale, area):
+        ''' (x, y) of the tiles at tile_scale covering area on a page,
+            given in layout coordinates at scale. '''
+
+        page_width, page_height = self.get_page_size_in_pixels(tile_scale)
+        factor = tile_scale / scale * self.preview.layout.hidpi_factor
+        first_x = max(int(area[0] * factor // self.tile_size), 0)
+        last_x = min(int(area[2] * factor // self.tile_size), (page_width - 1) // self.tile_size)
+        first_y = max(int(area[1] * factor // self.tile_size), 0)
+        last_y = min(int(area[3] * factor // self.tile_size), (page_height - 1) // self.tile_size)
+
+        tile_range = list()
+        for y in range(first_y, last_y + 1):
+            for x in range(first_x, last_x + 1):
+                tile_range.append((x, y))
+        return tile_range
+
+    def get_scale(self):
+        # pixels per pdf point of rendered tiles.
+        return round(self.preview.layout.scale_factor * self.preview.layout.hidpi_factor, 4)
+
+    def get_page_size_in_pixels(self, scale):
+        return (int(math.ceil(self.preview.page_width * scale)), int(math.ceil(self.preview.page_height * scale)))
+
+    def get_tile(self, key):
+        return self.tile_cache.get(key)
+
+    def get_page_fingerprint(self, page_number):
+        if page_number in self.page_fingerprints:
+            return self.page_fingerprints[page_number]
+        return self.previous_page_fingerprints.get(page_number, None)
+
+    def get_nearest_rendered_scale(self, fingerprint, scale):
+        scales = [tile_scale for tile_scale in self.tile_cache.get_scales(fingerprint) if tile_scale != scale]
+        if len(scales) == 0: return None
+        return min(scales, key=lambda tile_scale: abs(math.log(tile_scale / scale)))
+
+    def colors_equal(self, colors1, colors2):
+        if colors1 == None or colors2 == None:
+            return colors1 == None and colors2 == None
+        return colors1[0].equal(colors2[0]) and colors1[1].equal(colors2[1])
+
+
+class PreviewTileCache(object):
+    ''' Least recently used tiles are dropped when the surfaces
+        take up more than maximum_size bytes. '''
+
+    def __init__(self, maximum_size):
+        self.maximum_size = maximum_size
+        self.size = 0
+        self.items = collections.OrderedDict()
+        self.sizes = dict()
+        self.scales_by_fingerprint = dict()
+
+    def get(self, key):
+        if key not in self.items: return None
+
+        self.items.move_to_end(key)
+        return self.items[key]
+
+    def add(self, key, item, size):
+        self.remove(key)
+
+        self.items[key] = item
+        self.sizes[key] = size
+        self.size += size
+        fingerprint, scale, x, y = key
+        scales = self.scales_by_fingerprint.setdefault(fingerprint, dict())
+        scales[scale] = scales.get(scale, 0) + 1
+
+        while self.size > self.maximum_size and len(self.items) > 1:
+            self.remove(next(iter(self.items)))
+
+    def remove(self, key):
+        if key not in self.items: return
+
+        del(self.items[key])
+        self.size -= self.sizes.pop(key)
+        fingerprint, scale, x, y = key
+        scales = self.scales_by_fingerprint[fingerprint]
+        scales[scale] -= 1
+        if scales[scale] == 0:
+            del(scales[scale])
+
+    def clear(self):
+        self.size = 0
+        self.items = collections.OrderedDict()
+        self.sizes = dict()
+        self.scales_by_fingerprint = dict()
+
+    def get_scales(self, fingerprint):
+        return self.scales_by_fingerprint.get(fingerprint, dict())
 
 
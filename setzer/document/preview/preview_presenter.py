@@ -95,8 +95,11 @@ class PreviewPresenter(object):
         ctx.transform(cairo.Matrix(1, 0, 0, 1, margin - scrolling_offset_x, first_page * (page_height + page_gap) - scrolling_offset_y))
 
         for page_number in range(first_page, last_page + 1):
+            page_y = page_number * (page_height + page_gap)
+            visible_area = (scrolling_offset_x - margin, scrolling_offset_y - page_y, scrolling_offset_x - margin + width, scrolling_offset_y - page_y + height)
+
             self.draw_page_background_and_outline(ctx)
-            self.draw_rendered_page(ctx, page_number)
+            self.draw_rendered_page(ctx, page_number, visible_area)
             self.draw_synctex_rectangles(ctx, page_number)
 
             ctx.transform(cairo.Matrix(1, 0, 0, 1, 0, page_height + self.preview.layout.page_gap))
@@ -119,22 +122,40 @@ class PreviewPresenter(object):
         ctx.rectangle(0, 0, self.preview.layout.page_width, self.preview.layout.page_height)
         ctx.fill()
 
-    def draw_rendered_page(self, ctx, page_number):
-        if not page_number in self.page_renderer.rendered_pages: return
+    def draw_rendered_page(self, ctx, page_number, visible_area):
+        # while tiles for the current zoom level are rendered, those
+        # of the nearest zoom level are drawn scaled in their place.
+        fingerprint = self.page_renderer.get_page_fingerprint(page_number)
+        if fingerprint == None: return
 
-        rendered_page_data = self.page_renderer.rendered_pages[page_number]
-        surface = rendered_page_data[0]
-        page_width = rendered_page_data[1] * self.preview.layout.hidpi_factor
+        scale = self.page_renderer.get_scale()
+        for x, y in self.page_renderer.get_tile_range(scale, scale, visible_area):
+            if self.page_renderer.get_tile((fingerprint, scale, x, y)) == None:
+                nearest_scale = self.page_renderer.get_nearest_rendered_scale(fingerprint, scale)
+                if nearest_scale != None:
+                    self.draw_tiles(ctx, fingerprint, nearest_scale, scale, visible_area)
+                break
+        self.draw_tiles(ctx, fingerprint, scale, scale, visible_area)
 
-        if not isinstance(surface, cairo.ImageSurface): return
+    def draw_tiles(self, ctx, fingerprint, tile_scale, scale, visible_area):
+        tile_size = self.page_renderer.tile_size
 
         matrix = ctx.get_matrix()
-        factor = self.preview.layout.page_width / page_width
+        factor = scale / tile_scale / self.preview.layout.hidpi_factor
         ctx.scale(factor, factor)
 
-        ctx.set_source_surface(surface, 0, 0)
-        ctx.rectangle(0, 0, self.preview.layout.page_width / factor, self.preview.layout.page_height / factor)
-        ctx.fill()
+        for x, y in self.page_renderer.get_tile_range(tile_scale, scale, visible_area):
+            rendered_tile_data = self.page_renderer.get_tile((fingerprint, tile_scale, x, y))
+            if rendered_tile_data == None: continue
+
+            surface = rendered_tile_data[0]
+            if not isinstance(surface, cairo.ImageSurface): continue
+
+            ctx.set_source_surface(surface, x * tile_size, y * tile_size)
+            if tile_scale != scale:
+                ctx.get_source().set_extend(cairo.Extend.PAD)
+            ctx.rectangle(x * tile_size, y * tile_size, surface.get_width(), surface.get_height())
+            ctx.fill()
 
         ctx.set_matrix(matrix)
 
@@ -70,21 +70,12 @@ class UpdateMatchingBlocks(object):
         if keyval == Gdk.keyval_from_name('Delete') and len(match_begin_end.group(3)) == 0: return False
 
         orig_offset = cursor_offset - insert_iter.get_line_offset() + match_begin_end.start()
-        offset = None
-        for block in self.document.parser.symbols['blocks']:
-            if block[0] == orig_offset:
-                if block[1] == None:
-                    return False
-                else:
-                    offset = block[1] + 5 + len(match_begin_end.group(2))
-                    break
-            elif block[1] == orig_offset:
-                if block[0] == None:
-                    return False
-                else:
-                    offset = block[0] + 7 + len(match_begin_end.group(2))
-                    break
-        if offset == None: return False
+        block = self.document.parser.get_environment_block_at_offset(orig_offset)
+        if block == None: return False
+        if block[0] == orig_offset:
+            offset = block[1] + 5 + len(match_begin_end.group(2))
+        else:
+            offset = block[0] + 7 + len(match_begin_end.group(2))
 
         buffer.begin_user_action()
         if keyval == Gdk.keyval_from_name('asterisk'):
@@ -0,0 +1,46 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+# 
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+# 
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import cairo
+import numpy as np
+
+
+def recolor_surface(surface, color):
+    ''' Turns an opaque ARGB32 surface into color, with an alpha value
+        based on the brightness of each pixel, in place. '''
+
+    surface.flush()
+    width = surface.get_width()
+    height = surface.get_height()
+    data = np.ndarray((height, surface.get_stride() // 4, 4), dtype=np.uint8, buffer=surface.get_data())[:, :width]
+
+    # alpha = 255 - (0.3, 0.6, 0.1) · first three bytes, in 8 bit fixed point.
+    # the surface is opaque, so its bytes aren't affected by premultiplication.
+    alpha = np.multiply(data[..., 0], 77, dtype=np.uint16)
+    channel = np.multiply(data[..., 1], 153, dtype=np.uint16)
+    alpha += channel
+    np.multiply(data[..., 2], 26, out=channel, dtype=np.uint16)
+    alpha += channel
+    alpha >>= 8
+    np.subtract(255, alpha, out=data[..., 3], dtype=np.uint16, casting='unsafe')
+    data[..., :3] = 0
+    surface.mark_dirty()
+
+    ctx = cairo.Context(surface)
+    ctx.set_source_rgba(color.red, color.green, color.blue, color.alpha)
+    ctx.set_operator(cairo.Operator.IN)
+    ctx.paint()
@@ -57,6 +57,7 @@ class ShortcutControllerApp(ShortcutController):
         self.create_and_add_shortcut('F3', self.shortcut_symbols_toggle)
         self.create_and_add_shortcut('F5', self.actions.save_and_build)
         self.create_and_add_shortcut('F6', self.actions.build)
+        self.create_and_add_shortcut('<Shift>F6', self.actions.build_section)
         self.create_and_add_shortcut('F7', self.actions.forward_sync)
         self.create_and_add_shortcut('F8', self.shortcut_build_log)
         self.create_and_add_shortcut('F9', self.shortcut_preview)
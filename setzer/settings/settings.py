@@ -72,6 +72,11 @@ class Settings(Observable):
         self.defaults['preferences']['autoshow_build_log'] = 'errors_warnings'
         self.defaults['preferences']['latex_interpreter'] = 'xelatex'
         self.defaults['preferences']['use_latexmk'] = False
+        self.defaults['preferences']['max_parallel_builds'] = 2
+        self.defaults['preferences']['stop_on_first_error'] = False
+        self.defaults['preferences']['use_precompiled_preamble'] = False
+        self.defaults['preferences']['build_on_idle'] = False
+        self.defaults['preferences']['build_directory'] = 'document'  # Options: document, cache, memory
         self.defaults['preferences']['color_scheme'] = 'default'
         self.defaults['preferences']['theme'] = 'system'  # Options: system, light, dark
         self.defaults['preferences']['recolor_pdf'] = False
@@ -90,10 +95,18 @@ class Settings(Observable):
         self.defaults['preferences']['update_matching_blocks'] = True
 
         self.defaults['preferences']['use_system_font'] = True
-        textview = Gtk.TextView()
-        textview.set_monospace(True)
-        font_string = textview.get_pango_context().get_font_description().to_string()
-        self.defaults['preferences']['font_string'] = font_string
+        self.defaults['preferences']['font_string'] = self.get_default_font_string()
+
+    def get_default_font_string(self):
+        ''' The system font size with the monospace family, which is what
+            a monospace text view would use, without creating one. '''
+
+        gtk_settings = Gtk.Settings.get_default()
+        if gtk_settings == None: return 'monospace 11'
+
+        font_desc = Pango.FontDescription.from_string(gtk_settings.get_property('gtk-font-name'))
+        font_desc.set_family('monospace')
+        return font_desc.to_string()
 
     def get_value(self, section, item):
         try: value = self.data[section][item]
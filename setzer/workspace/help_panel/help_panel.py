@@ -20,9 +20,9 @@ gi.require_versions({'Gtk': '4.0', 'WebKit': '6.0'})
 from gi.repository import WebKit, Gtk
 
 import os.path
-import pickle
 
 from setzer.helpers.observable import Observable
+from setzer.workspace.help_panel.help_search_index import HelpSearchIndex
 import setzer.workspace.help_panel.help_panel_controller as help_panel_controller
 import setzer.workspace.help_panel.help_panel_presenter as help_panel_presenter
 from setzer.app.service_locator import ServiceLocator
@@ -42,14 +42,10 @@ class HelpPanel(Observable):
         self.current_uri = self.home_uri
 
         self.search_index = None
-        self.search_results_blank = list()
+        self.search_results_blank = workspace.recent_help_searches
         self.search_results = self.search_results_blank
         self.query = ''
 
-        index_location = os.path.join(ServiceLocator.get_resources_path(), 'help', 'search_index.pickle')
-        with open(index_location, 'rb') as filehandle:
-            self.search_index = pickle.load(filehandle)
-
         self.controller = help_panel_controller.HelpPanelController(self, self.view)
         self.presenter = help_panel_presenter.HelpPanelPresenter(self, self.view)
 
@@ -77,29 +73,37 @@ class HelpPanel(Observable):
         if query == '':
             self.search_results = self.search_results_blank
         else:
-            words = query.split()
             self.search_results = list()
-            for item in self.search_index:
-                if len(self.search_results) == 8: break
-
-                found = True
-                for word in words:
-                    if item[0].find(word.lower()) == -1:
-                        found = False
-                        break
-                if found:
-                    headline = item[2]
-                    headline = headline.replace('&gt;', '>').replace('&lt;', '<').replace('&quot;', '"').replace('&amp;', '&')
-                    location = item[3]
-                    location = location.replace('&gt;', '>').replace('&lt;', '<').replace('&quot;', '"').replace('&amp;', '&')
-                    for word in words:
-                        headline = headline.replace(word, '•' + word + '◆').replace(word.lower(), '•' + word.lower() + '◆').replace(word.title(), '•' + word.title() + '◆')
-                        location = location.replace(word, '•' + word + '◆').replace(word.lower(), '•' + word.lower() + '◆').replace(word.title(), '•' + word.title() + '◆')
-                    headline = headline.replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;').replace('•', '<b>').replace('◆', '</b>')
-                    location = location.replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;').replace('•', '<b>').replace('◆', '</b>')
-                    self.search_results.append([item[1], headline, location])
+            for uri, headline, location, highlights in self.get_search_index().search(query, 8):
+                headline = self.get_markup(headline, [(start, length) for field, start, length in highlights if field == 0])
+                location = self.get_markup(location, [(start, length) for field, start, length in highlights if field == 1])
+                self.search_results.append([uri, headline, location])
         self.add_change_code('search_query_changed')
 
+    def get_markup(self, text, highlights):
+        ''' Text with the highlighted parts in bold. '''
+
+        is_highlighted = [False] * len(text)
+        for start, length in highlights:
+            is_highlighted[start:start + length] = [True] * length
+
+        markup = ''
+        position = 0
+        while position < len(text):
+            end = position
+            while end < len(text) and is_highlighted[end] == is_highlighted[position]:
+                end += 1
+            part = text[position:end].replace('&', '&amp;').replace('"', '&quot;').replace('<', '&lt;').replace('>', '&gt;')
+            markup += '<b>' + part + '</b>' if is_highlighted[position] else part
+            position = end
+        return markup
+
+    def get_search_index(self):
+        if self.search_index == None:
+            index_location = os.path.join(ServiceLocator.get_resources_path(), 'help', 'search_index.bin')
+            self.search_index = HelpSearchIndex(index_location)
+        return self.search_index
+
     def update_colors(self):
         css = '''body {margin: 1em; margin-top: 0px; padding-top: 1px; background: @view_bg_color; color: @view_fg_color; }
 a {color: @link_color; }
@@ -0,0 +1,243 @@
+#!/usr/bin/env python3
+# coding: utf-8
+
+# Copyright (C) 2017-present Robert Griesel
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, either version 3 of the License, or
+# (at your option) any later version.
+#
+# This program is distributed in the hope that it will be useful,
+# but WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the
+# GNU General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>
+
+import array
+import heapq
+import math
+import mmap
+import re
+import struct
+import sys
+
+
+class HelpSearchIndex(object):
+    ''' Inverted index of the entries of the help index, each an uri
+        with a headline and a location. Tokens map to postings of the
+        entries containing them, with a BM25 score computed when the
+        index is written and the positions of the token for highlighting.
+        The file is mapped into memory and read where it's needed, it's
+        written by scripts/generate_help_index.py. '''
+
+    magic = b'SZHS'
+    version = 1
+
+    # magic, version, numbers of entries, tokens, postings, positions
+    # and the size of the strings.
+    header_format = '<4s6I'
+
+    # commands are indexed with and without their backslash
+    token_pattern = re.compile(r'\\?\w+|[^\w\s]')
+
+    # headlines count more than locations
+    field_weights = (2, 1)
+    bm25_k1 = 1.2
+    bm25_b = 0.75
+
+    # a word matching the beginning of a token counts less than one
+    # matching all of it.
+    prefix_weight = 0.5
+
+    def __init__(self, filename):
+        with open(filename, 'rb') as f:
+            self.data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+        magic, version, number_of_entries, number_of_tokens, number_of_postings, number_of_positions, strings_size = struct.unpack_from(HelpSearchIndex.header_format, self.data, 0)
+        if magic != HelpSearchIndex.magic or version != HelpSearchIndex.version:
+            raise ValueError('not a help search index: ' + filename)
+
+        self.number_of_tokens = number_of_tokens
+        self.offset = struct.calcsize(HelpSearchIndex.header_format)
+
+        # (uri, headline, location) as (offset, length) in the strings
+        self.entries = self.get_array('I', number_of_entries * 6)
+
+        # (offset, length) of the token in the strings, first posting, number of postings
+        self.tokens = self.get_array('I', number_of_tokens * 4)
+
+        self.posting_entries = self.get_array('I', number_of_postings)
+        self.posting_scores = self.get_array('f', number_of_postings)
+        self.posting_positions = self.get_array('I', number_of_postings + 1)
+
+        # (field, start, length), in characters
+        self.positions = self.get_array('H', number_of_positions * 3)
+        self.strings_offset = self.offset
+
+    def get_array(self, typecode, length):
+        size = array.array(typecode).itemsize * length
+        view = memoryview(self.data)[self.offset:self.offset + size]
+        self.offset += size + (- size % 4)
+
+        if sys.byteorder == 'little':
+            return view.cast(typecode)
+        values = array.array(typecode, view.tobytes())
+        values.byteswap()
+        return values
+
+    def get_string(self, offset, length):
+        start = self.strings_offset + offset
+        return self.data[start:start + length]
+
+    def get_token(self, number):
+        return self.get_string(self.tokens[number * 4], self.tokens[number * 4 + 1])
+
+    def get_tokens_with_prefix(self, prefix):
+        ''' Numbers of the tokens starting with prefix (utf-8), tokens
+            are sorted by their bytes. '''
+
+        low, high = 0, self.number_of_tokens
+        while low < high:
+            middle = (low + high) // 2
+            if self.get_token(middle) < prefix:
+                low = middle + 1
+            else:
+                high = middle
+
+        while low < self.number_of_tokens:
+            if not self.get_token(low).startswith(prefix): break
+            yield low
+            low += 1
+
+    def search(self, query, limit=8):
+        ''' The best entries containing every word of query, at the start
+            of a token, as (uri, headline, location, highlights) where
+            highlights are (field, start, length) in characters. '''
+
+        words = list(dict.fromkeys(word.lower() for word in HelpSearchIndex.token_pattern.findall(query)))
+        if len(words) == 0: return list()
+
+        scores = None
+        matched_postings = dict()
+        for word in words:
+            word_bytes = word.encode('utf-8')
+            word_scores = dict()
+            for token_number in self.get_tokens_with_prefix(word_bytes):
+                if len(self.get_token(token_number)) == len(word_bytes):
+                    weight = 1
+                elif word.isalnum() or len(word) > 1:
+                    weight = HelpSearchIndex.prefix_weight
+                else:
+                    # a backslash alone doesn't match every command,
+                    # the exact token comes first.
+                    break
+                first_posting = self.tokens[token_number * 4 + 2]
+                for posting in range(first_posting, first_posting + self.tokens[token_number * 4 + 3]):
+                    entry = self.posting_entries[posting]
+                    if scores != None and entry not in scores: continue
+
+                    score = self.posting_scores[posting] * weight
+                    if score > word_scores.get(entry, 0):
+                        word_scores[entry] = score
+                    if entry in matched_postings:
+                        matched_postings[entry].append((posting, len(word)))
+                    else:
+                        matched_postings[entry] = [(posting, len(word))]
+
+            if scores == None:
+                scores = word_scores
+            else:
+                scores = {entry: score + word_scores[entry] for entry, score in scores.items() if entry in word_scores}
+            if len(scores) == 0: return list()
+
+        results = list()
+        for score, entry in heapq.nsmallest(limit, ((- score, entry) for entry, score in scores.items())):
+            uri, headline, location = [self.get_string(self.entries[entry * 6 + i * 2], self.entries[entry * 6 + i * 2 + 1]).decode('utf-8') for i in range(3)]
+            results.append((uri, headline, location, self.get_highlights(matched_postings[entry])))
+        return results
+
+    def get_highlights(self, postings):
+        ''' Where the words are found, for the beginning of each token
+            only as much as the word covers. '''
+
+        highlights = list()
+        for posting, word_length in postings:
+            for position in range(self.posting_positions[posting], self.posting_positions[posting + 1]):
+                field, start, length = self.positions[position * 3:position * 3 + 3]
+                highlights.append((field, start, min(word_length, length)))
+        return highlights
+
+    def tokenize(text):
+        ''' (token, start, length) for each token of text, in lower case. '''
+
+        for match in HelpSearchIndex.token_pattern.finditer(text):
+            token = match.group(0).lower()
+            yield (token, match.start(), len(match.group(0)))
+            if len(token) > 1 and token[0] == '\\':
+                yield (token[1:], match.start() + 1, len(match.group(0)) - 1)
+
+    def write(filename, entries):
+        ''' Writes the index of entries, given as (uri, headline, location). '''
+
+        strings = bytearray()
+        string_offsets = dict()
+        def add_string(text):
+            data = text.encode('utf-8')
+            if data not in string_offsets:
+                string_offsets[data] = len(strings)
+                strings.extend(data)
+            return [string_offsets[data], len(data)]
+
+        # token: {entry: [term frequency, positions]}
+        postings = dict()
+        entry_lengths = list()
+        entries_array = array.array('I')
+        for entry, (uri, headline, location) in enumerate(entries):
+            entries_array.extend(add_string(uri) + add_string(headline) + add_string(location))
+
+            entry_length = 0
+            for field, text in enumerate([headline, location]):
+                for token, start, length in HelpSearchIndex.tokenize(text):
+                    if token not in postings:
+                        postings[token] = dict()
+                    if entry not in postings[token]:
+                        postings[token][entry] = [0, list()]
+                    postings[token][entry][0] += HelpSearchIndex.field_weights[field]
+                    postings[token][entry][1].append((field, start, length))
+                    entry_length += HelpSearchIndex.field_weights[field]
+            entry_lengths.append(entry_length)
+
+        number_of_entries = len(entry_lengths)
+        average_length = sum(entry_lengths) / max(number_of_entries, 1)
+        k1, b = HelpSearchIndex.bm25_k1, HelpSearchIndex.bm25_b
+
+        tokens_array = array.array('I')
+        posting_entries = array.array('I')
+        posting_scores = array.array('f')
+        posting_positions = array.array('I')
+        positions = array.array('H')
+        for token in sorted(postings, key=lambda token: token.encode('utf-8')):
+            token_postings = postings[token]
+            idf = math.log(1 + (number_of_entries - len(token_postings) + 0.5) / (len(token_postings) + 0.5))
+            tokens_array.extend(add_string(token) + [len(posting_entries), len(token_postings)])
+            for entry in sorted(token_postings):
+                frequency, token_positions = token_postings[entry]
+                posting_entries.append(entry)
+                posting_scores.append(idf * frequency * (k1 + 1) / (frequency + k1 * (1 - b + b * entry_lengths[entry] / average_length)))
+                posting_positions.append(len(positions) // 3)
+                for position in token_positions:
+                    positions.extend(position)
+        posting_positions.append(len(positions) // 3)
+
+        with open(filename, 'wb') as f:
+            f.write(struct.pack(HelpSearchIndex.header_format, HelpSearchIndex.magic, HelpSearchIndex.version, number_of_entries, len(tokens_array) // 4, len(posting_entries), len(positions) // 3, len(strings)))
+            for values in [entries_array, tokens_array, posting_entries, posting_scores, posting_positions, positions]:
+                if sys.byteorder != 'little':
+                    values.byteswap()
+                data = values.tobytes()
+                f.write(data + bytes(- len(data) % 4))
+            f.write(strings)
+
+
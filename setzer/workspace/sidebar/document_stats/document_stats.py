@@ -24,7 +24,8 @@ import subprocess
 import _thread as thread
 
 import setzer.workspace.sidebar.document_stats.document_stats_viewgtk as document_stats_section_view
-import setzer.helpers.path as path_helpers
+from setzer.app.project_index import ProjectIndex
+from setzer.app.file_watcher import FileWatcher
 from setzer.helpers.timer import timer
 
 
@@ -41,6 +42,7 @@ class DocumentStats(object):
         self.values[None] = {'save_date': 0, 'counts': None}
         self.values_lock = thread.allocate_lock()
         self.texcount_missing = False
+        self.watched_files = set()
 
         self.workspace.connect('new_active_document', self.on_new_active_document)
         self.workspace.connect('root_state_change', self.on_root_state_change)
@@ -71,8 +73,7 @@ class DocumentStats(object):
         filenames = {self.document.get_filename()}
         if self.workspace.get_active_document() != None:
             filenames |= {self.workspace.get_active_document().get_filename()}
-        for filename, _ in self.document.parser.symbols['included_latex_files']:
-            filenames |= {path_helpers.get_abspath(filename, self.document.get_dirname())}
+        filenames |= set(ProjectIndex.get_project_files(self.document.get_filename()))
 
         for filename in filenames:
             if filename not in self.values:
@@ -82,17 +83,26 @@ class DocumentStats(object):
                 with self.values_lock:
                     self.values[filename]['counts'] = None
 
-            else:
-                try:
-                    save_date = os.path.getmtime(filename)
-                except FileNotFoundError:
-                    pass
-                else:
-                    if save_date > self.values[filename]['save_date']:
-                        self.values[filename]['save_date'] = save_date
-                        self.count_words(filename)
+        # files are counted again only when the file watcher reports a change.
+        filenames.discard(None)
+        for filename in self.watched_files - filenames:
+            FileWatcher.unwatch(filename, self.on_file_changed)
+        for filename in filenames - self.watched_files:
+            FileWatcher.watch(filename, self.on_file_changed)
+            self.on_file_changed(filename)
+        self.watched_files = filenames
         return True
 
+    def on_file_changed(self, filename):
+        try:
+            save_date = os.path.getmtime(filename)
+        except FileNotFoundError:
+            pass
+        else:
+            if save_date > self.values[filename]['save_date']:
+                self.values[filename]['save_date'] = save_date
+                self.count_words(filename)
+
     def count_words(self, filename):
         thread.start_new_thread(self.run_query, (['texcount', '-brief', filename], filename))
         return False
@@ -131,8 +141,8 @@ class DocumentStats(object):
 
             else:
                 values = [int(value) for value in values]
-                for filename, _ in self.document.parser.symbols['included_latex_files']:
-                    filename = path_helpers.get_abspath(filename, self.document.get_dirname())
+                # the root document itself comes first
+                for filename in ProjectIndex.get_project_files(self.document.get_filename())[1:]:
                     with self.values_lock:
                         if filename in self.values:
                             values_include = self.values[filename]['counts']
@@ -19,7 +19,7 @@ import time
 import os.path
 
 from setzer.helpers.observable import Observable
-import setzer.helpers.path as path_helpers
+from setzer.app.project_index import ProjectIndex
 
 
 class DataProvider(Observable):
@@ -50,12 +50,15 @@ class DataProvider(Observable):
     def on_root_state_change(self, workspace, root_state=None):
         self.set_document()
 
-    def on_buffer_changed(self, document, parameter=None):
+    def on_finished_parsing(self, parser, parameter=None):
         self.update_data()
 
     def on_is_root_changed(self, document, parameter=None):
         self.update_data()
 
+    def on_blocks_changed(self, parser, blocks_diff):
+        self.add_change_code('blocks_changed', blocks_diff)
+
     def on_realize(self, view, *parameter):
         view.disconnect(self.signal_id)
         self.update_data()
@@ -64,12 +67,14 @@ class DataProvider(Observable):
         document = self.workspace.get_root_or_active_latex_document()
         if document != self.document:
             if self.document != None:
-                self.document.disconnect('changed', self.on_buffer_changed)
                 self.document.disconnect('is_root_changed', self.on_is_root_changed)
+                self.document.parser.disconnect('finished_parsing', self.on_finished_parsing)
+                self.document.parser.disconnect('blocks_changed', self.on_blocks_changed)
             self.document = document
             if self.document != None:
-                self.document.connect('changed', self.on_buffer_changed)
                 self.document.connect('is_root_changed', self.on_is_root_changed)
+                self.document.parser.connect('finished_parsing', self.on_finished_parsing)
+                self.document.parser.connect('blocks_changed', self.on_blocks_changed)
             self.update_data()
 
     def update_data(self, *params):
@@ -81,21 +86,21 @@ class DataProvider(Observable):
     def update_integrated_includes(self):
         integrated_includes = dict()
         if self.document.get_is_root():
-            for filename, offset in self.document.parser.symbols['included_latex_files']:
-                filename = path_helpers.get_abspath(filename, self.document.get_dirname())
+            for filename, offset in ProjectIndex.get_includes(self.document):
                 document = self.workspace.get_document_by_filename(filename)
                 if document:
                     integrated_includes[document] = (document, offset)
-                    document.connect('changed', self.on_buffer_changed)
+                    document.parser.connect('finished_parsing', self.on_finished_parsing)
+                    document.parser.connect('blocks_changed', self.on_blocks_changed)
         for document in self.integrated_includes:
-            if document not in integrated_includes:
-                document.disconnect('changed', self.on_buffer_changed)
+            if document not in integrated_includes and document != self.document:
+                document.parser.disconnect('finished_parsing', self.on_finished_parsing)
+                document.parser.disconnect('blocks_changed', self.on_blocks_changed)
         self.integrated_includes = integrated_includes
 
     def get_includes(self):
         includes = list()
-        for filename, offset in self.document.parser.symbols['included_latex_files']:
-            filename = path_helpers.get_abspath(filename, self.document.get_dirname())
+        for filename, offset in ProjectIndex.get_includes(self.document):
             document = self.workspace.get_document_by_filename(filename)
             if document and document in self.integrated_includes:
                 includes.append({'filename': filename, 'offset': offset, 'document': document})
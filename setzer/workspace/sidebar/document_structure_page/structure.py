@@ -26,7 +26,8 @@ class StructureSection(object):
 
     def __init__(self, data_provider, labels):
         self.data_provider = data_provider
-        self.data_provider.connect('data_updated', self.update_items)
+        self.data_provider.connect('data_updated', self.on_data_updated)
+        self.data_provider.connect('blocks_changed', self.on_blocks_changed)
 
         self.levels = {'part': 0, 'chapter': 1, 'section': 2, 'subsection': 3, 'subsubsection': 4, 'paragraph': 5, 'subparagraph': 6, 'file': 7}
 
@@ -35,6 +36,23 @@ class StructureSection(object):
 
         self.nodes = list()
         self.nodes_in_line = list()
+        self.includes_state = None
+
+    def on_data_updated(self, data_provider):
+        # edits that don't touch sections are handled by on_blocks_changed,
+        # here the tree is only rebuilt if the document or its includes changed.
+        includes_state = [self.data_provider.document]
+        for include in self.data_provider.get_includes():
+            includes_state.append((include['filename'], include['document']))
+        if includes_state != self.includes_state:
+            self.includes_state = includes_state
+            self.update_items()
+
+    def on_blocks_changed(self, data_provider, blocks_diff):
+        for block in blocks_diff['added'] + blocks_diff['removed'] + blocks_diff['changed']:
+            if block[4] in self.levels:
+                self.update_items()
+                return
 
     def on_button_press(self, controller, n_press, x, y):
         if n_press != 1: return
@@ -44,8 +62,9 @@ class StructureSection(object):
 
         item = self.nodes_in_line[item_num]['item']
 
+        # nodes keep their blocks, which the parser moves along with the text.
         document = item[0]
-        line_number = item[1]
+        line_number = self.nodes_in_line[item_num]['block'][2]
         if document == None:
             filename = self.nodes_in_line[item_num]['item'][3]
             document = self.data_provider.workspace.open_document_by_filename(filename)
@@ -55,41 +74,34 @@ class StructureSection(object):
         self.data_provider.workspace.active_document.view.source_view.grab_focus()
 
     #@timer
-    def update_items(self, *params):
-        sections = dict()
-
+    def update_items(self):
         includes = self.data_provider.get_includes()
         blocks = list()
         for block in self.data_provider.document.parser.symbols['blocks']:
             while len(includes) > 0 and includes[0]['offset'] < block[0]:
                 if includes[0]['document'] != None:
                     for block_included in includes[0]['document'].parser.symbols['blocks']:
-                        if len(block_included) < 7:
-                            block_included.append(includes[0]['document'])
-                        blocks.append(block_included)
+                        blocks.append((block_included, includes[0]['document']))
                 else:
-                    file_block = [0, 0, 0, 0, 'file', includes[0]['filename'], includes[0]['document']]
-                    blocks.append(file_block)
+                    file_block = [0, 0, 0, 0, 'file', includes[0]['filename']]
+                    blocks.append((file_block, None))
                 del(includes[0])
-            if len(block) < 7:
-                block.append(self.data_provider.document)
-            blocks.append(block)
+            blocks.append((block, self.data_provider.document))
 
         while len(includes) > 0:
             if includes[0]['document'] != None:
                 for block in includes[0]['document'].parser.symbols['blocks']:
-                    if len(block) < 7:
-                        block.append(includes[0]['document'])
-                    blocks.append(block)
+                    blocks.append((block, includes[0]['document']))
             else:
-                file_block = [0, 0, 0, 0, 'file', includes[0]['filename'], includes[0]['document']]
-                blocks.append(file_block)
+                file_block = [0, 0, 0, 0, 'file', includes[0]['filename']]
+                blocks.append((file_block, None))
             del(includes[0])
 
+        sections = dict()
         last_line = -1
-        for block in blocks:
+        for block, document in blocks:
             if block[1] != None and block[4] in self.levels and block[2] != last_line:
-                sections[block[2]] = {'document': block[6], 'offset_start': block[0], 'starting_line': block[2], 'block': block}
+                sections[block[2]] = {'document': document, 'offset_start': block[0], 'starting_line': block[2], 'block': block}
                 last_line = block[2]
 
         current_level = 0
@@ -99,7 +111,7 @@ class StructureSection(object):
         for section in sections.values():
             section_type = section['block'][4]
             level = self.levels[section_type]
-            node = {'item': [section['document'], section['starting_line'], section_type + '-symbolic', ' '.join(section['block'][5].splitlines())], 'children': list()}
+            node = {'item': [section['document'], section['starting_line'], section_type + '-symbolic', ' '.join(section['block'][5].splitlines())], 'block': section['block'], 'children': list()}
             if predecessor[level] == None:
                 nodes.append(node)
             else:
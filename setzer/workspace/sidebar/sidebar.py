@@ -16,7 +16,6 @@
 # along with this program. If not, see <http://www.gnu.org/licenses/>
 
 import setzer.workspace.sidebar.document_structure_page.document_structure_page as document_structure_page
-import setzer.workspace.sidebar.symbols_page.symbols_page as symbols_page
 import setzer.workspace.sidebar.document_structure_page.data_provider as data_provider
 import setzer.workspace.sidebar.document_structure_page.files as files_section
 import setzer.workspace.sidebar.document_structure_page.structure as structure_section
@@ -35,13 +34,18 @@ class Sidebar(object):
         self.data_provider = data_provider.DataProvider(self, workspace)
 
         self.create_document_structure_page()
-        self.create_symbols_page()
-
         self.view.add_named(self.document_structure_page, 'document_structure')
-        self.view.add_named(self.symbols_page.view, 'symbols')
+
+        # the symbols page is created when it's first shown.
+        self.symbols_page = None
 
         self.view.queue_draw()
 
+    def set_visible_page(self, name):
+        if name == 'symbols' and self.symbols_page == None:
+            self.create_symbols_page()
+        self.view.set_visible_child_name(name)
+
     def create_document_structure_page(self):
         self.document_structure_page = document_structure_page.DocumentStructurePage()
         self.document_structure_page.set_size_request(252, -1)
@@ -67,6 +71,9 @@ class Sidebar(object):
         self.document_structure_page.add_content_widget('stats', self.document_stats_section.view)
 
     def create_symbols_page(self):
+        import setzer.workspace.sidebar.symbols_page.symbols_page as symbols_page
+
         self.symbols_page = symbols_page.SymbolsPage(self.workspace)
+        self.view.add_named(self.symbols_page.view, 'symbols')
 
 
@@ -21,12 +21,11 @@ from gi.repository import Gtk, Gdk, Gio, GLib, GObject
 
 import setzer.workspace.sidebar.symbols_page.symbols_page_viewgtk as symbols_page_view
 from setzer.app.service_locator import ServiceLocator
+from setzer.app.symbol_catalogue import SymbolCatalogue
 import setzer.helpers.timer as timer
 
 import math
 import time
-import xml.etree.ElementTree as ET
-import os
 
 
 class SymbolsPage(object):
@@ -95,14 +94,11 @@ class SymbolsPage(object):
 
     def add_recent_symbol_to_flowbox(self, item):
         (category, command) = item
-        xml_tree = ET.parse(os.path.join(ServiceLocator.get_resources_path(), 'symbols', category + '.xml'))
-        xml_root = xml_tree.getroot()
-        elements = xml_root.findall('./symbol[@command=\'' + command + '\']')
-        if len(elements) == 0:
+        symbol = SymbolCatalogue.get_symbol(category, command)
+        if symbol == None:
             self.remove_recent_symbol(item)
         else:
-            attrib = elements[0].attrib
-            symbol = [attrib['file'].rsplit('.')[0], attrib['command'], attrib.get('package', None), int(attrib.get('original_width', 10)), int(attrib.get('original_height', 10))]
+            symbol = list(symbol)
             size = max(symbol[3], symbol[4])
 
             image = Gtk.Image.new_from_icon_name('sidebar-' + symbol[0] + '-symbolic')
@@ -231,21 +227,16 @@ class SymbolsPage(object):
     def update_symbols(self):
         any_symbols_found = False
 
-        search_words = self.view.search_entry.get_text().split()
+        matches = SymbolCatalogue.search(self.view.search_entry.get_text().split())
         for i, symbols_view in enumerate(self.view.symbols_views):
             for symbol in symbols_view.visible_symbols:
                 symbols_view.remove(symbol[5])
             symbols_view.visible_symbols = []
 
-            for symbol in symbols_view.symbols:
-                image = symbol[5]
-                symbol_found = True
-                for word in search_words:
-                    if symbol[0].find(word) == -1:
-                        symbol_found = False
-                if symbol_found:
+            for number, symbol in enumerate(symbols_view.symbols):
+                if (symbols_view.symbol_folder, number) in matches:
                     symbols_view.visible_symbols.append(symbol)
-                    symbols_view.insert(image, -1)
+                    symbols_view.insert(symbol[5], -1)
 
             adjustment = self.view.scrolled_window.get_vadjustment()
             symbols_found = (len(symbols_view.visible_symbols) > 0)
@@ -19,11 +19,8 @@ import gi
 gi.require_version('Gtk', '4.0')
 from gi.repository import Gdk, Gtk
 
-import xml.etree.ElementTree as ET
-import os
-
 from setzer.widgets.search_entry.search_entry import SearchEntry
-from setzer.app.service_locator import ServiceLocator
+from setzer.app.symbol_catalogue import SymbolCatalogue
 
 
 class SymbolsPageView(Gtk.Box):
@@ -112,25 +109,20 @@ class SymbolsPageView(Gtk.Box):
         self.symbols_view_recent.set_max_children_per_line(20)
         self.vbox.append(self.symbols_view_recent)
 
+        # folder, icon, label, symbol width
         self.symbols_lists = list()
-        self.symbols_lists.append(['greek_letters', 'own-symbols-greek-letters-symbolic', _('Greek Letters'), 
-                           'SidebarSymbolsList("greek_letters", 25)'])
-        self.symbols_lists.append(['arrows', 'own-symbols-arrows-symbolic', _('Arrows'), 
-                           'SidebarSymbolsList("arrows", 48)'])
-        self.symbols_lists.append(['relations', 'own-symbols-relations-symbolic', _('Relations'), 
-                           'SidebarSymbolsList("relations", 39)'])
-        self.symbols_lists.append(['operators', 'own-symbols-operators-symbolic', _('Operators'), 
-                           'SidebarSymbolsList("operators", 47)'])
-        self.symbols_lists.append(['misc_math', 'own-symbols-misc-math-symbolic', _('Misc. Math'), 
-                           'SidebarSymbolsList("misc_math", 42)'])
-        self.symbols_lists.append(['misc_text', 'own-symbols-misc-text-symbolic', _('Misc. Symbols'), 
-                           'SidebarSymbolsList("misc_text", 38)'])
+        self.symbols_lists.append(['greek_letters', 'own-symbols-greek-letters-symbolic', _('Greek Letters'), 25])
+        self.symbols_lists.append(['arrows', 'own-symbols-arrows-symbolic', _('Arrows'), 48])
+        self.symbols_lists.append(['relations', 'own-symbols-relations-symbolic', _('Relations'), 39])
+        self.symbols_lists.append(['operators', 'own-symbols-operators-symbolic', _('Operators'), 47])
+        self.symbols_lists.append(['misc_math', 'own-symbols-misc-math-symbolic', _('Misc. Math'), 42])
+        self.symbols_lists.append(['misc_text', 'own-symbols-misc-text-symbolic', _('Misc. Symbols'), 38])
 
         self.init_symbols_lists()
 
     def init_symbols_lists(self):
         for symbols_list in self.symbols_lists:
-            symbols_list_view = eval(symbols_list[3])
+            symbols_list_view = SidebarSymbolsList(symbols_list[0], symbols_list[3])
             label = Gtk.Label.new(symbols_list[2])
             label.set_xalign(0)
             label.set_halign(Gtk.Align.START)
@@ -159,19 +151,14 @@ class SidebarSymbolsList(Gtk.FlowBox):
         
         self.size = None
         
-        # symbols: icon name, latex code
-        self.symbols = list()
+        # symbols: icon name, latex code, package, width, height, image
+        self.symbols = [list(symbol) for symbol in SymbolCatalogue.get_symbols(symbol_folder)]
         self.visible_symbols = list()
         
         self.set_homogeneous(False)
         self.set_valign(Gtk.Align.START)
         self.set_max_children_per_line(20)
         
-        xml_tree = ET.parse(os.path.join(ServiceLocator.get_resources_path(), 'symbols', symbol_folder + '.xml'))
-        xml_root = xml_tree.getroot()
-        for symbol_tag in xml_root:
-            self.symbols.append([symbol_tag.attrib['file'].rsplit('.')[0], symbol_tag.attrib['command'], symbol_tag.attrib.get('package', None), int(symbol_tag.attrib.get('original_width', 10)), int(symbol_tag.attrib.get('original_height', 10))])
-
         self.init_symbols_list()
 
     def init_symbols_list(self):
@@ -28,7 +28,6 @@ from setzer.helpers.observable import Observable
 import setzer.workspace.workspace_presenter as workspace_presenter
 import setzer.workspace.workspace_controller as workspace_controller
 import setzer.workspace.preview_panel.preview_panel as preview_panel
-import setzer.workspace.help_panel.help_panel as help_panel
 import setzer.workspace.welcome_screen.welcome_screen as welcome_screen
 import setzer.workspace.headerbar.headerbar as headerbar
 import setzer.workspace.sidebar.sidebar as sidebar
@@ -53,6 +52,8 @@ class Workspace(Observable):
         self.recently_opened_documents = dict()
 
         self.active_document = None
+        self.help_panel = None
+        self.recent_help_searches = list()
 
         self.recently_opened_session_files = dict()
         self.session_file_opened = None
@@ -74,10 +75,24 @@ class Workspace(Observable):
         self.presenter = workspace_presenter.WorkspacePresenter(self)
         self.headerbar = headerbar.Headerbar(self)
         self.preview_panel = preview_panel.PreviewPanel(self)
-        self.help_panel = help_panel.HelpPanel(self)
         self.build_log = build_log.BuildLog(self)
         self.controller = workspace_controller.WorkspaceController(self)
 
+    def get_help_panel(self):
+        ''' The help panel is created when it's first shown, as it
+            needs WebKit and the search index. '''
+
+        if self.help_panel == None:
+            import setzer.workspace.help_panel.help_panel as help_panel
+            ServiceLocator.get_main_window().create_help_panel()
+            self.help_panel = help_panel.HelpPanel(self)
+        return self.help_panel
+
+    def get_recent_help_searches(self):
+        if self.help_panel == None:
+            return self.recent_help_searches
+        return self.help_panel.search_results_blank
+
     def open_document_by_filename(self, filename):
         if filename == None: return None
 
@@ -114,7 +129,11 @@ class Workspace(Observable):
         if document == self.root_document:
             self.unset_root_document()
         DocumentSettings.save_document_state(document)
-        document.controller.continue_save_date_loop = False
+        document.controller.set_watched_filename(None)
+        if document.is_latex_document():
+            document.preview.set_pdf_filename(None)
+            document.preview.page_renderer.stop()
+            document.parser.stop()
         self.open_documents.remove(document)
         if document.is_latex_document():
             self.open_latex_documents.remove(document)
@@ -253,9 +272,11 @@ class Workspace(Observable):
                 for item in data['recently_opened_documents'].values():
                     self.update_recently_opened_document(item['filename'], item['date'], notify=False)
                 try:
-                    self.help_panel.search_results_blank = data['recent_help_searches']
+                    self.recent_help_searches = data['recent_help_searches']
                 except KeyError:
                     pass
+                if self.help_panel != None:
+                    self.help_panel.search_results_blank = self.recent_help_searches
                 try:
                     recently_opened_session_files = data['recently_opened_session_files'].values()
                 except KeyError:
@@ -303,7 +324,7 @@ class Workspace(Observable):
                 'open_documents': open_documents,
                 'recently_opened_documents': self.recently_opened_documents,
                 'recently_opened_session_files': self.recently_opened_session_files,
-                'recent_help_searches': self.help_panel.search_results_blank
+                'recent_help_searches': self.get_recent_help_searches()
             }
             if self.root_document != None:
                 data['root_document_filename'] = self.root_document.get_filename()
@@ -85,9 +85,9 @@ class WorkspacePresenter(object):
 
     def on_set_show_symbols_or_document_structure(self, workspace):
         if self.workspace.show_symbols:
-            self.main_window.sidebar.set_visible_child_name('symbols')
+            self.workspace.sidebar.set_visible_page('symbols')
         elif self.workspace.show_document_structure:
-            self.main_window.sidebar.set_visible_child_name('document_structure')
+            self.workspace.sidebar.set_visible_page('document_structure')
         self.focus_active_document()
 
         self.update_sidebar_visibility()
@@ -97,6 +97,7 @@ class WorkspacePresenter(object):
             self.main_window.preview_help_stack.set_visible_child_name('preview')
             self.focus_active_document()
         elif self.workspace.show_help:
+            self.workspace.get_help_panel()
             self.main_window.preview_help_stack.set_visible_child_name('help')
             if self.main_window.help_panel.stack.get_visible_child_name() == 'search':
                 self.main_window.help_panel.search_entry.set_text('')
@@ -143,8 +144,8 @@ class WorkspacePresenter(object):
         name = self.settings.get_value('preferences', 'color_scheme')
         path = os.path.join(ServiceLocator.get_resources_path(), 'themes', name + '.css')
         self.main_window.css_provider_colors.load_from_path(path)
-        try: self.workspace.help_panel.update_colors()
-        except AttributeError: pass
+        if self.workspace.help_panel != None:
+            self.workspace.help_panel.update_colors()
 
     def setup_paneds(self):
         sidebar_visible_for_latex_docs = self.workspace.show_symbols or self.workspace.show_document_structure
@@ -161,11 +162,13 @@ class WorkspacePresenter(object):
         if preview_position in [None, -1]: self.main_window.preview_paned.set_center_on_first_show()
         if build_log_position in [None, -1]: self.main_window.build_log_paned.set_end_on_first_show()
 
-        if self.workspace.show_symbols: self.main_window.sidebar.set_visible_child_name('symbols')
-        elif self.workspace.show_document_structure: self.main_window.sidebar.set_visible_child_name('document_structure')
+        if self.workspace.show_symbols: self.workspace.sidebar.set_visible_page('symbols')
+        elif self.workspace.show_document_structure: self.workspace.sidebar.set_visible_page('document_structure')
 
         if self.workspace.show_preview: self.main_window.preview_help_stack.set_visible_child_name('preview')
-        elif self.workspace.show_help: self.main_window.preview_help_stack.set_visible_child_name('help')
+        elif self.workspace.show_help:
+            self.workspace.get_help_panel()
+            self.main_window.preview_help_stack.set_visible_child_name('help')
 
         self.main_window.sidebar_paned.first_set_show_widget(show_sidebar)
         self.main_window.preview_paned.first_set_show_widget(show_preview_help)
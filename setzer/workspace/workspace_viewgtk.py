@@ -24,7 +24,6 @@ import setzer.workspace.build_log.build_log_viewgtk as build_log_view
 import setzer.workspace.headerbar.headerbar_viewgtk as headerbar_view
 import setzer.workspace.shortcutsbar.shortcutsbar_viewgtk as shortcutsbar_view
 import setzer.workspace.preview_panel.preview_panel_viewgtk as preview_panel_view
-import setzer.workspace.help_panel.help_panel_viewgtk as help_panel_view
 import setzer.workspace.sidebar.sidebar_viewgtk as sidebar_view
 import setzer.workspace.welcome_screen.welcome_screen_viewgtk as welcome_screen_view
 import setzer.widgets.animated_paned.animated_paned as animated_paned
@@ -105,14 +104,14 @@ class MainWindow(Adw.ApplicationWindow):
 
         self.preview_panel = preview_panel_view.PreviewPanelView()
 
-        self.help_panel = help_panel_view.HelpPanelView()
+        # created when first shown, see create_help_panel()
+        self.help_panel = None
 
         self.sidebar = sidebar_view.Sidebar()
 
         self.preview_paned_overlay = Gtk.Overlay()
         self.preview_help_stack = Gtk.Stack()
         self.preview_help_stack.add_named(self.preview_panel, 'preview')
-        self.preview_help_stack.add_named(self.help_panel, 'help')
         self.preview_paned = animated_paned.AnimatedHPaned(self.build_log_paned, self.preview_help_stack, False)
         self.preview_paned.set_wide_handle(True)
         self.preview_paned_overlay.set_child(self.preview_paned)
@@ -199,4 +198,10 @@ class MainWindow(Adw.ApplicationWindow):
         """, -1)
         Gtk.StyleContext.add_provider_for_display(self.get_display(), self.css_provider_theme_selectors, Gtk.STYLE_PROVIDER_PRIORITY_USER)
 
+    def create_help_panel(self):
+        import setzer.workspace.help_panel.help_panel_viewgtk as help_panel_view
+
+        self.help_panel = help_panel_view.HelpPanelView()
+        self.preview_help_stack.add_named(self.help_panel, 'help')
+
 